@@ -1,7 +1,48 @@
-from fastapi import FastAPI
-from app.routes.upload import router as upload_router
+import time
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+# Before the app modules read their settings
+load_dotenv()
+
+from fastapi import FastAPI, Request
+from app.routes.upload import router as upload_router, start_warm_up
+from app.services.metrics import ENABLE_METRICS, REQUEST_SECONDS, server_timing, start_request
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background; /readyz reports when they are done
+    start_warm_up()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    # Stage spans recorded while handling the request end up in its
+    # Server-Timing header (streamed answers: those before the first byte)
+    if not ENABLE_METRICS:
+        return await call_next(request)
+
+    spans = start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    seconds = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        seconds,
+        route=route.path if route else "unmatched",
+        method=request.method,
+        status=response.status_code
+    )
+    response.headers["Server-Timing"] = server_timing(spans, total=seconds)
+    return response
 
-app = FastAPI()
 
 @app.get("/")
 def root():
@@ -1,10 +1,57 @@
-from fastapi import APIRouter, UploadFile, File, Body
+from fastapi import APIRouter, UploadFile, File, Body, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from contextlib import ExitStack
+from collections import Counter
+import asyncio
+import hashlib
+import json
 import os
-
-from app.services.file_parser import extract_text, chunk_text
-from app.services.embeddings import EmbeddingModel
-from app.services.vector_store import VectorStore
-from app.services.llm import LLM
+import re
+import tempfile
+import threading
+
+from app.services.file_parser import iter_document_chunks
+from app.services.embeddings import EmbeddingModel, EmbeddingBatcher, embedding_model_id
+from app.services.vector_store import create_vector_store
+from app.services.llm import LLM, LLMBusy
+from app.services.jobs import IngestionJob, JobQueue
+from app.services.document_refs import DocumentRefs
+from app.services.pipeline import batched, prefetch
+from app.services.artifact_store import ArtifactStore
+from app.services.concurrency import run_blocking
+from app.services.lazy import LazyService
+from app.services.metrics import (
+    CACHE_LOOKUPS,
+    CHUNKS_RETRIEVED,
+    ENABLE_METRICS,
+    PROMPT_CHARS,
+    PROMPT_TOKENS,
+    render_metrics
+)
+from app.services.answer_cache import AnswerCache
+from app.services.question_paper import extract_questions
+from app.services.text_index import PositionalIndex, reciprocal_rank_fusion, tokenize
+from app.services.context_packer import (
+    CONTEXT_TOKEN_BUDGET,
+    SpanCache,
+    count_tokens,
+    get_tokenizer,
+    pack_context
+)
+from app.services.shared_services import (
+    SERVICES_SOCKET,
+    RemoteAnswerCache,
+    RemoteEmbeddingModel,
+    RemoteJobRegistry,
+    RemoteTextIndex,
+    RemoteVectorStore
+)
+from app.services.summaries import (
+    PRECOMPUTED_MODES,
+    build_summaries,
+    document_text_from_chunks,
+    precomputed_text
+)
 
 # =========================
 # INITIALIZATION
@@ -12,77 +59,642 @@ from app.services.llm import LLM
 
 router = APIRouter()
 
-embedder = EmbeddingModel()
-vector_store = VectorStore()
-llm = LLM()
+
+def open_vector_store():
+    store = create_vector_store()
+    text_index.rebuild_in_background(store.get_chunks, keep=store.has_document)
+    return store
+
+
+# Built on first use or by warm_up(), not at import. With
+# SERVICES_SOCKET set, the model and store live in the shared
+# service process and every worker connects to it instead.
+if SERVICES_SOCKET:
+    embedder = LazyService("Embedding model", lambda: RemoteEmbeddingModel(SERVICES_SOCKET))
+    vector_store = LazyService("Vector store", lambda: RemoteVectorStore(SERVICES_SOCKET))
+else:
+    embedder = LazyService("Embedding model", EmbeddingModel)
+    vector_store = LazyService("Vector store", open_vector_store)
+query_batcher = EmbeddingBatcher(embedder)
+llm = LazyService("LLM client", LLM)
 
 UPLOAD_DIR = "app/data/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads are written to disk in bounded chunks, never held whole in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Ingestion runs in the background on this many worker threads
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Chunks are embedded and stored in batches of this size while
+# parsing continues in the background
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# With SERVICES_SOCKET, job status is also published to the service
+# process, so GET /jobs/{id} works on any worker
+job_registry = RemoteJobRegistry(SERVICES_SOCKET) if SERVICES_SOCKET else None
+publish_job = job_registry.publish if job_registry else None
+
+# Jobs for the same file hash run one after another
+job_queue = JobQueue(max_workers=INGEST_WORKERS, on_update=publish_job)
+
+# Uploads holding each document: removing one upload only deletes
+# the document when nobody else uploaded the same file
+document_refs = DocumentRefs()
+
+# =========================
+# DOCUMENT ARTIFACTS (DEDUP BY FILE HASH)
+# =========================
+ARTIFACT_MAX_MB = int(os.getenv("ARTIFACT_MAX_MB", "1024"))
+ARTIFACT_RETENTION_DAYS = float(os.getenv("ARTIFACT_RETENTION_DAYS", "30"))
+
+artifact_store = ArtifactStore(
+    max_bytes=ARTIFACT_MAX_MB * 1024 * 1024,
+    retention_days=ARTIFACT_RETENTION_DAYS
+)
+
+# Stored artifacts are only reused if they were produced with these settings
+PIPELINE = {
+    "version": 2,
+    "model": embedding_model_id(),
+    "chunk_size": 500,
+    "overlap": 80
+}
+
+# =========================
+# ANSWER CACHE
+# =========================
+# Shared by all workers through the service process when there is
+# one, so a delete invalidates every worker's answers.
+# Sized by ANSWER_CACHE_ITEMS / _TTL / _SIMILARITY.
+answer_cache = RemoteAnswerCache(SERVICES_SOCKET) if SERVICES_SOCKET else AnswerCache()
+
 # =========================
-# CONTEXT LIMITER 
+# BATCH ANSWERS (QUESTION PAPERS)
 # =========================
-def limit_context(chunks: list[str], max_chars: int = 12000) -> str:
-    collected = []
-    total = 0
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+
+# LLM generations in flight per batch request (LLM_CONCURRENCY
+# still caps all generations on the server)
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# =========================
+# KEYWORD INDEX
+# =========================
+# Positional inverted index kept next to the vectors: exact phrase
+# lookup for verbatim requests, BM25 for factual questions
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+# Chunks sent after each verbatim phrase hit (text after a heading)
+VERBATIM_FOLLOWING_CHUNKS = int(os.getenv("VERBATIM_FOLLOWING_CHUNKS", "2"))
 
-    for chunk in chunks:
-        if total + len(chunk) > max_chars:
-            break
-        collected.append(chunk)
-        total += len(chunk)
+# Rebuilt from the stored chunks in the background once the store
+# is open; until ready, verbatim and hybrid search fall back to
+# the vector store alone
+text_index = RemoteTextIndex(SERVICES_SOCKET) if SERVICES_SOCKET else PositionalIndex()
 
-    return "\n\n".join(collected)
+# =========================
+# PRECOMPUTED SUMMARIES
+# =========================
+# After ingestion, a follow-up job builds map-reduce summaries
+# and notes for the whole document (stored next to its artifact)
+PRECOMPUTE_SUMMARIES = os.getenv("PRECOMPUTE_SUMMARIES", "true").lower() == "true"
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_GROUP_CHARS = int(os.getenv("SUMMARY_GROUP_CHARS", "8000"))
+SUMMARY_MAX_GROUPS = int(os.getenv("SUMMARY_MAX_GROUPS", "40"))
+
+# Summary jobs (dozens of LLM calls each) run on their own workers,
+# so they never hold up the ingestion of later uploads
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "1"))
+summary_queue = JobQueue(max_workers=SUMMARY_WORKERS, name="summarize", on_update=publish_job)
+
+# =========================
+# STARTUP WARM-UP
+# =========================
+def warm_up():
+    """
+    Build the shared services ahead of the first request.
+    """
+
+    for service in (vector_store, embedder, llm):
+        try:
+            service.get()
+        except Exception as e:
+            print(f"[WARN] Warm-up failed: {e}")
+
+    if embedder.is_ready():
+        embedder.warm_up()
+
+    # Downloads the context tokenizer on first start
+    get_tokenizer()
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+async def services_ready(*services):
+    """
+    Wait (off the event loop) until the given services are built,
+    so requests arriving during warm-up are held, not failed.
+    """
+
+    for service in services:
+        try:
+            await service.aget()
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Service unavailable: {e}")
+
+# =========================
+# HEALTH
+# =========================
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    services = {
+        "vector_store": vector_store.status(),
+        "embedding_model": embedder.status(),
+        "llm": llm.status()
+    }
+    ready = all(service["ready"] for service in services.values())
+
+    body = {
+        "status": "ready" if ready else "starting",
+        "services": services,
+        "text_index_ready": await run_blocking("vector", text_index.is_ready)
+    }
+    if not ready:
+        raise HTTPException(status_code=503, detail=body)
+    return body
 
 # =========================
 # RESET MEMORY
 # =========================
 @router.post("/reset")
 async def reset_memory():
-    vector_store.reset()
+    await services_ready(vector_store)
+    await vector_store.areset()
+    await run_blocking("vector", text_index.clear)
+    await run_blocking("io", document_refs.clear)
+    await run_blocking("io", answer_cache.clear)
     return {"status": "vector memory cleared"}
 
+# =========================
+# INGESTION (RUNS ON JOB WORKERS)
+# =========================
+def ingest_file(job: IngestionJob, file_path: str) -> dict:
+    result = ingest_document(job, file_path)
+    # The upload (its job id) now holds the document
+    document_refs.add(result["doc_id"], job.id)
+    return result
+
+
+def ingest_document(job: IngestionJob, file_path: str) -> dict:
+
+    # Documents are identified by the hash of their bytes
+    doc_id = job.sha256
+
+    if vector_store.has_document(doc_id):
+        return {
+            "doc_id": doc_id,
+            "filename": job.filename,
+            "stored_in_vector_db": True,
+            "reused": True,
+            "summary_job_id": schedule_summaries(job)
+        }
+
+    artifact = artifact_store.load(job.sha256, PIPELINE)
+    if artifact is not None:
+        return dict(
+            reattach_artifact(job, artifact),
+            summary_job_id=schedule_summaries(job)
+        )
+
+    stats = {}
+    chunks = iter_document_chunks(
+        file_path,
+        job=job,
+        chunk_size=PIPELINE["chunk_size"],
+        overlap=PIPELINE["overlap"],
+        stats=stats
+    )
+    writer = artifact_store.writer(job.sha256, PIPELINE)
+    total_chunks = 0
+
+    try:
+        with ExitStack() as stages:
+            embed_stage = store_stage = None
+
+            for batch in prefetch(batched(chunks, EMBED_BATCH_SIZE)):
+                if embed_stage is None:
+                    embed_stage = stages.enter_context(job.stage("embed"))
+                    store_stage = stages.enter_context(job.stage("store"))
+                    embed_stage.count = store_stage.count = 0
+
+                texts = [chunk["text"] for chunk in batch]
+                embeddings = embedder.embed_texts(texts)
+                embed_stage.count += len(embeddings)
+
+                store_chunks(job, batch, embeddings, start_index=total_chunks)
+                writer.add(batch, embeddings)
+                total_chunks += len(batch)
+                store_stage.count = total_chunks
+
+        if total_chunks == 0:
+            raise ValueError("No readable text found in document.")
+
+        # Answers given against "all documents" are now stale
+        answer_cache.invalidate(doc_id)
+
+        writer.commit({
+            "filename": job.filename,
+            "characters": stats["characters"]
+        })
+    except Exception:
+        writer.abort()
+        # Never leave a half-ingested document behind
+        vector_store.delete_document(doc_id)
+        text_index.delete_document(doc_id)
+        raise
+
+    vector_store.persist()
+
+    return {
+        "doc_id": doc_id,
+        "filename": job.filename,
+        "characters": stats["characters"],
+        "total_chunks": total_chunks,
+        "stored_in_vector_db": True,
+        "reused": False,
+        "summary_job_id": schedule_summaries(job)
+    }
+
+
+def store_chunks(job: IngestionJob, chunks: list[dict], embeddings, start_index: int):
+    texts = [chunk["text"] for chunk in chunks]
+
+    vector_store.add_documents(
+        texts,
+        embeddings,
+        doc_id=job.sha256,
+        metadatas=chunk_metadatas(job, chunks),
+        start_index=start_index
+    )
+    text_index.add(
+        job.sha256,
+        texts,
+        start_index=start_index,
+        spans=[(chunk["start"], chunk["end"]) for chunk in chunks]
+    )
+
+
+def chunk_metadatas(job: IngestionJob, chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "filename": job.filename,
+            "sha256": job.sha256,
+            "page": chunk.get("page"),
+            "start": chunk["start"],
+            "end": chunk["end"]
+        }
+        for chunk in chunks
+    ]
+
+
+def reattach_artifact(job: IngestionJob, artifact: dict) -> dict:
+    """
+    Known file: load the stored chunks and vectors straight into
+    the vector store, skipping parse, OCR, chunking and embedding.
+    """
+
+    meta = artifact["meta"]
+    chunks = artifact["chunks"]
+    embeddings = artifact["embeddings"]
+
+    with job.stage("store") as stage:
+        stage.count = 0
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE * 16):
+            end = start + EMBED_BATCH_SIZE * 16
+            store_chunks(
+                job,
+                chunks[start:end],
+                embeddings[start:end].tolist(),
+                start_index=start
+            )
+            stage.count = min(end, len(chunks))
+
+    vector_store.persist()
+    answer_cache.invalidate(job.sha256)
+
+    return {
+        "doc_id": job.sha256,
+        "filename": job.filename,
+        "characters": meta["characters"],
+        "total_chunks": meta["total_chunks"],
+        "stored_in_vector_db": True,
+        "reused": True
+    }
+
+
+def schedule_summaries(job: IngestionJob):
+    """
+    Queue the summary job for an ingested document unless its
+    summaries already exist. Returns the summary job id or None.
+    """
+
+    if not PRECOMPUTE_SUMMARIES:
+        return None
+    if artifact_store.load_json(job.sha256, "summaries") is not None:
+        return None
+
+    summary_job = IngestionJob(
+        filename=job.filename,
+        sha256=job.sha256,
+        size_bytes=job.size_bytes,
+        stages=("summarize",)
+    )
+    summary_queue.submit(summary_job, summarize_document, key=job.sha256)
+    return summary_job.id
+
+
+def summarize_document(job: IngestionJob) -> dict:
+    # Built meanwhile by an earlier job for the same file
+    summaries = artifact_store.load_json(job.sha256, "summaries")
+    if summaries is not None:
+        return {
+            "doc_id": job.sha256,
+            "filename": job.filename,
+            "sections": len(summaries["sections"]),
+            "reused": True
+        }
+
+    artifact = artifact_store.load(job.sha256, PIPELINE)
+    if artifact is None:
+        raise ValueError("No stored chunks for this document.")
+
+    text = document_text_from_chunks(artifact["chunks"])
+
+    with job.stage("summarize") as stage:
+        summaries = build_summaries(
+            text,
+            lambda prompt: llm.generate(prompt, background=True),
+            max_workers=SUMMARY_CONCURRENCY,
+            group_chars=SUMMARY_GROUP_CHARS,
+            max_groups=SUMMARY_MAX_GROUPS
+        )
+        stage.count = len(summaries["sections"])
+
+    summaries["filename"] = job.filename
+    artifact_store.save_json(job.sha256, "summaries", summaries)
+
+    # Summary answers built from the first chunks only are now stale
+    answer_cache.invalidate(job.sha256)
+
+    return {
+        "doc_id": job.sha256,
+        "filename": job.filename,
+        "sections": len(summaries["sections"])
+    }
+
+
+async def load_summaries(doc_ids) -> list:
+    """
+    Precomputed summaries for every document in scope (all
+    documents if doc_ids is empty), or None if any is missing.
+    """
+
+    if not doc_ids:
+        doc_ids = [doc["doc_id"] for doc in await vector_store.alist_documents()]
+    if not doc_ids:
+        return None
+
+    loaded = []
+    for doc_id in doc_ids:
+        summaries = await run_blocking(
+            "io", artifact_store.load_json, doc_id, "summaries"
+        )
+        if summaries is None:
+            return None
+        loaded.append(summaries)
+
+    return loaded
+
+
+def join_precomputed(loaded: list, mode: str) -> str:
+    if len(loaded) == 1:
+        return precomputed_text(loaded[0], mode)
+    return "\n\n".join(
+        f"## {summaries.get('filename') or 'Document'}\n\n"
+        + precomputed_text(summaries, mode)
+        for summaries in loaded
+    )
+
+
+def precomputed_context(loaded: list) -> str:
+    """
+    Whole-document context from precomputed summaries: every
+    section's notes if they fit, else the condensed short notes.
+    """
+
+    sections = "\n\n".join(section for s in loaded for section in s["sections"])
+    if count_tokens(sections) <= CONTEXT_TOKEN_BUDGET:
+        return sections
+    return pack_context(
+        [s["summary"] for s in loaded] + [s["short_notes"] for s in loaded]
+    )
+
 # =========================
 # UPLOAD DOCUMENT
 # =========================
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload_file(file: UploadFile = File(...)):
 
-    vector_store.reset()
+    filename = os.path.basename(file.filename or "")
+    if not filename:
+        raise HTTPException(status_code=400, detail="Filename is required.")
+
+    # Written under a temporary name, then stored by content hash:
+    # a later upload with the same filename can never replace the
+    # file a queued job is about to read
+    extension = os.path.splitext(filename)[1].lower()
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".incoming-", suffix=extension)
+
+    sha256 = hashlib.sha256()
+    size_bytes = 0
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                block = await file.read(UPLOAD_CHUNK_SIZE)
+                if not block:
+                    break
+                sha256.update(block)
+                size_bytes += len(block)
+                await run_blocking("io", f.write, block)
+
+        # Same hash, same bytes: replacing an earlier copy is harmless
+        file_path = os.path.join(UPLOAD_DIR, sha256.hexdigest() + extension)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    job = IngestionJob(
+        filename=filename,
+        sha256=sha256.hexdigest(),
+        size_bytes=size_bytes
+    )
+    job_queue.submit(job, ingest_file, file_path, key=job.sha256)
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
+    return {
+        "job_id": job.id,
+        # Pass to DELETE /documents/{doc_id} to remove only this upload
+        "upload_id": job.id,
+        "doc_id": job.sha256,
+        "filename": filename,
+        "sha256": job.sha256,
+        "size_bytes": size_bytes,
+        "status": job.status
+    }
 
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+# =========================
+# INGESTION JOB STATUS
+# =========================
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+
+    job = job_queue.get(job_id) or summary_queue.get(job_id)
+    if job is not None:
+        return job.to_dict()
+
+    # Accepted by another worker
+    if job_registry is not None:
+        job = await run_blocking("io", job_registry.get, job_id)
+        if job is not None:
+            return job
 
-    extracted_text = extract_text(file_path)
+    raise HTTPException(status_code=404, detail="Job not found.")
 
-    if not extracted_text.strip():
-        return {"error": "No readable text found in document."}
+# =========================
+# DOCUMENTS
+# =========================
+@router.get("/documents")
+async def list_documents():
+    await services_ready(vector_store)
+    return {"documents": await vector_store.alist_documents()}
+
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, upload_id: str = Query(None)):
+    """
+    With `upload_id`, only that upload's hold on the document is
+    released; the document is deleted once no upload holds it.
+    Without, the document is deleted outright.
+    """
+
+    if upload_id:
+        remaining = await run_blocking("io", document_refs.release, doc_id, upload_id)
+        if remaining:
+            return {"doc_id": doc_id, "status": "released", "holders": remaining}
+    else:
+        await run_blocking("io", document_refs.drop, doc_id)
 
-    chunks = chunk_text(extracted_text)
-    embeddings = embedder.embed_texts(chunks)
+    await services_ready(vector_store)
+    await vector_store.adelete_document(doc_id)
+    await run_blocking("vector", text_index.delete_document, doc_id)
+    await run_blocking("io", answer_cache.invalidate, doc_id)
+    return {"doc_id": doc_id, "status": "deleted"}
 
-    vector_store.add_documents(chunks, embeddings)
+# =========================
+# SNAPSHOTS
+# =========================
+@router.post("/snapshots")
+async def create_snapshot(snapshot_id: str = Body(None, embed=True)):
+    await services_ready(vector_store)
+    try:
+        return await vector_store.asnapshot(snapshot_id)
+    except NotImplementedError:
+        raise HTTPException(status_code=501, detail="Vector backend does not support snapshots.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/snapshots")
+async def list_snapshots():
+    await services_ready(vector_store)
+    try:
+        return {"snapshots": await vector_store.alist_snapshots()}
+    except NotImplementedError:
+        raise HTTPException(status_code=501, detail="Vector backend does not support snapshots.")
+
+
+@router.post("/snapshots/{snapshot_id}/restore")
+async def restore_snapshot(snapshot_id: str):
+    await services_ready(vector_store)
+    try:
+        snapshot = await vector_store.arestore(snapshot_id)
+    except NotImplementedError:
+        raise HTTPException(status_code=501, detail="Vector backend does not support snapshots.")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found.")
+
+    await run_blocking(
+        "vector",
+        text_index.rebuild_in_background,
+        vector_store.get_chunks,
+        keep=vector_store.has_document
+    )
+    await run_blocking("io", answer_cache.clear)
+    return {"status": "restored", **snapshot}
 
+# =========================
+# SERVICE STATS
+# =========================
+@router.get("/stats")
+async def service_stats():
     return {
-        "filename": file.filename,
-        "characters": len(extracted_text),
-        "total_chunks": len(chunks),
-        "stored_in_vector_db": True
+        "embedding_cache": (
+            await run_blocking("embed", embedder.cache_stats) if embedder.is_ready() else {}
+        ),
+        "query_batcher": query_batcher.stats(),
+        "answer_cache": await run_blocking("io", answer_cache.stats),
+        "text_index": await run_blocking("vector", text_index.stats)
     }
 
+# =========================
+# METRICS (PROMETHEUS)
+# =========================
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 # =========================
 # RECALL (DEBUG)
 # =========================
 @router.post("/recall")
-async def recall_from_memory(query: str = Body(...)):
+async def recall_from_memory(
+    query: str = Body(...),
+    doc_id: list[str] = Query(None)
+):
 
-    query_embedding = embedder.embed_texts([query])[0]
+    await services_ready(embedder, vector_store)
+    query_embedding = await query_batcher.embed(query)
 
-    results = vector_store.search(
+    results = await vector_store.asearch(
         query_embedding=query_embedding,
-        top_k=8
+        top_k=8,
+        doc_ids=doc_id
     )
 
     return {
@@ -93,13 +705,167 @@ async def recall_from_memory(query: str = Body(...)):
 # =========================
 # ANSWER / NOTES / SUMMARY
 # =========================
-@router.post("/answer")
-async def answer_from_document(payload: dict = Body(...)):
+VERBATIM_NOTE = "⚠ NOTE: Text reproduced directly from PDF.\n\n"
+
+
+# Instruction words in verbatim requests, not part of the wanted text
+VERBATIM_FILLER = {
+    "exact", "exactly", "content", "text", "word", "by", "verbatim",
+    "as", "written", "what", "is", "entire", "full", "give", "show",
+    "me", "the", "a", "an", "of", "from", "in", "this", "that", "pdf",
+    "document", "please", "reproduce", "print", "copy", "write", "it"
+}
+
+
+def verbatim_chunks(question: str, doc_ids=None) -> list[dict]:
+    """
+    Chunks holding the text a verbatim request asks for: quoted
+    phrases, else the request's remaining words as a phrase, else
+    the best keyword matches. Empty if nothing specific was asked
+    or the keyword index is still being built.
+    """
+
+    if not text_index.is_ready():
+        return []
+
+    phrases = re.findall(r"[\"“”]([^\"“”]{3,})[\"“”]", question)
+    if not phrases:
+        terms = [t for t in tokenize(question) if t not in VERBATIM_FILLER]
+        if not terms:
+            return []
+        phrases = [" ".join(terms)]
+
+    chunks = []
+    for phrase in phrases:
+        chunks += text_index.phrase_search(
+            phrase,
+            doc_ids=doc_ids,
+            following=VERBATIM_FOLLOWING_CHUNKS
+        )
+    if chunks:
+        return chunks
+
+    # No exact match: best keyword matches, in document order
+    matches = text_index.bm25(" ".join(phrases), doc_ids=doc_ids, top_k=10)
+    return sorted(
+        (chunk for chunk, _ in matches),
+        key=lambda chunk: (chunk["doc_id"], chunk["chunk"])
+    )
+
+
+def result_chunks(results: dict) -> list[dict]:
+    """
+    Vector search results (first query) as chunk dicts, best first.
+    """
+
+    return [
+        {
+            "id": chunk_id,
+            "doc_id": metadata.get("doc_id"),
+            "start": metadata.get("start"),
+            "end": metadata.get("end"),
+            "text": text
+        }
+        for chunk_id, text, metadata in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0]
+        )
+    ]
+
+
+def hybrid_chunks(question: str, results: dict, doc_ids=None, top_k: int = 8) -> list[dict]:
+    """
+    Vector results fused with BM25 keyword matches (reciprocal
+    rank fusion).
+    """
+
+    chunks = {chunk["id"]: chunk for chunk in result_chunks(results)}
+    vector_ids = list(chunks)
+
+    # Vector results alone while the keyword index is being built
+    if not text_index.is_ready():
+        return list(chunks.values())
+
+    keyword_ids = []
+    for chunk, _ in text_index.bm25(question, doc_ids=doc_ids, top_k=top_k):
+        chunk_id = f"{chunk['doc_id']}:{chunk['chunk']}"
+        chunks.setdefault(chunk_id, chunk)
+        keyword_ids.append(chunk_id)
+
+    fused = reciprocal_rank_fusion([vector_ids, keyword_ids])
+    return [chunks[chunk_id] for chunk_id in fused[:top_k]]
+
+
+def payload_doc_ids(payload: dict):
+    # Optional scope: one or more documents (all documents if omitted)
+    return payload.get("doc_ids") or (
+        [payload["doc_id"]] if payload.get("doc_id") else None
+    )
+
+
+async def lookup_answer(payload: dict, embedding=None):
+    """
+    Check the answer cache for this request.
+    Returns (cache_key, cached answer or None, question embedding).
+    The question is embedded unless `embedding` is given.
+    """
+
+    question = payload.get("question", "").strip()
+    key = answer_cache.make_key(
+        payload_doc_ids(payload),
+        payload.get("mode", "qa"),
+        payload.get("language", "english"),
+        question
+    )
+
+    answer = await run_blocking("io", answer_cache.get, key)
+    if answer is not None:
+        CACHE_LOOKUPS.inc(cache="answer", result="hit")
+        return key, answer, None
+
+    if question:
+        if embedding is None:
+            embedding = await query_batcher.embed(question)
+        answer = await run_blocking("io", answer_cache.get_similar, key, embedding)
+        if answer is not None:
+            CACHE_LOOKUPS.inc(cache="answer", result="semantic_hit")
+            return key, answer, embedding
+
+    await run_blocking("io", answer_cache.record_miss)
+    CACHE_LOOKUPS.inc(cache="answer", result="miss")
+    return key, None, embedding
+
+
+def record_prompt(prompt: str):
+    if ENABLE_METRICS:
+        PROMPT_CHARS.observe(len(prompt))
+        PROMPT_TOKENS.observe(count_tokens(prompt))
+
+
+async def prepare_answer(
+    payload: dict,
+    query_embedding=None,
+    results: dict = None,
+    span_cache: SpanCache = None
+) -> dict:
+    """
+    Everything /answer does before calling the LLM: intent
+    detection, retrieval and prompt selection.
+
+    `query_embedding` (the question's vector) and `results` (its
+    vector search results) skip those steps when already done;
+    `span_cache` shares context packing work across a batch.
+
+    Returns {"question", "mode", "language", "prompt", "is_verbatim"},
+    or {"response": ...} when the request is answered without
+    the LLM.
+    """
 
     question: str = payload.get("question", "").strip()
     mode: str = payload.get("mode", "qa")
     language: str = payload.get("language", "english")
 
+    doc_ids = payload_doc_ids(payload)
+
     # =========================
     # LANGUAGE RULES
     # =========================
@@ -180,13 +946,12 @@ Rules:
 User question:
 {question}
 """
-        answer = llm.generate(prompt)
-
         return {
             "question": question,
             "mode": mode,
             "language": language,
-            "answer": answer
+            "prompt": prompt,
+            "is_verbatim": False
         }
 
     # =========================
@@ -203,33 +968,89 @@ User question:
         kw in question.lower() for kw in GLOBAL_KEYWORDS
     )
 
+    # =========================
+    # PRECOMPUTED SUMMARIES
+    # =========================
+    whole_document = mode == "summary" or (
+        mode in PRECOMPUTED_MODES and (not question or is_global_query)
+    )
+
+    summaries = None
+    if not is_verbatim and (whole_document or is_global_query):
+        summaries = await load_summaries(doc_ids)
+
+    if summaries and whole_document:
+        text = join_precomputed(summaries, mode)
+
+        if language == "english":
+            return {"response": {
+                "question": question,
+                "mode": mode,
+                "language": language,
+                "answer": text,
+                "precomputed": True
+            }}
+
+        # Other languages: a cheap rewrite of the precomputed text
+        prompt = f"""
+Rewrite the following content without adding or removing information.
+
+{language_instruction}
+
+Content:
+{text if count_tokens(text) <= CONTEXT_TOKEN_BUDGET else precomputed_context(summaries)}
+"""
+        return {
+            "question": question,
+            "mode": mode,
+            "language": language,
+            "prompt": prompt,
+            "is_verbatim": False
+        }
+
     # =========================
     # CONTEXT RETRIEVAL
     # =========================
     if is_verbatim:
-        context_chunks = vector_store.search_all(limit=80)
+        context_chunks = await run_blocking(
+            "vector", verbatim_chunks, question, doc_ids
+        ) or (await vector_store.aget_chunks(doc_ids=doc_ids))[:80]
+
+    elif summaries:
+        context_chunks = [precomputed_context(summaries)]
 
     elif is_global_query or mode == "summary":
-        context_chunks = vector_store.search_all(limit=50)
+        context_chunks = (await vector_store.aget_chunks(doc_ids=doc_ids))[:50]
 
     else:
         if not question:
-            return {"error": "Question is required."}
+            return {"response": {"error": "Question is required."}}
 
-        query_embedding = embedder.embed_texts([question])[0]
-        results = vector_store.search(
-            query_embedding=query_embedding,
-            top_k=8
-        )
-        context_chunks = results["documents"][0]
+        if results is None:
+            if query_embedding is None:
+                query_embedding = await query_batcher.embed(question)
+            results = await vector_store.asearch(
+                query_embedding=query_embedding,
+                top_k=8,
+                doc_ids=doc_ids
+            )
+        context_chunks = result_chunks(results)
+
+        if is_factual_query and HYBRID_SEARCH:
+            context_chunks = await run_blocking(
+                "vector", hybrid_chunks, question, results, doc_ids
+            )
+
+    CHUNKS_RETRIEVED.observe(len(context_chunks))
 
     if not context_chunks:
-        return {
+        return {"response": {
             "question": question,
             "answer": "Is document mein is question se related information nahi hai."
-        }
+        }}
 
-    context = limit_context(context_chunks)
+    # Merge overlapping chunks, drop duplicates, fit the token budget
+    context = pack_context(context_chunks, cache=span_cache)
 
     # =========================
     # PROMPT SELECTION
@@ -300,24 +1121,287 @@ Question:
 {question}
 """
 
+    return {
+        "question": question,
+        "mode": mode,
+        "language": language,
+        "prompt": prompt,
+        "is_verbatim": is_verbatim
+    }
+
+
+@router.post("/answer")
+async def answer_from_document(payload: dict = Body(...)):
+
+    await services_ready(embedder, vector_store, llm)
+    cache_key, cached, question_embedding = await lookup_answer(payload)
+    if cached is not None:
+        return {
+            "question": payload.get("question", "").strip(),
+            "mode": payload.get("mode", "qa"),
+            "language": payload.get("language", "english"),
+            "answer": cached,
+            "cached": True
+        }
+
+    prepared = await prepare_answer(payload, query_embedding=question_embedding)
+    if "response" in prepared:
+        return prepared["response"]
+
     # =========================
     # GENERATE ANSWER
     # =========================
-    answer = llm.generate(prompt)
+    record_prompt(prepared["prompt"])
+    try:
+        answer = await llm.agenerate(prepared["prompt"], hedge=True)
+    except LLMBusy as e:
+        headers = {"Retry-After": str(max(1, round(e.retry_after)))} if e.retry_after else None
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
 
     # =========================
     # VERBATIM OUTPUT ANNOTATION
     # =========================
-    if is_verbatim:
-        answer = (
-            "⚠ NOTE: Text reproduced directly from PDF.\n\n"
-            + answer
-        )
+    if prepared["is_verbatim"]:
+        answer = VERBATIM_NOTE + answer
+
+    await run_blocking("io", answer_cache.put, cache_key, answer, question_embedding)
 
     return {
-        "question": question,
-        "mode": mode,
-        "language": language,
+        "question": prepared["question"],
+        "mode": prepared["mode"],
+        "language": prepared["language"],
         "answer": answer
     }
 
+# =========================
+# STREAMING ANSWER (SERVER-SENT EVENTS)
+# =========================
+def sse_event(data: dict, event: str = None) -> str:
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/answer/stream")
+async def stream_answer_from_document(payload: dict = Body(...)):
+    """
+    Same as /answer, but the answer is sent token by token as
+    Server-Sent Events:
+        data: {"token": "..."}          (repeated)
+        event: done / data: {...}       (question, mode, language, answer)
+        event: error / data: {"error"}  (on failure)
+    """
+
+    await services_ready(embedder, vector_store, llm)
+    cache_key, cached, question_embedding = await lookup_answer(payload)
+    prepared = None if cached is not None else await prepare_answer(
+        payload, query_embedding=question_embedding
+    )
+
+    async def events():
+        if cached is not None:
+            yield sse_event({"token": cached})
+            yield sse_event({
+                "question": payload.get("question", "").strip(),
+                "mode": payload.get("mode", "qa"),
+                "language": payload.get("language", "english"),
+                "answer": cached,
+                "cached": True
+            }, event="done")
+            return
+
+        if "response" in prepared:
+            response = prepared["response"]
+            if "error" in response:
+                yield sse_event(response, event="error")
+                return
+            yield sse_event({"token": response["answer"]})
+            yield sse_event(response, event="done")
+            return
+
+        parts = []
+        if prepared["is_verbatim"]:
+            yield sse_event({"token": VERBATIM_NOTE})
+
+        record_prompt(prepared["prompt"])
+        try:
+            async for token in llm.astream(prepared["prompt"], hedge=True):
+                parts.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
+
+        # Stripped like llm.agenerate() output, so the cached and
+        # final answers match what /answer returns
+        answer = "".join(parts).strip()
+        if prepared["is_verbatim"]:
+            answer = VERBATIM_NOTE + answer
+
+        await run_blocking("io", answer_cache.put, cache_key, answer, question_embedding)
+
+        yield sse_event({
+            "question": prepared["question"],
+            "mode": prepared["mode"],
+            "language": prepared["language"],
+            "answer": answer
+        }, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =========================
+# BATCH ANSWERS (QUESTION PAPERS)
+# =========================
+def query_results(results: dict, index: int) -> dict:
+    """
+    One query's slice of search_many() results, shaped like search().
+    """
+
+    return {
+        key: results[key][index:index + 1]
+        for key in ("ids", "documents", "metadatas", "distances")
+    }
+
+
+async def paper_questions(doc_ids) -> list[str]:
+    """
+    Questions found in the scoped documents (question papers), in
+    paper order.
+    """
+
+    by_document = {}
+    for chunk in await vector_store.aget_chunks(doc_ids=doc_ids):
+        by_document.setdefault(chunk["doc_id"], []).append(chunk)
+
+    questions = []
+    for chunks in by_document.values():
+        questions += extract_questions(document_text_from_chunks(chunks))
+    return questions
+
+
+@router.post("/answer/batch")
+async def batch_answers(payload: dict = Body(...)):
+    """
+    Answer many questions in one request: `questions`, or, if
+    omitted, every question found in the scoped documents (e.g. a
+    question paper). `doc_ids`, `mode` and `language` apply to all.
+
+    All questions are embedded in one pass and searched with one
+    multi-query search. Context chunks that several questions
+    retrieve are packed once: their merged spans are measured
+    (tokens, duplicate shingles) a single time and reused in every
+    prompt that includes them. Answers are generated concurrently
+    (at most BATCH_LLM_CONCURRENCY at a time) and sent as
+    Server-Sent Events as each one finishes:
+        event: questions / data: {"questions": [...], "skipped"}
+        event: answer / data: {"index", "question", "answer", ...}  (completion order)
+        event: error / data: {"index", "question", "error"}
+        event: done / data: {"answered", "failed", "cached", "overlapping_chunks", "reused_spans"}
+    """
+
+    await services_ready(embedder, vector_store, llm)
+    doc_ids = payload_doc_ids(payload)
+
+    questions = [
+        q.strip() for q in payload.get("questions") or []
+        if isinstance(q, str) and q.strip()
+    ]
+    if not questions:
+        questions = await paper_questions(doc_ids)
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given or found in the documents.")
+
+    skipped = max(0, len(questions) - BATCH_MAX_QUESTIONS)
+    questions = questions[:BATCH_MAX_QUESTIONS]
+
+    base = {key: value for key, value in payload.items() if key != "questions"}
+    payloads = [dict(base, question=question) for question in questions]
+
+    # One embedding pass for all questions, then the answer cache
+    embeddings = list(await embedder.aembed_texts(questions))
+    lookups = [
+        await lookup_answer(item, embedding=embedding)
+        for item, embedding in zip(payloads, embeddings)
+    ]
+
+    # One multi-query search for every question not answered from cache
+    pending = [i for i, (_, cached, _) in enumerate(lookups) if cached is None]
+    results = {}
+    overlapping_chunks = 0
+    if pending:
+        found = await vector_store.asearch_many(
+            [embeddings[i] for i in pending],
+            top_k=8,
+            doc_ids=doc_ids
+        )
+        results = {i: query_results(found, row) for row, i in enumerate(pending)}
+
+        # Chunks that are context for several questions: packed once
+        # through span_cache (keyword search stays per question)
+        counts = Counter(chunk_id for ids in found["ids"] for chunk_id in set(ids))
+        overlapping_chunks = sum(1 for count in counts.values() if count > 1)
+
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    span_cache = SpanCache()
+
+    async def answer_one(index: int) -> dict:
+        question = questions[index]
+        cache_key, cached, embedding = lookups[index]
+        if cached is not None:
+            return {"index": index, "question": question, "answer": cached, "cached": True}
+
+        try:
+            prepared = await prepare_answer(
+                payloads[index],
+                query_embedding=embedding,
+                results=results[index],
+                span_cache=span_cache
+            )
+            if "response" in prepared:
+                return {"index": index, "question": question, **prepared["response"]}
+
+            record_prompt(prepared["prompt"])
+            async with llm_slots:
+                answer = await llm.agenerate(prepared["prompt"])
+        except Exception as e:
+            return {"index": index, "question": question, "error": str(e)}
+
+        if prepared["is_verbatim"]:
+            answer = VERBATIM_NOTE + answer
+        await run_blocking("io", answer_cache.put, cache_key, answer, embedding)
+        return {"index": index, "question": question, "answer": answer}
+
+    async def events():
+        yield sse_event({"questions": questions, "skipped": skipped}, event="questions")
+
+        tasks = [asyncio.create_task(answer_one(i)) for i in range(len(questions))]
+        totals = {"answered": 0, "failed": 0, "cached": 0}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                if "error" in result:
+                    totals["failed"] += 1
+                    yield sse_event(result, event="error")
+                    continue
+                totals["answered"] += 1
+                totals["cached"] += bool(result.get("cached"))
+                yield sse_event(result, event="answer")
+        finally:
+            # Client gone: stop generating
+            for task in tasks:
+                task.cancel()
+
+        yield sse_event({
+            **totals,
+            "overlapping_chunks": overlapping_chunks,
+            "reused_spans": span_cache.hits
+        }, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
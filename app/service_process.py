@@ -0,0 +1,24 @@
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+# Before the app modules read their settings
+load_dotenv()
+
+from app.services.shared_services import SERVICES_SOCKET, ServiceServer
+
+DEFAULT_SOCKET = "app/data/services.sock"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Embedding model, vector store and keyword index shared by all API workers."
+    )
+    parser.add_argument("--socket", default=SERVICES_SOCKET or DEFAULT_SOCKET)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(ServiceServer(args.socket).serve())
+    except KeyboardInterrupt:
+        pass
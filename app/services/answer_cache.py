@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ============================================================
+# ANSWER CACHE SETTINGS
+# ============================================================
+ANSWER_CACHE_ITEMS = int(os.getenv("ANSWER_CACHE_ITEMS", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.rstrip("?.! ")
+
+
+class AnswerCache:
+    """
+    Cache of generated answers.
+
+    Exact tier: keyed by (scope, mode, language, normalized question),
+    where scope is the tuple of document ids the question was asked
+    against (None = all documents).
+
+    Semantic tier: within the same (scope, mode, language), a cached
+    answer is reused when the new question's embedding has cosine
+    similarity >= `semantic_threshold` with a cached question.
+
+    Entries expire after `ttl_seconds`; the least recently used are
+    dropped beyond `max_items`.
+    """
+
+    def __init__(
+        self,
+        max_items: int = ANSWER_CACHE_ITEMS,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+        semantic_threshold: float = ANSWER_CACHE_SIMILARITY
+    ):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+
+        self.entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(doc_ids, mode: str, language: str, question: str) -> tuple:
+        scope = tuple(sorted(doc_ids)) if doc_ids else None
+        return (scope, mode, language, normalize_question(question))
+
+    # =========================
+    # LOOKUP
+    # =========================
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["answer"]
+
+    def get_similar(self, key: tuple, embedding):
+        """
+        Best cached answer for a semantically close question in
+        the same scope / mode / language, or None.
+        """
+
+        if embedding is None:
+            return None
+
+        query = _unit(embedding)
+        group = key[:3]
+
+        with self.lock:
+            best_key, best_score = None, self.semantic_threshold
+            for entry_key in list(self.entries):
+                if entry_key[:3] != group:
+                    continue
+                entry = self._live(entry_key)
+                if entry is None or entry["embedding"] is None:
+                    continue
+                score = float(np.dot(entry["embedding"], query))
+                if score >= best_score:
+                    best_key, best_score = entry_key, score
+
+            if best_key is None:
+                return None
+
+            self.entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self.entries[best_key]["answer"]
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    # =========================
+    # STORE / INVALIDATE
+    # =========================
+    def put(self, key: tuple, answer: str, embedding=None):
+        with self.lock:
+            self.entries[key] = {
+                "answer": answer,
+                "embedding": _unit(embedding) if embedding is not None else None,
+                "expires_at": time.time() + self.ttl_seconds
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str):
+        """
+        Drop answers that depended on `doc_id`, including answers
+        given against all documents.
+        """
+
+        with self.lock:
+            for key in list(self.entries):
+                scope = key[0]
+                if scope is None or doc_id in scope:
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "size": len(self.entries)
+        }
+
+    @staticmethod
+    def key_from_list(key: list) -> tuple:
+        """
+        make_key() output back from JSON (lists instead of tuples).
+        """
+
+        scope = tuple(key[0]) if key[0] is not None else None
+        return (scope, *key[1:])
+
+    def _live(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is not None and entry["expires_at"] < time.time():
+            del self.entries[key]
+            return None
+        return entry
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
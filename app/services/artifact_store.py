@@ -0,0 +1,218 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+
+class ArtifactStore:
+    """
+    Ingestion results kept on disk, keyed by the SHA-256 of the
+    uploaded file, so a repeat upload can reattach its vectors
+    instead of parsing, OCR'ing and embedding again.
+
+    Layout:
+        <root>/<sha256>/meta.json        filename, counts, pipeline, timestamps
+        <root>/<sha256>/chunks.jsonl     {"text", "start", "end"} per chunk
+        <root>/<sha256>/embeddings.f32   float32 matrix, one row per chunk
+        <root>/<sha256>/<name>.json      optional extras (summaries, ...)
+
+    Artifacts unused for `retention_days` are evicted, then the
+    least recently used ones until the store fits in `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        root: str = "app/data/artifacts",
+        max_bytes: int = 1024 * 1024 * 1024,
+        retention_days: float = 30
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_days * 24 * 3600
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256)
+
+    # =========================
+    # READ
+    # =========================
+    def load(self, sha256: str, pipeline: dict):
+        """
+        Returns {"meta", "chunks", "embeddings"} for a known file
+        processed with the same pipeline settings, else None.
+        Embeddings are a read-only memory map.
+        """
+
+        doc_dir = self._dir(sha256)
+        meta_path = os.path.join(doc_dir, "meta.json")
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("pipeline") != pipeline:
+            return None
+
+        with open(os.path.join(doc_dir, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+
+        embeddings = np.memmap(
+            os.path.join(doc_dir, "embeddings.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["total_chunks"], meta["dim"])
+        )
+
+        meta["last_used_at"] = time.time()
+        self._write_meta(doc_dir, meta)
+
+        return {"meta": meta, "chunks": chunks, "embeddings": embeddings}
+
+    def load_json(self, sha256: str, name: str):
+        """
+        Extra JSON artifact attached to a stored document
+        (e.g. "summaries"), or None.
+        """
+
+        try:
+            with open(os.path.join(self._dir(sha256), f"{name}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # =========================
+    # WRITE
+    # =========================
+    def save_json(self, sha256: str, name: str, data) -> bool:
+        doc_dir = self._dir(sha256)
+        if not os.path.isdir(doc_dir):
+            return False
+
+        tmp_path = os.path.join(doc_dir, f"{name}.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(doc_dir, f"{name}.json"))
+        return True
+
+    def writer(self, sha256: str, pipeline: dict) -> "ArtifactWriter":
+        return ArtifactWriter(self, sha256, pipeline)
+
+    def _commit(self, tmp_dir: str, sha256: str):
+        doc_dir = self._dir(sha256)
+
+        if os.path.exists(doc_dir):
+            # Stale or concurrently written copy; the new one wins
+            shutil.rmtree(doc_dir, ignore_errors=True)
+
+        try:
+            os.replace(tmp_dir, doc_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict()
+
+    @staticmethod
+    def _write_meta(doc_dir: str, meta: dict):
+        tmp_path = os.path.join(doc_dir, f"meta.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(doc_dir, "meta.json"))
+
+    # =========================
+    # EVICTION
+    # =========================
+    def evict(self):
+        now = time.time()
+        entries = []
+
+        for name in os.listdir(self.root):
+            doc_dir = os.path.join(self.root, name)
+            meta_path = os.path.join(doc_dir, "meta.json")
+            if name.startswith(".") or not os.path.isfile(meta_path):
+                continue
+
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    last_used = json.load(f).get("last_used_at", 0)
+            except (OSError, ValueError):
+                last_used = 0
+
+            if now - last_used > self.retention_seconds:
+                shutil.rmtree(doc_dir, ignore_errors=True)
+                continue
+
+            size = sum(
+                os.path.getsize(os.path.join(doc_dir, f))
+                for f in os.listdir(doc_dir)
+            )
+            entries.append((last_used, size, doc_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, doc_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(doc_dir, ignore_errors=True)
+            total -= size
+
+
+class ArtifactWriter:
+    """
+    Writes one document's artifacts incrementally, batch by
+    batch, into a temporary directory that is moved into place
+    on commit().
+    """
+
+    def __init__(self, store: ArtifactStore, sha256: str, pipeline: dict):
+        self.store = store
+        self.sha256 = sha256
+        self.pipeline = pipeline
+        self.total_chunks = 0
+        self.dim = None
+
+        self.tmp_dir = os.path.join(store.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.tmp_dir)
+        self.chunks_file = open(
+            os.path.join(self.tmp_dir, "chunks.jsonl"), "w", encoding="utf-8"
+        )
+        self.embeddings_file = open(
+            os.path.join(self.tmp_dir, "embeddings.f32"), "wb"
+        )
+
+    def add(self, chunks: list[dict], embeddings: list[list[float]]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        self.dim = vectors.shape[1]
+
+        for chunk in chunks:
+            self.chunks_file.write(json.dumps(chunk) + "\n")
+        self.embeddings_file.write(vectors.tobytes())
+        self.total_chunks += len(chunks)
+
+    def commit(self, meta: dict):
+        self._close()
+
+        now = time.time()
+        meta = dict(
+            meta,
+            sha256=self.sha256,
+            pipeline=self.pipeline,
+            total_chunks=self.total_chunks,
+            dim=self.dim,
+            created_at=now,
+            last_used_at=now
+        )
+        ArtifactStore._write_meta(self.tmp_dir, meta)
+        self.store._commit(self.tmp_dir, self.sha256)
+
+    def abort(self):
+        self._close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _close(self):
+        self.chunks_file.close()
+        self.embeddings_file.close()
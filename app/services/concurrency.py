@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+# ============================================================
+# PER-STAGE CONCURRENCY LIMITS
+# Blocking work (model inference, Chroma) runs on a dedicated,
+# sized thread pool per stage so it never blocks the event
+# loop and one stage cannot starve the others. Async work
+# (LLM calls) is capped with a semaphore per stage.
+# ============================================================
+STAGE_LIMITS = {
+    "embed": int(os.getenv("EMBED_CONCURRENCY", "2")),
+    "vector": int(os.getenv("VECTOR_CONCURRENCY", "4")),
+    "llm": int(os.getenv("LLM_CONCURRENCY", "8")),
+    "io": int(os.getenv("IO_CONCURRENCY", "4")),
+}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+# Semaphores belong to an event loop, so they are created per loop
+_semaphores = {}
+
+
+def get_executor(stage: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(stage)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=STAGE_LIMITS.get(stage, 4),
+                thread_name_prefix=stage
+            )
+            _executors[stage] = executor
+        return executor
+
+
+async def run_blocking(stage: str, fn, *args, **kwargs):
+    """
+    Run a blocking call on the stage's thread pool and await it,
+    in a copy of the caller's context (request metrics follow it).
+    """
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(stage), partial(context.run, fn, *args, **kwargs)
+    )
+
+
+@asynccontextmanager
+async def stage_slot(stage: str):
+    """
+    Hold one of the stage's concurrency slots.
+    """
+
+    loop = asyncio.get_running_loop()
+    key = (id(loop), stage)
+
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(STAGE_LIMITS.get(stage, 4))
+        _semaphores[key] = semaphore
+
+    async with semaphore:
+        yield
@@ -0,0 +1,225 @@
+import math
+import os
+import re
+import threading
+
+from app.services.metrics import timed
+
+# ============================================================
+# CONTEXT PACKING
+# Retrieved chunks overlap (chunk_text overlaps by 80 chars) and
+# neighbours often repeat each other. Before prompting, chunks
+# are merged back into contiguous spans by their offsets, near
+# duplicates are dropped and spans are packed against a token
+# budget instead of a character cap.
+# ============================================================
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Hugging Face tokenizer id or tokenizer.json path matching the LLM.
+# Default: the Llama 3.1 tokenizer (byte-level BPE, as used by the
+# default LLM_MODEL) from an ungated mirror, cached after the first
+# download. Empty, or when it cannot be loaded: tokens are estimated
+# from the character count (with a warning).
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "NousResearch/Meta-Llama-3.1-8B-Instruct")
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+
+# Spans sharing at least this fraction of word shingles are duplicates
+DUPLICATE_SIMILARITY = 0.8
+SHINGLE_WORDS = 5
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    The CONTEXT_TOKENIZER, loaded once (at warm-up); None when token
+    counts are estimated.
+    """
+
+    global _tokenizer, _tokenizer_loaded
+
+    if _tokenizer_loaded:
+        return _tokenizer
+
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            if CONTEXT_TOKENIZER:
+                try:
+                    from tokenizers import Tokenizer
+
+                    path = CONTEXT_TOKENIZER
+                    if not os.path.isfile(path):
+                        # Downloaded from Python, not by the tokenizers
+                        # extension: a daemon thread stuck in its
+                        # retries aborts the interpreter at exit
+                        from huggingface_hub import hf_hub_download
+
+                        path = hf_hub_download(CONTEXT_TOKENIZER, "tokenizer.json")
+                    _tokenizer = Tokenizer.from_file(path)
+                except Exception as e:
+                    print(f"[WARN] Tokenizer {CONTEXT_TOKENIZER} unavailable: {e}")
+
+            if _tokenizer is None:
+                print(
+                    f"[WARN] No tokenizer: token budgets use an estimate of "
+                    f"{CHARS_PER_TOKEN:g} characters per token"
+                )
+            _tokenizer_loaded = True
+
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        encoding = tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= budget:
+            return text
+        return text[:encoding.offsets[budget - 1][1]] if budget > 0 else ""
+    return text[:int(budget * CHARS_PER_TOKEN)]
+
+
+def merge_spans(chunks: list[dict]) -> list[dict]:
+    """
+    Merge chunks of the same document that overlap or touch into
+    one span, using their "start" / "end" offsets. Chunks without
+    offsets stay as they are. Each span keeps the best (lowest)
+    rank of the chunks it was built from.
+    """
+
+    spans = []
+    by_doc = {}
+
+    for rank, chunk in enumerate(chunks):
+        if chunk.get("start") is None or chunk.get("end") is None:
+            spans.append({
+                "doc_id": chunk.get("doc_id"),
+                "start": None,
+                "text": chunk["text"],
+                "rank": rank
+            })
+            continue
+        by_doc.setdefault(chunk.get("doc_id"), []).append((rank, chunk))
+
+    for doc_id, ranked in by_doc.items():
+        current = None
+
+        for rank, chunk in sorted(ranked, key=lambda item: item[1]["start"]):
+            if current is not None and chunk["start"] <= current["end"]:
+                if chunk["end"] > current["end"]:
+                    current["text"] += chunk["text"][current["end"] - chunk["start"]:]
+                    current["end"] = chunk["end"]
+                current["rank"] = min(current["rank"], rank)
+                continue
+
+            current = {
+                "doc_id": doc_id,
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "text": chunk["text"],
+                "rank": rank
+            }
+            spans.append(current)
+
+    return spans
+
+
+class SpanCache:
+    """
+    Token counts and shingles of span texts, shared by the
+    pack_context() calls of one batch: spans built from chunks that
+    several questions retrieved are measured once.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+
+    def get(self, kind: str, text: str, compute):
+        key = (kind, text)
+        if key in self.values:
+            self.hits += 1
+            return self.values[key]
+        value = self.values[key] = compute(text)
+        return value
+
+
+def drop_duplicates(spans: list[dict], cache: SpanCache = None) -> list[dict]:
+    """
+    Drop spans whose text is (nearly) contained in a better-ranked
+    span, e.g. headers and footers repeated on every page.
+    """
+
+    kept = []
+    kept_shingles = []
+
+    for span in sorted(spans, key=lambda s: s["rank"]):
+        shingles = cache.get("shingles", span["text"], _shingles) if cache else _shingles(span["text"])
+        if not shingles:
+            continue
+        if any(
+            len(shingles & other) >= DUPLICATE_SIMILARITY * len(shingles)
+            for other in kept_shingles
+        ):
+            continue
+        kept.append(span)
+        kept_shingles.append(shingles)
+
+    return kept
+
+
+@timed("pack_context")
+def pack_context(chunks: list, budget: int = None, cache: SpanCache = None) -> str:
+    """
+    Build the prompt context from retrieved chunks (best first):
+    dicts with "text" and optional "doc_id" / "start" / "end", or
+    plain strings. Merges overlaps, removes duplicates, then adds
+    spans by rank while they fit in `budget` tokens. Spans are
+    joined in document order. `cache` reuses span measurements
+    across calls.
+    """
+
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    chunks = [c if isinstance(c, dict) else {"text": c} for c in chunks]
+
+    spans = drop_duplicates(merge_spans(chunks), cache)
+
+    packed = []
+    used = 0
+    for span in spans:
+        tokens = cache.get("tokens", span["text"], count_tokens) if cache else count_tokens(span["text"])
+        if used + tokens > budget:
+            if packed:
+                continue
+            # Even the best span is too long: keep its beginning
+            span = dict(span, text=truncate_tokens(span["text"], budget))
+            tokens = budget
+        packed.append(span)
+        used += tokens
+
+    packed.sort(key=lambda s: (
+        s["start"] is None,
+        s.get("doc_id") or "",
+        s["start"] if s["start"] is not None else s["rank"]
+    ))
+    return "\n\n".join(span["text"].strip() for span in packed)
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {
+        tuple(words[i:i + SHINGLE_WORDS])
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
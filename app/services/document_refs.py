@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes
+    fcntl = None
+
+
+class DocumentRefs:
+    """
+    Which uploads hold each document.
+
+    Documents are keyed by content hash, so users uploading the
+    same file share one document. Each successful upload adds a
+    reference; removing an upload only deletes the document once no
+    other upload still holds it.
+
+    Stored as one JSON file ({doc_id: [upload_id, ...]}), re-read
+    under a file lock on every change so API workers agree.
+    """
+
+    def __init__(self, path: str = "app/data/document_refs.json"):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def add(self, doc_id: str, upload_id: str):
+        with self._locked() as refs:
+            holders = refs.setdefault(doc_id, [])
+            if upload_id not in holders:
+                holders.append(upload_id)
+
+    def release(self, doc_id: str, upload_id: str) -> int:
+        """
+        Drop one upload's reference. Returns how many remain.
+        """
+
+        with self._locked() as refs:
+            holders = [h for h in refs.get(doc_id, []) if h != upload_id]
+            if holders:
+                refs[doc_id] = holders
+            else:
+                refs.pop(doc_id, None)
+            return len(holders)
+
+    def drop(self, doc_id: str):
+        with self._locked() as refs:
+            refs.pop(doc_id, None)
+
+    def clear(self):
+        with self._locked() as refs:
+            refs.clear()
+
+    @contextmanager
+    def _locked(self):
+        with self.lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    refs = json.load(f)
+            except (OSError, ValueError):
+                refs = {}
+
+            yield refs
+
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(refs, f)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,337 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes
+    fcntl = None
+
+# Rows copied at a time while compacting the disk tier
+COMPACT_BLOCK_ROWS = 4096
+
+
+def _file_id(stat) -> tuple:
+    return (stat.st_dev, stat.st_ino)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings.
+
+    Keys are a hash of the model name plus the text. Two tiers:
+    - memory: LRU of recently used vectors
+    - disk:   one float32 matrix file, read through a memory map,
+              with an append-only index of key -> row offset
+
+    The disk tier may be shared by several processes: appends and
+    compaction hold an exclusive file lock. Past `disk_items` rows
+    it is compacted to its newest three quarters.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str = "app/data/embed_cache",
+        memory_items: int = 10000,
+        use_disk: bool = True,
+        disk_items: int = 200000
+    ):
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self.dim = None
+        self.rows = {}
+        self.mmap = None
+        # (device, inode) of the index read into self.rows
+        self.index_id = None
+
+        self.disk_dir = None
+        if use_disk:
+            safe_name = model_name.replace("/", "__")
+            self.disk_dir = os.path.join(cache_dir, safe_name)
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.index_path = os.path.join(self.disk_dir, "index.txt")
+            self.lock_path = os.path.join(self.disk_dir, "lock")
+            with self._disk_lock():
+                self._load_index()
+                if self.dim is not None:
+                    # Cut off a row or index line torn by a crash mid-append
+                    self._vector_rows()
+                    self._trim_index()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(
+            (self.model_name + "\0" + text).encode("utf-8")
+        ).hexdigest()
+
+    # =========================
+    # LOOKUP / STORE
+    # =========================
+    def get_many(self, keys: list[str]) -> list:
+        """
+        Returns a vector (float32 array) or None for each key.
+        """
+
+        results = []
+        with self.lock:
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.hits_memory += 1
+                    results.append(vector)
+                    continue
+
+                vector = self._read_disk(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.hits_disk += 1
+                    results.append(vector)
+                    continue
+
+                self.misses += 1
+                results.append(None)
+
+        return results
+
+    def put_many(self, keys: list[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self.lock:
+            new_rows = []
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+                if self.disk_dir and key not in self.rows:
+                    new_rows.append((key, vector))
+
+            if new_rows:
+                self._append_disk(new_rows)
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        hits = self.hits_memory + self.hits_disk
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self.memory),
+            "disk_items": len(self.rows)
+        }
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    # =========================
+    # DISK TIER
+    # =========================
+    # index.txt: "<dim>\t<vector file>" then one "<key>\t<row>" line
+    # per stored vector. Compaction writes a new vector file and
+    # swaps the index in one rename; processes still holding the
+    # old index keep reading the old (unlinked) file consistently.
+    @contextmanager
+    def _disk_lock(self):
+        with open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        self.dim = None
+        self.rows = {}
+        self.mmap = None
+        self.index_id = None
+        self.vectors_path = os.path.join(self.disk_dir, "vectors.f32")
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                stat = os.fstat(f.fileno())
+                content = f.read()
+        except FileNotFoundError:
+            return
+
+        self.index_id = _file_id(stat)
+
+        # A last line without its newline was torn by a crash
+        lines = content.split("\n")[:-1]
+        if not lines:
+            return
+
+        dim, _, vectors_name = lines[0].partition("\t")
+        self.dim = int(dim)
+        if vectors_name:
+            self.vectors_path = os.path.join(self.disk_dir, vectors_name)
+
+        total_rows = 0
+        if os.path.exists(self.vectors_path):
+            total_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+        for line in lines[1:]:
+            key, _, row = line.partition("\t")
+            # Rows past the end of the vector file were never fully written
+            if row and int(row) < total_rows:
+                self.rows[key] = int(row)
+
+    def _index_changed(self) -> bool:
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return self.index_id is not None
+        return _file_id(stat) != self.index_id
+
+    def _vector_rows(self) -> int:
+        """
+        Whole rows in the vector file, cutting off a torn last row.
+        Called with the disk lock held.
+        """
+
+        try:
+            size = os.path.getsize(self.vectors_path)
+        except FileNotFoundError:
+            return 0
+
+        row_bytes = 4 * self.dim
+        if size % row_bytes:
+            os.truncate(self.vectors_path, size - size % row_bytes)
+        return size // row_bytes
+
+    def _trim_index(self):
+        """
+        Cut a torn last index line so appends start on a new line.
+        Called with the disk lock held.
+        """
+
+        with open(self.index_path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+
+            # Index lines are short: the last newline is near the end
+            tail = max(0, size - 4096)
+            f.seek(tail)
+            f.truncate(tail + f.read().rfind(b"\n") + 1)
+
+    def _read_disk(self, key: str):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+
+        try:
+            if self.mmap is None or row >= self.mmap.shape[0]:
+                self._remap()
+        except FileNotFoundError:
+            # Compacted by another process: start over from its index
+            with self._disk_lock():
+                self._load_index()
+            return None
+
+        return np.array(self.mmap[row])
+
+    def _remap(self):
+        total_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        self.mmap = np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(total_rows, self.dim)
+        )
+
+    def _write_index(self, vectors_name: str, rows: list):
+        """
+        Replace the index in one rename. `rows` is [(key, row)].
+        """
+
+        temp_path = f"{self.index_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(f"{self.dim}\t{vectors_name}\n")
+            for key, row in rows:
+                f.write(f"{key}\t{row}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.index_path)
+
+        self.index_id = _file_id(os.stat(self.index_path))
+        self.vectors_path = os.path.join(self.disk_dir, vectors_name)
+        self.rows = dict(rows)
+        self.mmap = None
+
+    def _append_disk(self, new_rows: list):
+        with self._disk_lock():
+            # Created, compacted or cleared by another process
+            if self._index_changed():
+                self._load_index()
+                new_rows = [(key, v) for key, v in new_rows if key not in self.rows]
+                if not new_rows:
+                    return
+
+            if self.dim is None:
+                self.dim = len(new_rows[0][1])
+                self._write_index(f"vectors.{uuid.uuid4().hex[:8]}.f32", [])
+
+            # Counts rows appended by other processes too
+            start = self._vector_rows()
+            self._trim_index()
+
+            # Vectors first, then the index, so a crash never leaves
+            # index entries pointing at missing rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack([v for _, v in new_rows]).tobytes())
+
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                for offset, (key, _) in enumerate(new_rows):
+                    self.rows[key] = start + offset
+                    f.write(f"{key}\t{start + offset}\n")
+
+            if start + len(new_rows) > self.disk_items:
+                self._compact()
+
+    def _compact(self):
+        """
+        Keep the newest rows (3/4 of disk_items) in a new vector
+        file. Called with the disk lock held.
+        """
+
+        # Every process's entries, not only the ones seen here
+        self._load_index()
+        self._remap()
+
+        keep = sorted(self.rows.items(), key=lambda item: item[1])
+        keep = keep[-(self.disk_items * 3 // 4):] if self.disk_items else []
+
+        old_path = self.vectors_path
+        vectors_name = f"vectors.{uuid.uuid4().hex[:8]}.f32"
+        with open(os.path.join(self.disk_dir, vectors_name), "wb") as f:
+            for start in range(0, len(keep), COMPACT_BLOCK_ROWS):
+                block = [row for _, row in keep[start:start + COMPACT_BLOCK_ROWS]]
+                f.write(np.ascontiguousarray(self.mmap[block]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.mmap = None
+        self._write_index(vectors_name, [(key, row) for row, (key, _) in enumerate(keep)])
+        os.remove(old_path)
+
+        print(f"[INFO] Embedding cache compacted to {len(keep)} vectors")
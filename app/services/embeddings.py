@@ -1,13 +1,253 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import numpy as np
+import os
+import time
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.concurrency import run_blocking
+from app.services.metrics import CACHE_LOOKUPS, detach_request, span, timed
+
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
+# ============================================================
+# INFERENCE BACKEND
+# "torch": sentence-transformers on PyTorch
+# "onnx":  the same model exported to ONNX (see onnx_embedder.py),
+#          run on ONNX Runtime, optionally int8-quantized
+# ============================================================
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", f"app/data/models/{EMBED_MODEL}-onnx")
+EMBED_ONNX_QUANTIZED = os.getenv("EMBED_ONNX_QUANTIZED", "false").lower() == "true"
+# Intra-op threads for inference (0: library default, all cores)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_ONNX_BATCH = int(os.getenv("EMBED_ONNX_BATCH", "32"))
+
+
+def embedding_model_id(model_name: str = EMBED_MODEL, backend: str = None) -> str:
+    """
+    Identity of the vectors a configuration produces. fp32 ONNX
+    reproduces the PyTorch vectors to float precision and shares
+    their id (caches and stored artifacts stay valid); int8 does
+    not.
+    """
+
+    if (backend or EMBED_BACKEND).lower() == "onnx" and EMBED_ONNX_QUANTIZED:
+        return f"{model_name}+onnx-int8"
+    return model_name
+
+# ============================================================
+# EMBEDDING CACHE
+# ============================================================
+ENABLE_EMBED_CACHE = os.getenv("ENABLE_EMBED_CACHE", "true").lower() == "true"
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "app/data/embed_cache")
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "10000"))
+EMBED_CACHE_DISK = os.getenv("EMBED_CACHE_DISK", "true").lower() == "true"
+# Vectors kept on disk; beyond this the oldest quarter is dropped
+EMBED_CACHE_DISK_ITEMS = int(os.getenv("EMBED_CACHE_DISK_ITEMS", "200000"))
+
+# ============================================================
+# QUERY MICRO-BATCHING
+# ============================================================
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+
 
 class EmbeddingModel:
-    def __init__(self):
-        self.model =  SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, model_name: str = EMBED_MODEL, backend: str = None):
+        self.model_name = model_name
+        self.backend = (backend or EMBED_BACKEND).lower()
+
+        if self.backend == "onnx":
+            from app.services.onnx_embedder import OnnxEncoder
+
+            self.model = OnnxEncoder(
+                EMBED_ONNX_DIR,
+                quantized=EMBED_ONNX_QUANTIZED,
+                threads=EMBED_THREADS,
+                batch_size=EMBED_ONNX_BATCH
+            )
+        elif self.backend == "torch":
+            # Imported here: sentence-transformers pulls in torch
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if EMBED_THREADS:
+                torch.set_num_threads(EMBED_THREADS)
+            self.model = SentenceTransformer(model_name)
+        else:
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+
+        self.cache = None
+        if ENABLE_EMBED_CACHE:
+            self.cache = EmbeddingCache(
+                embedding_model_id(model_name, self.backend),
+                cache_dir=EMBED_CACHE_DIR,
+                memory_items=EMBED_CACHE_MEMORY_ITEMS,
+                use_disk=EMBED_CACHE_DISK,
+                disk_items=EMBED_CACHE_DISK_ITEMS
+            )
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """
+        Convert text chunks into vector embeddings.
+        """
+
+        return self.embed_array(texts).tolist()
+
+    @timed("embed_texts")
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """
+        embed_texts() as one float32 array, one row per text.
+
+        Cached texts are served from the embedding cache; only the
+        misses are encoded, together in one batch.
+        """
+
+        if self.cache is None or not texts:
+            return np.asarray(self.model.encode(texts), dtype=np.float32)
+
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Identical texts within one call are encoded once
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
 
-    def embed_texts(self, texts:list[str])->list[list[float]]:
-          """
-        Convert text chunks into vector embeddings
+        hits = len(vectors) - sum(vector is None for vector in vectors)
+        CACHE_LOOKUPS.inc(hits, cache="embedding", result="hit")
+        CACHE_LOOKUPS.inc(len(vectors) - hits, cache="embedding", result="miss")
+
+        if missing:
+            missing_keys = list(missing)
+            encoded = np.asarray(
+                self.model.encode([missing[k] for k in missing_keys]),
+                dtype=np.float32
+            )
+            self.cache.put_many(missing_keys, encoded)
+
+            by_key = dict(zip(missing_keys, encoded))
+            vectors = [
+                by_key[keys[i]] if vector is None else vector
+                for i, vector in enumerate(vectors)
+            ]
+
+        return np.stack(vectors)
+
+    def warm_up(self):
+        # The first encode pays for kernel and graph initialization
+        self.model.encode(["warm-up"])
+
+    async def aembed_texts(self, texts: list[str]) -> list[list[float]]:
+        """
+        Async embed_texts(), run on the "embed" thread pool.
         """
+        return await run_blocking("embed", self.embed_texts, texts)
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache else {}
+
+
+class EmbeddingBatcher:
+    """
+    Async front end for EmbeddingModel.
+
+    Concurrent embed() calls are encoded with a single
+    aembed_texts() call off the event loop, and the vectors are
+    handed back to each caller. A call arriving alone is encoded
+    right away; calls that queued up together (e.g. while the
+    previous batch was encoding) wait up to `max_wait_ms` more for
+    company, until `max_batch` texts are waiting.
+    """
+
+    def __init__(
+        self,
+        model: EmbeddingModel,
+        max_wait_ms: float = EMBED_BATCH_WAIT_MS,
+        max_batch: int = EMBED_MAX_BATCH
+    ):
+        self.model = model
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+
+        self.queue = None
+        self.worker = None
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    async def embed(self, text: str) -> list[float]:
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        with span("query_embed"):
+            await self.queue.put((text, future, time.perf_counter()))
+            return await future
+
+    async def _run(self):
+        # Serves every request, not the one that started it
+        detach_request()
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # Only a burst opens the collection window
+            deadline = loop.time() + (self.max_wait if len(batch) > 1 else 0)
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            self._record(batch, started)
+
+            texts = [text for text, _, _ in batch]
+            try:
+                vectors = await self.model.aembed_texts(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def _record(self, batch: list, started: float):
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        for _, _, queued_at in batch:
+            wait = started - queued_at
+            self.total_wait += wait
+            self.max_wait_seen = max(self.max_wait_seen, wait)
 
-          embeddings = self.model.encode(texts)
-          return embeddings.tolist()    
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_queue_wait_ms": round(self.total_wait / self.items * 1000, 2) if self.items else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_seen * 1000, 2),
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch": self.max_batch
+        }
@@ -1,6 +1,18 @@
 from pypdf import PdfReader
 from pathlib import Path
+from app.services.ocr_cache import OCRCache
+from app.services.metrics import observe_stage, timed_iter
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from types import SimpleNamespace
+import hashlib
+import multiprocessing
 import os
+import re
+import threading
+import time
 
 # ============================================================
 # OPTIONAL OCR IMPORTS
@@ -32,117 +44,697 @@ POPPLER_PATH = r"C:\poppler\poppler-25.12.0\Library\bin"
 if os.path.exists(POPPLER_PATH):
     os.environ["PATH"] += os.pathsep + POPPLER_PATH
 
+# ============================================================
+# PARALLEL PAGE EXTRACTION
+# ============================================================
+PDF_PARALLEL = os.getenv("PDF_PARALLEL", "true").lower() == "true"
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+# Below this many pages the process pool costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+
+# ============================================================
+# STREAMING OCR
+# Pages are rendered and OCR'd in small windows inside the
+# workers, so at most OCR_WORKERS * OCR_WINDOW page images
+# exist at any time, however long the document is.
+# ============================================================
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_WINDOW = int(os.getenv("OCR_WINDOW", "2"))
+
+# ============================================================
+# PER-PAGE OCR SELECTION
+# A page is OCR'd only if it has almost no text layer and
+# draws at least one image. DPI is chosen from the page size
+# unless OCR_DPI forces a fixed value.
+# ============================================================
+OCR_PAGE_MIN_CHARS = int(os.getenv("OCR_PAGE_MIN_CHARS", "50"))
+OCR_DPI = int(os.getenv("OCR_DPI", "0"))
+OCR_TARGET_PX = int(os.getenv("OCR_TARGET_PX", "3508"))  # A4 long side @ 300 DPI
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "400"))
+
+ENABLE_OCR_CACHE = os.getenv("ENABLE_OCR_CACHE", "true").lower() == "true"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "app/data/ocr_cache")
+
+ocr_cache = OCRCache(OCR_CACHE_DIR) if ENABLE_OCR_CACHE else None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Shared worker processes for page-level work.
+    Uses "spawn" so workers never inherit torch / model threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(PDF_WORKERS, OCR_WORKERS),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _stage(job, name: str):
+    """
+    Stage tracker for an ingestion job, or a no-op when called
+    outside of a job.
+    """
+    if job is None:
+        return nullcontext(SimpleNamespace())
+    return job.stage(name)
+
+
+# ============================================================
+# ACADEMIC SIGNAL BOOSTING
+# Lines matching these keywords are repeated as a compact
+# block so that retrieval finds them easily.
+# ============================================================
+BOOST_KEYWORDS = [
+    "semester", "year", "session",
+    "effective from", "admitted"
+]
+
+# .txt files are streamed in blocks of roughly this many characters
+TXT_BLOCK_CHARS = 256 * 1024
+
+
+def extract_text(file_path: str, job=None) -> str:
+    """
+    Detect file type and extract text as one cleaned string.
+    Image-only PDF pages are OCR'd individually.
+
+    Kept for compatibility: ingestion uses iter_document_chunks()
+    instead, which never holds the whole document in memory (and
+    is what the "parse" metric times). Both place the boosted
+    lines after the document text, so chunk_text() of this string
+    gives the same chunks.
+    """
+
+    text = "\n".join(
+        text for _, text in _boost_stream(iter_numbered_pages(file_path, job=job))
+    )
 
-def extract_text(file_path: str) -> str:
+    if not text.strip():
+        raise ValueError("No extractable text found in document.")
+
+    return text
+
+
+def iter_document_chunks(
+    file_path: str,
+    job=None,
+    chunk_size: int = 500,
+    overlap: int = 80,
+    stats: dict = None
+):
+    """
+    Streaming parse -> clean -> boost -> chunk.
+
+    Yields {"text", "start", "end", "page"} per chunk, where
+    start / end are character offsets in the cleaned document
+    and page is the 1-based PDF page the chunk starts on (None
+    for .txt files and the boosted-lines block). Chunks are
+    yielded as soon as the pages they come from are ready.
+    If `stats` is given, stats["characters"] is kept up to date
+    with the amount of cleaned text seen.
+    """
+
+    if stats is None:
+        stats = {}
+    stats.setdefault("characters", 0)
+
+    # Offset of each page in the joined document, for page lookup
+    page_starts = []
+    page_numbers = []
+
+    def tracked(pages):
+        offset = 0
+        for page, text in pages:
+            page_starts.append(offset)
+            page_numbers.append(page)
+            offset += len(text) + 1
+            stats["characters"] += len(text)
+            yield text
+
+    # "parse": text extraction, OCR and cleaning, per document
+    pages = tracked(_boost_stream(
+        timed_iter("parse", iter_numbered_pages(file_path, job=job))
+    ))
+
+    with _stage(job, "chunk") as stage:
+        stage.count = 0
+        for start, chunk in iter_chunk_spans(pages, chunk_size, overlap):
+            stage.count += 1
+            yield {
+                "text": chunk,
+                "start": start,
+                "end": start + len(chunk),
+                "page": page_numbers[bisect_right(page_starts, start) - 1]
+            }
+
+
+def iter_clean_pages(file_path: str, job=None):
     """
-    Detect file type and extract text.
-    Falls back to OCR for scanned PDFs.
+    Yield cleaned, non-empty page texts in document order.
+    .txt files are treated as a sequence of line-aligned blocks.
+    """
+
+    for _, text in iter_numbered_pages(file_path, job=job):
+        yield text
+
+
+def iter_numbered_pages(file_path: str, job=None):
+    """
+    Like iter_clean_pages(), but yields (page, text) where page
+    is the 1-based PDF page number, or None for .txt blocks.
     """
 
     ext = Path(file_path).suffix.lower()
 
     if ext == ".pdf":
-        text = _extract_pdf(file_path)
-
-        # ====================================================
-        # OCR fallback for scanned PDFs (🔥 FIXED + TOGGLED)
-        # ====================================================
-        if len(text.strip()) < 500:
-            print("[INFO] Low text detected.")
-            if ENABLE_OCR and pytesseract and convert_from_path:
-                print("[INFO] OCR enabled, switching to OCR...")
-                text = _extract_pdf_with_ocr(file_path)
-            else:
-                print("[WARN] OCR disabled or unavailable. Skipping OCR.")
-
+        texts = (
+            (index + 1, text)
+            for index, text in iter_pdf_texts(file_path, job=job)
+        )
     elif ext == ".txt":
-        text = _extract_txt(file_path)
-
+        texts = ((None, text) for text in _iter_txt_blocks(file_path, job=job))
     else:
         raise ValueError("Unsupported file type.")
 
-    if not text.strip():
-        raise ValueError("No extractable text found in document.")
+    for page, text in texts:
+        text = clean_text(text)
+        if text:
+            yield page, text
 
-    # ============================================================
-    # Academic signal boosting (UNCHANGED)
-    # ============================================================
+
+def _important_lines(text: str) -> list[str]:
     important_lines = []
     for line in text.split("\n"):
         l = line.lower()
-        if any(k in l for k in [
-            "semester", "year", "session",
-            "effective from", "admitted"
-        ]):
+        if any(k in l for k in BOOST_KEYWORDS):
             important_lines.append(line.strip())
+    return important_lines
+
 
-    boosted_text = "\n".join(important_lines) + "\n\n" + text
-    return clean_text(boosted_text)
+def _boost_stream(pages):
+    """
+    Pass pages through and emit the boosted lines as a final
+    block once the whole document has been seen.
+
+    Behaviour change: the boosted lines used to be prepended to
+    the document. Streaming cannot know them before the last page,
+    so they now come last, which shifts every chunk's start offset
+    compared with stores built before the change (re-ingest to
+    get consistent offsets).
+    """
 
+    important_lines = []
+    for page, text in pages:
+        important_lines.extend(_important_lines(text))
+        yield page, text
+
+    if important_lines:
+        yield None, clean_text("\n".join(important_lines))
+
+
+def iter_pdf_texts(
+    file_path: str,
+    job=None,
+    failures: list = None,
+    force_ocr: bool = False,
+    ocr_workers: int = None,
+    ocr_window: int = None
+):
+    """
+    Yield (page_index, text) in page order as pages become ready.
 
-def _extract_pdf(file_path: str) -> str:
+    Image-only pages (every page with force_ocr) are OCR'd in
+    windows of consecutive pages on the process pool, with at
+    most `ocr_workers` windows in flight. Text pages queued
+    behind a pending window wait for it, so page order is kept
+    and memory stays bounded.
+
+    Per-page problems are appended to `failures` as
+    {"page": index, "error": message}.
+    """
+
+    if failures is None:
+        failures = []
+    parse_failures = []
+    ocr_failures = []
+
+    workers = max(1, ocr_workers or OCR_WORKERS)
+    window = max(1, ocr_window or OCR_WINDOW)
+    poppler_path = POPPLER_PATH if os.path.exists(POPPLER_PATH) else None
+    ocr_enabled = bool(ENABLE_OCR and pytesseract and convert_from_path)
+
+    # In page order: ("text", index, text)
+    # or ("ocr", first_index, future, cache_keys)
+    pending = deque()
+    group = []
+    counters = {"in_flight": 0, "ocr": 0, "ocr_failed": 0, "cached": 0, "skipped": 0}
+    ocr_stage = None
+
+    def submit_group():
+        if not group:
+            return
+
+        first = group[0]["index"]
+        last = group[-1]["index"]
+        dpi = group[0]["dpi"]
+
+        if workers == 1:
+            future = Future()
+            future.set_result(
+                _ocr_page_range(file_path, first + 1, last + 1, dpi, poppler_path)
+            )
+        else:
+            future = _get_pool().submit(
+                _ocr_page_range,
+                file_path, first + 1, last + 1, dpi, poppler_path
+            )
+
+        pending.append(("ocr", first, future, [p["cache_key"] for p in group]))
+        counters["in_flight"] += 1
+        group.clear()
+
+    def drain_head():
+        entry = pending.popleft()
+
+        if entry[0] == "text":
+            yield entry[1], entry[2]
+            return
+
+        _, first, future, cache_keys = entry
+        counters["in_flight"] -= 1
+
+        for offset, (text, error, seconds) in enumerate(future.result()):
+            index = first + offset
+            observe_stage("ocr_page", seconds)
+            if error:
+                ocr_failures.append({"page": index, "error": error})
+                counters["ocr_failed"] += 1
+            else:
+                if cache_keys[offset]:
+                    ocr_cache.put(cache_keys[offset], text)
+                counters["ocr"] += 1
+
+            ocr_stage.count += 1
+            yield index, text
+
+    with ExitStack() as ocr_scope:
+        with _stage(job, "parse") as parse_stage:
+            parse_stage.count = 0
+            parse_stage.errors = parse_failures
+
+            for page in iter_pdf_pages(file_path, failures=parse_failures):
+                parse_stage.count += 1
+                index = page["index"]
+                needs_ocr = force_ocr or page["image_only"]
+
+                if needs_ocr and not ocr_enabled:
+                    counters["skipped"] += 1
+                    needs_ocr = False
+
+                if not needs_ocr:
+                    submit_group()
+                    pending.append(("text", index, page["text"]))
+                else:
+                    if ocr_stage is None:
+                        ocr_stage = ocr_scope.enter_context(_stage(job, "ocr"))
+                        ocr_stage.count = 0
+                        ocr_stage.errors = ocr_failures
+
+                    dpi = _choose_dpi(page["width"], page["height"])
+                    cache_key = None
+                    cached = None
+
+                    if ocr_cache and page["content_hash"]:
+                        cache_key = ocr_cache.make_key(page["content_hash"], dpi)
+                        cached = ocr_cache.get(cache_key)
+
+                    if cached is not None:
+                        counters["cached"] += 1
+                        submit_group()
+                        pending.append(("text", index, cached))
+                    else:
+                        if group and (
+                            index != group[-1]["index"] + 1
+                            or dpi != group[0]["dpi"]
+                            or len(group) >= window
+                        ):
+                            submit_group()
+                        group.append({
+                            "index": index,
+                            "dpi": dpi,
+                            "cache_key": cache_key
+                        })
+
+                # Hand out ready pages; block on the oldest OCR window
+                # only when the in-flight limit is reached
+                while pending and (
+                    pending[0][0] == "text"
+                    or counters["in_flight"] >= workers
+                ):
+                    yield from drain_head()
+
+            submit_group()
+
+        while pending:
+            yield from drain_head()
+
+    failures.extend(parse_failures + ocr_failures)
+
+    if parse_failures:
+        print(f"[WARN] {len(parse_failures)} page(s) failed to parse.")
+    if ocr_failures:
+        print(f"[OCR WARN] {len(ocr_failures)} page(s) failed OCR.")
+    if counters["skipped"]:
+        print(
+            f"[WARN] OCR disabled or unavailable. "
+            f"Skipped {counters['skipped']} image-only page(s)."
+        )
+    if ocr_stage is not None:
+        print(
+            f"[INFO] OCR: {counters['ocr']} page(s) OCR'd, "
+            f"{counters['ocr_failed']} failed, "
+            f"{counters['cached']} from cache."
+        )
+
+
+def extract_pdf_pages(
+    file_path: str,
+    workers: int = None
+) -> tuple[list[dict], list[dict]]:
+    """
+    Parse every page of a PDF (text layer only).
+
+    Returns the page dicts from iter_pdf_pages() and a failure
+    report: [{"page": index, "error": message}, ...]
+    """
+
+    failures = []
+    pages = list(iter_pdf_pages(file_path, workers=workers, failures=failures))
+    return pages, failures
+
+
+def iter_pdf_pages(file_path: str, workers: int = None, failures: list = None):
+    """
+    Yield one dict per page, in page order:
+    {"index", "text", "image_only", "width", "height", "content_hash"}
+
+    Large PDFs are split into page ranges and parsed on a
+    process pool, each worker with its own PdfReader. Pages are
+    yielded range by range as soon as each range is done.
+    """
+
+    if failures is None:
+        failures = []
+
+    workers = workers or PDF_WORKERS
     reader = PdfReader(file_path)
-    text = ""
+    total_pages = len(reader.pages)
+
+    if (
+        not PDF_PARALLEL
+        or workers <= 1
+        or total_pages < PDF_PARALLEL_MIN_PAGES
+    ):
+        # Small documents: parse in-process, one page at a time
+        results = [_iter_page_range(reader, 0, total_pages)]
+    else:
+        # A few ranges per worker keeps the pool busy when
+        # some pages are much heavier than others
+        range_size = max(4, -(-total_pages // (workers * 4)))
+        pool = _get_pool()
+        futures = [
+            pool.submit(
+                _extract_page_range,
+                file_path,
+                start,
+                min(start + range_size, total_pages)
+            )
+            for start in range(0, total_pages, range_size)
+        ]
+        results = (future.result() for future in futures)
+
+    for page_range in results:
+        for page in page_range:
+            error = page.pop("error", None)
+            if error:
+                failures.append({"page": page["index"], "error": error})
+            yield page
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> list[dict]:
+    """
+    Worker: parse pages [start, end) with a private PdfReader.
+    """
+
+    return list(_iter_page_range(PdfReader(file_path), start, end))
+
+
+def _iter_page_range(reader: PdfReader, start: int, end: int):
+    for i in range(start, end):
+        page_info = {
+            "index": i,
+            "text": "",
+            "image_only": False,
+            "width": None,
+            "height": None,
+            "content_hash": None,
+            "error": None
+        }
 
-    for i, page in enumerate(reader.pages):
         try:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+            page = reader.pages[i]
+            page_info["width"] = float(page.mediabox.width)
+            page_info["height"] = float(page.mediabox.height)
+            page_info["text"] = page.extract_text() or ""
+
+            if len(page_info["text"].strip()) < OCR_PAGE_MIN_CHARS:
+                images = _page_images(page)
+                if images:
+                    page_info["image_only"] = True
+                    page_info["content_hash"] = _page_content_hash(
+                        page, images
+                    )
         except Exception as e:
-            print(f"[WARN] Failed page {i}: {e}")
+            page_info["error"] = str(e)
 
-    return clean_text(text)
+        yield page_info
 
 
-def _extract_pdf_with_ocr(file_path: str) -> str:
-    # ============================================================
-    # HARD SAFETY CHECK (UNCHANGED)
-    # ============================================================
-    if not (pytesseract and convert_from_path):
-        return ""
+def _page_images(page, resources=None, depth: int = 0) -> list:
+    """
+    Image XObjects drawn by a page, including those nested one
+    or two levels inside Form XObjects.
+    """
 
-    pages = convert_from_path(
+    if resources is None:
+        resources = page.get("/Resources")
+    if resources is None:
+        return []
+
+    xobjects = resources.get_object().get("/XObject")
+    if xobjects is None:
+        return []
+
+    images = []
+    for ref in xobjects.get_object().values():
+        obj = ref.get_object()
+        subtype = obj.get("/Subtype")
+        if subtype == "/Image":
+            images.append(obj)
+        elif subtype == "/Form" and depth < 2 and "/Resources" in obj:
+            images.extend(_page_images(page, obj["/Resources"], depth + 1))
+
+    return images
+
+
+def _page_content_hash(page, images: list) -> str:
+    """
+    Hash of what the page draws: its content stream plus the
+    raw bytes of its images.
+    """
+
+    digest = hashlib.sha256()
+
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    for image in images:
+        try:
+            digest.update(image.get_data())
+        except Exception:
+            digest.update(repr(sorted(image.keys())).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def _choose_dpi(width: float, height: float) -> int:
+    """
+    Render resolution for a page, from its size in points.
+    Aims for OCR_TARGET_PX on the long side so large pages are
+    not rendered at huge sizes and small ones stay legible.
+    """
+
+    if OCR_DPI:
+        return OCR_DPI
+
+    long_side = max(width or 0, height or 0)
+    if long_side <= 0:
+        return 300
+
+    dpi = round(OCR_TARGET_PX * 72 / long_side)
+    return max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+
+
+def ocr_pdf_pages(
+    file_path: str,
+    workers: int = None,
+    window: int = None
+) -> tuple[dict[int, str], list[dict]]:
+    """
+    OCR every page of a PDF, regardless of its text layer.
+    Returns {page_index: text} and a failure report.
+    """
+
+    failures = []
+    texts = dict(iter_pdf_texts(
         file_path,
-        dpi=300,
-        poppler_path=POPPLER_PATH if os.path.exists(POPPLER_PATH) else None
-    )
+        failures=failures,
+        force_ocr=True,
+        ocr_workers=workers,
+        ocr_window=window
+    ))
+    return texts, failures
+
+
+def _ocr_page_range(
+    file_path: str,
+    first_page: int,
+    last_page: int,
+    dpi: int,
+    poppler_path: str = None
+) -> list[tuple]:
+    """
+    Worker: render pages [first_page, last_page] (1-based) and
+    OCR them. Returns (text, error, seconds) per page, where
+    seconds is the page's OCR time plus its share of rendering.
+    """
 
-    text = ""
-    for i, page in enumerate(pages):
+    # One tesseract thread per worker; parallelism comes from the pool
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    count = last_page - first_page + 1
+    started = time.perf_counter()
+
+    try:
+        images = convert_from_path(
+            file_path,
+            dpi=dpi,
+            first_page=first_page,
+            last_page=last_page,
+            poppler_path=poppler_path
+        )
+    except Exception as e:
+        return [("", str(e), (time.perf_counter() - started) / count)] * count
+
+    render_seconds = (time.perf_counter() - started) / count
+
+    results = []
+    for i in range(count):
+        if i >= len(images):
+            results.append(("", "page was not rendered", render_seconds))
+            continue
+        started = time.perf_counter()
         try:
-            page_text = pytesseract.image_to_string(page, lang="eng")
-            if page_text:
-                text += page_text + "\n"
+            text = pytesseract.image_to_string(images[i], lang="eng") or ""
+            results.append((text, None, render_seconds + time.perf_counter() - started))
         except Exception as e:
-            print(f"[OCR WARN] Page {i}: {e}")
+            results.append(("", str(e), render_seconds + time.perf_counter() - started))
+        finally:
+            images[i].close()
+
+    return results
+
+
+def _iter_txt_blocks(file_path: str, job=None):
+    with _stage(job, "parse") as stage:
+        stage.count = 0
+        block = []
+        size = 0
 
-    return clean_text(text)
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                block.append(line)
+                size += len(line)
+                if size >= TXT_BLOCK_CHARS:
+                    stage.count += size
+                    yield "".join(block)
+                    block = []
+                    size = 0
 
+        if block:
+            stage.count += size
+            yield "".join(block)
 
-def _extract_txt(file_path: str) -> str:
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        return clean_text(f.read())
+
+_BLANK_LINES = re.compile(r"\n{2,}")
+_SPACES = re.compile(r" {2,}")
 
 
 def clean_text(text: str) -> str:
-    while "\n\n" in text:
-        text = text.replace("\n\n", "\n")
-    while "  " in text:
-        text = text.replace("  ", " ")
+    # Single pass each: collapse blank lines, then runs of spaces
+    text = _BLANK_LINES.sub("\n", text)
+    text = _SPACES.sub(" ", text)
     return text.strip()
 
 
+def iter_chunks(texts, chunk_size: int = 500, overlap: int = 80):
+    """
+    Streaming version of chunk_text().
+
+    `texts` is an iterable of cleaned page texts; they are
+    chunked as if joined with newlines, but only the unchunked
+    tail is ever buffered.
+    """
+
+    for _, chunk in iter_chunk_spans(texts, chunk_size, overlap):
+        yield chunk
+
+
+def iter_chunk_spans(texts, chunk_size: int = 500, overlap: int = 80):
+    """
+    Like iter_chunks(), but yields (start, chunk) where start is
+    the chunk's character offset in the joined document.
+    """
+
+    step = max(1, chunk_size - overlap)
+    buffer = ""
+    base = 0
+    pos = 0
+    started = False
+
+    for text in texts:
+        buffer = buffer[pos:] + ("\n" if started else "") + text
+        base += pos
+        pos = 0
+        started = True
+
+        while len(buffer) - pos > chunk_size:
+            yield base + pos, buffer[pos:pos + chunk_size]
+            pos += step
+
+    if len(buffer) > pos:
+        yield base + pos, buffer[pos:]
+
+
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 80) -> list[str]:
-    chunks = []
-    start = 0
-    length = len(text)
-
-    while start < length:
-        end = min(start + chunk_size, length)
-        chunks.append(text[start:end])
-        if end == length:
-            break
-        start = max(0, end - overlap)
-
-    return chunks
+    return list(iter_chunks([text], chunk_size, overlap))
@@ -0,0 +1,229 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# ============================================================
+# INGESTION STAGES (REPORTED IN THIS ORDER BY /jobs/{id})
+# ============================================================
+STAGES = ("parse", "ocr", "chunk", "embed", "store")
+
+
+class Stage:
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "pending"
+        self.count = None
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        duration_ms = None
+        if self.started_at is not None:
+            end = self.finished_at or time.time()
+            duration_ms = round((end - self.started_at) * 1000, 1)
+
+        return {
+            "name": self.name,
+            "status": self.status,
+            "count": self.count,
+            "errors": self.errors,
+            "duration_ms": duration_ms
+        }
+
+
+class IngestionJob:
+    def __init__(
+        self,
+        filename: str,
+        sha256: str,
+        size_bytes: int,
+        stages: tuple = STAGES
+    ):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.sha256 = sha256
+        self.size_bytes = size_bytes
+
+        self.status = "queued"
+        self.error = None
+        self.result = None
+
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.stages = {name: Stage(name) for name in stages}
+
+        # Called with the job when its status or a stage changes
+        self.listener = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Track one ingestion stage.
+        The yielded Stage can be given a `count` by the caller.
+        """
+
+        stage = self.stages.setdefault(name, Stage(name))
+        stage.status = "running"
+        stage.started_at = time.time()
+        self.changed()
+
+        try:
+            yield stage
+        except Exception:
+            stage.status = "failed"
+            raise
+        else:
+            stage.status = "done"
+        finally:
+            stage.finished_at = time.time()
+            self.changed()
+
+    def changed(self):
+        if self.listener is None:
+            return
+        try:
+            self.listener(self)
+        except Exception as e:
+            # Status reporting never fails the job
+            print(f"[WARN] Job {self.id} status not published: {e}")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "sha256": self.sha256,
+            "size_bytes": self.size_bytes,
+            "status": self.status,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": [stage.to_dict() for stage in self.stages.values()]
+        }
+
+
+class JobQueue:
+    """
+    Runs ingestion jobs on a background worker pool so that
+    /upload can return immediately.
+
+    Jobs submitted with the same `key` (e.g. a document hash) never
+    run at the same time: a later one waits, without holding a
+    worker, until the earlier one has finished.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_jobs: int = 200,
+        name: str = "ingest",
+        on_update=None
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name
+        )
+        self.max_jobs = max_jobs
+        # Called with a job whenever it changes (e.g. JobRegistry.publish)
+        self.on_update = on_update
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        # key -> jobs waiting for the running job with that key
+        self.waiting = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job: IngestionJob, fn, *args, key: str = None) -> IngestionJob:
+        job.listener = self.on_update
+        job.changed()
+
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict()
+
+            if key is not None:
+                if key in self.waiting:
+                    self.waiting[key].append((job, fn, args))
+                    return job
+                self.waiting[key] = []
+
+        self.executor.submit(self._run, key, job, fn, *args)
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, key, job: IngestionJob, fn, *args):
+        try:
+            self._run_job(job, fn, *args)
+        finally:
+            if key is not None:
+                self._start_next(key)
+
+    def _start_next(self, key: str):
+        with self.lock:
+            waiting = self.waiting[key]
+            if not waiting:
+                del self.waiting[key]
+                return
+            job, fn, args = waiting.pop(0)
+
+        self.executor.submit(self._run, key, job, fn, *args)
+
+    def _run_job(self, job: IngestionJob, fn, *args):
+        job.status = "running"
+        job.started_at = time.time()
+        job.changed()
+
+        try:
+            job.result = fn(job, *args)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"[ERROR] Ingestion job {job.id} failed: {e}")
+        finally:
+            for stage in job.stages.values():
+                if stage.status == "pending":
+                    stage.status = "skipped"
+            job.finished_at = time.time()
+            job.changed()
+
+    def _evict(self):
+        # Drop the oldest finished jobs once the registry is full
+        finished = [
+            job_id for job_id, job in self.jobs.items()
+            if job.status in ("done", "failed")
+        ]
+        while len(self.jobs) > self.max_jobs and finished:
+            self.jobs.pop(finished.pop(0), None)
+
+
+class JobRegistry:
+    """
+    Latest status of recent jobs as plain dicts (to_dict()), for
+    jobs run by other processes. Kept by the shared service process
+    so any API worker can answer GET /jobs/{id}.
+    """
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def publish(self, job: dict):
+        with self.lock:
+            self.jobs[job["job_id"]] = job
+            self.jobs.move_to_end(job["job_id"])
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
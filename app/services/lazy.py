@@ -0,0 +1,62 @@
+import threading
+import time
+
+from app.services.concurrency import run_blocking
+
+
+class LazyService:
+    """
+    Shared service built on first use instead of at import.
+
+    Attribute access is forwarded to the instance, so a LazyService
+    stands in for the object it builds; the first access (from
+    any thread) builds it, concurrent callers wait for that one
+    build. Async code should `await service.aget()` first so the
+    wait happens off the event loop.
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._instance = None
+        self._error = None
+        self._load_seconds = None
+
+    def get(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                started = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    self._error = f"{type(e).__name__}: {e}"
+                    raise
+                self._error = None
+                self._load_seconds = time.perf_counter() - started
+                print(f"[INFO] {self._name} ready in {self._load_seconds:.2f}s")
+            return self._instance
+
+    async def aget(self):
+        if self._instance is not None:
+            return self._instance
+        return await run_blocking("io", self.get)
+
+    def is_ready(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "load_seconds": (
+                round(self._load_seconds, 3) if self._load_seconds is not None else None
+            ),
+            "error": self._error
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -1,13 +1,228 @@
-from groq import Groq
+import asyncio
 import os
-from dotenv import load_dotenv
+import random
+import re
+import threading
+import time
+
+from app.services.concurrency import stage_slot
+from app.services.metrics import LLM_HEDGES, LLM_RETRIES, observe_stage, span, timed
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+
+# ============================================================
+# HTTP CLIENT
+# One keep-alive connection pool per client, shared by all
+# requests. GROQ_BASE_URL (read by the SDK) points the client at
+# another Groq-compatible server, e.g. benchmarks/fake_groq.py.
+# ============================================================
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+
+# ============================================================
+# RETRIES
+# Rate limits (429), server errors and dropped connections are
+# retried with full-jitter exponential backoff, never sooner than
+# the server's retry-after. The SDK's own retries are disabled.
+# ============================================================
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+
+# ============================================================
+# CLIENT-SIDE RATE LIMITS
+# Requests wait for budget before they are sent instead of
+# bursting into 429s. Tokens are estimated from the prompt plus
+# LLM_COMPLETION_TOKENS, then corrected by the reported usage and
+# the x-ratelimit-* response headers (which also replace
+# LLM_TOKENS_PER_MINUTE with the account's real limit).
+# 0 disables a limit.
+# ============================================================
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "6000"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "512"))
+
+# ============================================================
+# INTERACTIVE RESERVE
+# Background calls (document summaries) never queue for budget:
+# they only start when this fraction of both limits would still be
+# left afterwards, so /answer and /answer/stream never wait behind
+# them.
+# ============================================================
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.25"))
+
+# ============================================================
+# HEDGED REQUESTS (INTERACTIVE ANSWERS ONLY)
+# If no answer (first token, when streaming) has arrived after
+# this many ms, the same request is sent again and the first
+# response wins. Only sent when the rate limits allow it without
+# waiting. 0 disables hedging.
+# ============================================================
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", "0"))
+
+
+class LLMBusy(RuntimeError):
+    """
+    Still rate limited after every retry.
+    """
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe budget refilled continuously at `per_minute`.
+
+    reserve() takes its share immediately (the level may go below
+    zero) and returns how long the caller has to wait before using
+    it, so concurrent callers queue up in order without holding a
+    lock while they wait.
+    """
+
+    def __init__(self, per_minute: float):
+        self.lock = threading.Lock()
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self.blocked_until - now
+            if self.capacity:
+                # More than the whole bucket would never be granted
+                self.level -= min(amount, self.capacity)
+                wait = max(wait, -self.level / self.rate)
+            return max(0.0, wait)
+
+    def reserve_spare(self, amount: float, keep: float) -> float:
+        """
+        Take `amount` only if `keep` (a fraction of the capacity) is
+        left afterwards, without queueing. Returns 0 once taken,
+        otherwise roughly how long to wait before asking again.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if not self.capacity:
+                return 0.0
+
+            amount = min(amount, self.capacity * (1 - keep))
+            missing = amount + self.capacity * keep - self.level
+            if missing > 0:
+                return missing / self.rate
+            self.level -= amount
+            return 0.0
+
+    def try_reserve(self, amount: float) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until:
+                return False
+            if self.capacity:
+                if self.level < amount:
+                    return False
+                self.level -= amount
+            return True
+
+    def refund(self, amount: float):
+        # Negative amounts charge more than was reserved
+        with self.lock:
+            if self.capacity:
+                self.level = min(self.capacity, self.level + amount)
+
+    def set_limit(self, per_minute: float):
+        with self.lock:
+            self._refill(time.monotonic())
+            if not self.capacity:
+                self.level = per_minute
+            self.capacity = per_minute
+            self.rate = per_minute / 60
+            self.level = min(self.level, per_minute)
+
+    def observe(self, remaining: float):
+        """
+        The server's view of the remaining budget: never assume more.
+        """
+
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.capacity:
+                self.level = min(self.level, remaining)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _duration(value) -> float:
+    """
+    Groq reset durations ("7.66s", "2m59.56s", "120ms") in seconds.
+    """
+
+    if not value:
+        return 0.0
+    seconds = _number(value)
+    if seconds is not None:
+        return seconds
+
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(
+        float(amount) * units[unit]
+        for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    )
 
-load_dotenv()
-print("DEBUG GROQ_API_KEY =", os.getenv("GROQ_API_KEY"))
 
 class LLM:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        # Imported here so importing the app does not load the SDK
+        import groq
+        import httpx
+
+        self.errors = groq
+        limits = httpx.Limits(
+            max_connections=LLM_POOL_SIZE,
+            max_keepalive_connections=LLM_POOL_SIZE,
+            keepalive_expiry=60
+        )
+        timeout = httpx.Timeout(LLM_TIMEOUT, connect=10)
+
+        self.client = groq.Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.Client(limits=limits, timeout=timeout)
+        )
+        self.async_client = groq.AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            max_retries=0,
+            timeout=timeout,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout)
+        )
+
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
 
         # ==========================================================
         # MASTER SYSTEM PROMPT (CORE INTELLIGENCE LAYER)
@@ -67,8 +282,11 @@ TONE:
 - Teacher-like
 - Exam-safe
 """
-
-    def generate(self, prompt: str) -> str:
+    # =========================
+    # GENERATION
+    # =========================
+    @timed("llm_generate")
+    def generate(self, prompt: str, background: bool = False) -> str:
         """
         Generates a response using Groq LLM.
 
@@ -77,11 +295,292 @@ TONE:
         - Proper handling of question papers vs notes
         - Accurate code generation
         - No infinite or repetitive responses
+
+        `background`: not waited on by a user, only sent while
+        LLM_INTERACTIVE_RESERVE of the budget stays free.
+        """
+
+        response = self._complete(self._request(prompt), background=background)
+        return response.choices[0].message.content.strip()
+
+    @timed("llm_generate")
+    async def agenerate(self, prompt: str, hedge: bool = False) -> str:
+        """
+        Async generate(), using the async Groq client.
+        At most LLM_CONCURRENCY generations run at once.
+        `hedge`: interactive request, may be hedged.
         """
 
-        response = self.client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
+        request = self._request(prompt)
+
+        async with stage_slot("llm"):
+            if hedge and LLM_HEDGE_AFTER_MS:
+                response = await self._hedged(
+                    request, lambda reserved: self._acomplete(request, reserved)
+                )
+            else:
+                response = await self._acomplete(request)
+
+        return response.choices[0].message.content.strip()
+
+    async def astream(self, prompt: str, hedge: bool = False):
+        """
+        Async generator of answer tokens, using Groq streaming
+        completions. Holds one LLM_CONCURRENCY slot while streaming.
+        `hedge`: interactive request, the time to first token may
+        be hedged.
+        """
+
+        request = dict(self._request(prompt), stream=True)
+        requested = time.perf_counter()
+
+        async with stage_slot("llm"):
+            with span("llm_stream"):
+                if hedge and LLM_HEDGE_AFTER_MS:
+                    stream, token = await self._hedged(
+                        request,
+                        lambda reserved: self._afirst_token(request, reserved),
+                        discard=lambda opened: opened[0].close()
+                    )
+                else:
+                    stream, token = await self._afirst_token(request)
+
+                try:
+                    if token is None:
+                        return
+                    observe_stage("llm_first_token", time.perf_counter() - requested)
+                    yield token
+
+                    async for chunk in stream:
+                        token = self._token(chunk)
+                        if token:
+                            yield token
+                finally:
+                    await stream.close()
+
+    async def _afirst_token(self, request: dict, reserved: bool = False) -> tuple:
+        """
+        Open a stream and read up to its first token: (stream, token),
+        token None if the answer is empty.
+        """
+
+        stream = await self._acomplete(request, reserved)
+        try:
+            async for chunk in stream:
+                token = self._token(chunk)
+                if token:
+                    # Match generate(), which strips leading whitespace
+                    token = token.lstrip()
+                    if token:
+                        return stream, token
+        except BaseException:
+            await stream.close()
+            raise
+        return stream, None
+
+    @staticmethod
+    def _token(chunk):
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    # =========================
+    # RATE LIMITS AND RETRIES
+    # =========================
+    def _complete(self, request: dict, reserved: bool = False, background: bool = False):
+        cost = self._cost(request)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if background:
+                self._reserve_spare(cost)
+            elif not reserved:
+                self._wait(self._reserve(cost), time.sleep)
+            reserved = False
+
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**request)
+                return self._received(raw.headers, raw.parse(), cost)
+            except Exception as e:
+                delay = self._failed(e, attempt, cost)
+
+            time.sleep(delay)
+
+    async def _acomplete(self, request: dict, reserved: bool = False):
+        cost = self._cost(request)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            if not reserved:
+                await self._await(self._reserve(cost))
+            reserved = False
+
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(**request)
+                return self._received(raw.headers, await raw.parse(), cost)
+            except Exception as e:
+                delay = self._failed(e, attempt, cost)
+
+            await asyncio.sleep(delay)
+
+    async def _hedged(self, request: dict, call, discard=None):
+        """
+        Run `call(reserved)`; if it has not finished after
+        LLM_HEDGE_AFTER_MS and the budget allows it right away, run
+        a second one and keep whichever succeeds first. `discard`
+        releases a finished result that lost.
+        """
+
+        primary = asyncio.ensure_future(call(False))
+        done, _ = await asyncio.wait({primary}, timeout=LLM_HEDGE_AFTER_MS / 1000)
+        if done or not self._try_reserve(self._cost(request)):
+            return await primary
+
+        LLM_HEDGES.inc(request="sent")
+        backup = asyncio.ensure_future(call(True))
+        running = {primary, backup}
+        winner = None
+
+        try:
+            while running:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if winner is None and task.exception() is None:
+                        winner = task
+                if winner is not None:
+                    LLM_HEDGES.inc(request="won_by_" + ("backup" if winner is backup else "primary"))
+                    return winner.result()
+            # Both failed
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                    # Wait for it to close its connection
+                    await asyncio.gather(task, return_exceptions=True)
+                elif discard and not task.cancelled() and task.exception() is None:
+                    await discard(task.result())
+
+    def _cost(self, request: dict) -> int:
+        # Imported here: context_packer may load a tokenizer
+        from app.services.context_packer import count_tokens
+
+        return sum(count_tokens(m["content"]) for m in request["messages"]) + LLM_COMPLETION_TOKENS
+
+    def _reserve(self, cost: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(cost))
+
+    def _reserve_spare(self, cost: int):
+        """
+        Block until both budgets have room for `cost` beyond the
+        interactive reserve.
+        """
+
+        waited = 0.0
+        while True:
+            wait = self.requests.reserve_spare(1, LLM_INTERACTIVE_RESERVE)
+            if not wait:
+                wait = self.tokens.reserve_spare(cost, LLM_INTERACTIVE_RESERVE)
+                if not wait:
+                    break
+                self.requests.refund(1)
+
+            # Re-checked at least every second: interactive calls
+            # may take the budget meanwhile
+            wait = min(wait, 1.0)
+            time.sleep(wait)
+            waited += wait
+
+        if waited:
+            observe_stage("llm_rate_limit_wait", waited)
+
+    def _try_reserve(self, cost: int) -> bool:
+        if not self.requests.try_reserve(1):
+            return False
+        if not self.tokens.try_reserve(cost):
+            self.requests.refund(1)
+            return False
+        return True
+
+    def _refund(self, cost: int):
+        self.requests.refund(1)
+        self.tokens.refund(cost)
+
+    def _wait(self, seconds: float, sleep):
+        if seconds > 0:
+            observe_stage("llm_rate_limit_wait", seconds)
+            sleep(seconds)
+
+    async def _await(self, seconds: float):
+        if seconds > 0:
+            observe_stage("llm_rate_limit_wait", seconds)
+            await asyncio.sleep(seconds)
+
+    def _received(self, headers, response, cost: int):
+        self._observe_limits(headers)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.total_tokens:
+            # Settle the estimate with the real count
+            self.tokens.refund(cost - usage.total_tokens)
+        return response
+
+    def _observe_limits(self, headers):
+        # Groq: tokens are per minute, requests per day
+        limit = _number(headers.get("x-ratelimit-limit-tokens"))
+        if limit:
+            self.tokens.set_limit(limit)
+
+        remaining = _number(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining is not None:
+            self.tokens.observe(remaining)
+
+        if _number(headers.get("x-ratelimit-remaining-requests")) == 0:
+            self.requests.pause(_duration(headers.get("x-ratelimit-reset-requests")))
+
+    def _failed(self, error: Exception, attempt: int, cost: int) -> float:
+        """
+        Seconds to wait before retrying `error`, or raise it.
+        """
+
+        # The failed request did not use its budget
+        self._refund(cost)
+
+        status = getattr(error, "status_code", None)
+        if isinstance(error, self.errors.APIConnectionError):
+            reason = "connection"
+        elif status == 429:
+            reason = "rate_limited"
+        elif status is not None and (status >= 500 or status == 408):
+            reason = "server_error"
+        else:
+            raise error
+
+        retry_after = 0.0
+        response = getattr(error, "response", None)
+        if response is not None:
+            self._observe_limits(response.headers)
+            retry_after = _duration(response.headers.get("retry-after"))
+        if reason == "rate_limited":
+            # Every request waits, not only this one
+            self.tokens.pause(retry_after)
+
+        if attempt >= LLM_MAX_RETRIES:
+            if reason == "rate_limited":
+                raise LLMBusy(
+                    f"Groq rate limit still exceeded after {LLM_MAX_RETRIES} retries.",
+                    retry_after=retry_after
+                ) from error
+            raise error
+
+        LLM_RETRIES.inc(reason=reason)
+        backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+        return max(backoff, retry_after)
+
+    def _request(self, prompt: str) -> dict:
+        return {
+            "model": LLM_MODEL,
+            "messages": [
                 {
                     "role": "system",
                     "content": self.system_prompt
@@ -91,7 +590,5 @@ TONE:
                     "content": prompt
                 }
             ],
-            temperature=0.3  # Low temperature for precision & exam safety
-        )
-
-        return response.choices[0].message.content.strip()
+            "temperature": 0.3  # Low temperature for precision & exam safety
+        }
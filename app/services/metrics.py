@@ -0,0 +1,274 @@
+import bisect
+import contextvars
+import inspect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# ============================================================
+# METRICS
+# Latency histograms per pipeline stage and a few counters,
+# rendered in Prometheus text format by GET /metrics. Stage
+# timings of the current request are also returned in its
+# Server-Timing header. ENABLE_METRICS=false makes span(),
+# timed() and every observation a no-op.
+# ============================================================
+ENABLE_METRICS = os.getenv("ENABLE_METRICS", "true").lower() == "true"
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60
+)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+CHAR_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+_metrics = []
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLE_METRICS:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        if not ENABLE_METRICS:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append(
+                        f"{self.name}_bucket{_labels(key + (('le', bound),))} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_labels(key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    pairs = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent in each pipeline stage."
+)
+STAGE_ERRORS = Counter(
+    "rag_stage_errors_total", "Pipeline stage calls that raised."
+)
+REQUEST_SECONDS = Histogram(
+    "rag_http_request_seconds", "HTTP request latency (until the response headers)."
+)
+PROMPT_CHARS = Histogram(
+    "rag_prompt_chars", "Characters in prompts sent to the LLM.", CHAR_BUCKETS
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Tokens in prompts sent to the LLM.", TOKEN_BUCKETS
+)
+CHUNKS_RETRIEVED = Histogram(
+    "rag_chunks_retrieved", "Chunks retrieved as context per question.", COUNT_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result (hit / semantic_hit / miss)."
+)
+LLM_RETRIES = Counter(
+    "rag_llm_retries_total", "LLM requests retried, by reason (rate_limited / server_error / connection)."
+)
+LLM_HEDGES = Counter(
+    "rag_llm_hedges_total", "Hedged LLM requests sent, and which request won."
+)
+
+# =========================
+# SPANS
+# =========================
+# Spans of the request being handled (None outside requests).
+# run_blocking() copies the context, so spans recorded on the
+# stage thread pools are attributed to the request too.
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        seconds = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(seconds, stage=self.name)
+        # Not cancellation or a consumer closing a generator early
+        if kind is not None and issubclass(kind, Exception):
+            STAGE_ERRORS.inc(stage=self.name)
+
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.name, seconds))
+        return False
+
+
+_DISABLED = nullcontext()
+
+
+def span(name: str):
+    """
+    Context manager timing one stage call.
+    """
+    return _Span(name) if ENABLE_METRICS else _DISABLED
+
+
+def observe_stage(name: str, seconds: float):
+    """
+    Record a stage duration measured elsewhere (e.g. in a worker
+    process).
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def timed(name: str):
+    """
+    Decorator running a function (sync or async) inside span(name).
+    """
+
+    def decorate(fn):
+        if not ENABLE_METRICS:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with _Span(name):
+                    return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def timed_iter(name: str, iterable):
+    """
+    Pass the items of `iterable` through, recording the time spent
+    producing them (not the consumer's) as one `name` observation
+    once it is exhausted or closed. For stages run as generators.
+    """
+
+    if not ENABLE_METRICS:
+        yield from iterable
+        return
+
+    iterator = iter(iterable)
+    seconds = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - started
+            yield item
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def start_request() -> list:
+    """
+    Collect the spans of the current request into the returned list.
+    """
+
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def detach_request():
+    """
+    Stop attributing spans in this context to a request (long-lived
+    tasks started while handling one).
+    """
+
+    _request_spans.set(None)
+
+
+def server_timing(spans: list, total: float = None) -> str:
+    """
+    Server-Timing header value: milliseconds per stage, summed over
+    repeated calls, in first-call order.
+    """
+
+    durations = {}
+    for name, seconds in list(spans):
+        durations[name] = durations.get(name, 0.0) + seconds
+    if total is not None:
+        durations["total"] = total
+
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()
+    )
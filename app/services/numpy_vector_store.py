@@ -0,0 +1,936 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from app.services.metrics import timed
+from app.services.vector_store import VectorStore
+
+# Quantized search re-ranks this many candidates per requested result
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+# Rows converted to float at a time when scoring int8 codes (one
+# reused buffer of this many rows per search)
+SCORE_BLOCK_ROWS = 4096
+
+# Per-row columns stored next to the vectors: name -> (dtype, trailing shape)
+COLUMNS = {
+    "row_docs": (np.int32, ()),      # document code
+    "row_chunks": (np.int32, ()),    # chunk index within the document
+    "row_pages": (np.int32, ()),     # PDF page
+    "row_spans": (np.int64, (2,)),   # start / end offsets in the document
+}
+
+# Stored for a missing page / offset
+MISSING = -1
+
+SNAPSHOT_ID = re.compile(r"^\w[\w.-]*$")
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process exact search: L2-normalized float32 embeddings in
+    one contiguous, growable matrix, scored with a single
+    matrix product and ranked with argpartition.
+
+    Layout:
+        <root>/CURRENT                      name of the live generation
+        <root>/gen-<n>/manifest.json        row count, dim, documents
+        <root>/gen-<n>/vectors.bin          float32 matrix, one row per chunk
+        <root>/gen-<n>/row_*.bin            document code, chunk, page, offsets per row
+        <root>/gen-<n>/texts.bin            chunk texts (UTF-8), split by text_offsets.bin
+        <root>/snapshots/<snapshot_id>/     frozen copy of a generation
+
+    The .bin files are raw, append-only arrays; a generation reads
+    only the first manifest["rows"] rows of each. persist() builds
+    the next generation from hard links to the live one's files and
+    appends just the rows added since, so an upload costs I/O for
+    its own rows, not the corpus. Deletes and resets rewrite every
+    file from scratch (new files, old generation untouched). The
+    new manifest is written last and CURRENT switched after it, so
+    a crash at any point leaves the previous generation intact; a
+    torn append past its rows is cut off before the next one.
+    Loading reads the manifest and memory-maps the files, so
+    start-up does not grow with the number of chunks; pages are
+    read from disk when first searched.
+
+    Writers take a lock; searches only snapshot the current arrays
+    under it, since rows are appended in place and every removal
+    builds new arrays.
+    """
+
+    matrix_dtype = np.float32
+
+    def __init__(self, root: str = "app/data/vectors", initial_capacity: int = 1024):
+        self.root = root
+        self.snapshot_root = os.path.join(root, "snapshots")
+        self.initial_capacity = initial_capacity
+        self.lock = threading.Lock()
+        self.persist_lock = threading.Lock()
+        os.makedirs(self.snapshot_root, exist_ok=True)
+
+        self.version = 0
+        # Rows already in the live generation's files, valid while
+        # the version (row numbering) is unchanged
+        self.persisted_rows = 0
+        self.persisted_version = None
+        self._clear()
+        self._load()
+
+    def _clear(self):
+        self.matrix = None           # (capacity, dim)
+        self.size = 0
+        self.columns = {
+            name: np.zeros((0,) + shape, dtype=dtype)
+            for name, (dtype, shape) in COLUMNS.items()
+        }
+        self.texts = TextColumn()
+        self.documents = {}          # code -> {"doc_id", "filename", "sha256"}
+        self.doc_codes = {}          # doc_id -> code
+        self.next_code = 0
+        self.dirty = False
+
+        # Row numbers change; see persist()
+        self.version += 1
+
+    # =========================
+    # WRITE
+    # =========================
+    @timed("add_documents")
+    def add_documents(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        doc_id: str = "default",
+        metadatas: list[dict] = None,
+        start_index: int = 0
+    ):
+        """
+        Add chunks of one document. start_index lets a document be
+        added in several batches; metadatas are per-chunk extras
+        (filename, page, offsets, ...).
+
+        Chunks the document already has are skipped: two workers may
+        ingest the same file at once through the shared service
+        process.
+        """
+
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        chunk_metadatas = self.chunk_metadatas(
+            len(texts), doc_id, metadatas, start_index
+        )
+
+        with self.lock:
+            code = self.doc_codes.get(doc_id)
+            if code is not None:
+                rows = self.columns["row_docs"][:self.size] == code
+                stored = self.columns["row_chunks"][:self.size][rows]
+                new = ~np.isin(np.arange(start_index, start_index + len(texts)), stored)
+                if not new.all():
+                    vectors = vectors[new]
+                    texts = [text for text, keep in zip(texts, new) if keep]
+                    chunk_metadatas = [m for m, keep in zip(chunk_metadatas, new) if keep]
+                if not texts:
+                    return
+
+            self._reserve(len(texts), vectors.shape[1])
+
+            start, end = self.size, self.size + len(texts)
+            if code is None:
+                code = self.doc_codes[doc_id] = self.next_code
+                self.next_code += 1
+                self.documents[code] = {
+                    "doc_id": doc_id,
+                    "filename": chunk_metadatas[0].get("filename"),
+                    "sha256": chunk_metadatas[0].get("sha256")
+                }
+
+            self._write_rows(start, vectors)
+            self.columns["row_docs"][start:end] = code
+            for row, metadata in enumerate(chunk_metadatas, start):
+                self.columns["row_chunks"][row] = metadata["chunk"]
+                self.columns["row_pages"][row] = metadata.get("page", MISSING)
+                self.columns["row_spans"][row] = (
+                    metadata.get("start", MISSING),
+                    metadata.get("end", MISSING)
+                )
+            self.texts.extend(texts)
+
+            # Publish the new rows last so searches never see partial ones
+            self.size = end
+            self.dirty = True
+
+    def _reserve(self, extra: int, dim: int):
+        if self.matrix is not None and self.matrix.shape[1] != dim:
+            raise ValueError(
+                f"Embedding dimension {dim} does not match store dimension "
+                f"{self.matrix.shape[1]}."
+            )
+
+        needed = self.size + extra
+        arrays = [self.matrix] + list(self.columns.values())
+        if self.matrix is not None and all(
+            needed <= len(array) and array.flags.writeable for array in arrays
+        ):
+            return
+
+        # Grow geometrically; memory-mapped arrays are copied to RAM on first write
+        capacity = max(self.initial_capacity, needed, 2 * self.size)
+        self.matrix = _grown(self.matrix, self.size, (capacity, dim), self.matrix_dtype)
+        self.columns = {
+            name: _grown(self.columns[name], self.size, (capacity,) + shape, dtype)
+            for name, (dtype, shape) in COLUMNS.items()
+        }
+
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        self.matrix[start:start + len(vectors)] = vectors
+
+    def delete_document(self, doc_id: str):
+        with self.lock:
+            code = self.doc_codes.get(doc_id)
+            if code is None:
+                return
+
+            keep = np.flatnonzero(self.columns["row_docs"][:self.size] != code)
+            self._keep_rows(keep)
+            self.columns = {
+                name: np.ascontiguousarray(column[keep])
+                for name, column in self.columns.items()
+            }
+            self.texts = self.texts.take(keep)
+            self.size = len(keep)
+            del self.doc_codes[doc_id]
+            del self.documents[code]
+            self.version += 1
+            self.dirty = True
+
+    def _keep_rows(self, keep: np.ndarray):
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+
+    def reset(self):
+        with self.lock:
+            self._clear()
+            self.dirty = True
+
+    # =========================
+    # READ
+    # =========================
+    def has_document(self, doc_id: str) -> bool:
+        return doc_id in self.doc_codes
+
+    def list_documents(self) -> list[dict]:
+        with self.lock:
+            return [dict(document) for document in self.documents.values()]
+
+    def _view(self):
+        # Arrays and tables as of now, for reading outside the lock
+        return self.size, dict(self.columns), self.texts, dict(self.documents)
+
+    @timed("search")
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 5,
+        doc_ids: list[str] = None
+    ) -> dict:
+        """
+        Cosine top-k for a batch of queries in one matrix product.
+        Distances are 1 - cosine similarity.
+        """
+
+        with self.lock:
+            size, columns, texts, documents = self._view()
+            state = self._search_state()
+            codes = [self.doc_codes[d] for d in doc_ids or [] if d in self.doc_codes]
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if len(query_embeddings) == 0:
+            return results
+
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+
+        if size == 0 or (doc_ids and not codes):
+            for key in results:
+                results[key] = [[] for _ in queries]
+            return results
+
+        rows = (
+            np.flatnonzero(np.isin(columns["row_docs"][:size], codes))
+            if doc_ids else None
+        )
+
+        for best, scores in self._rank(state, queries, size, rows, top_k):
+            metadatas = [_metadata(i, columns, documents) for i in best]
+            results["ids"].append([f"{m['doc_id']}:{m['chunk']}" for m in metadatas])
+            results["documents"].append([texts[i] for i in best])
+            results["metadatas"].append(metadatas)
+            results["distances"].append((1.0 - scores).tolist())
+
+        return results
+
+    def _search_state(self):
+        return self.matrix
+
+    def _rank(self, state, queries: np.ndarray, size: int, rows, top_k: int):
+        """
+        Yields (row indices, scores) per query, best first.
+        """
+
+        matrix = state[rows] if rows is not None else state[:size]
+        scores = queries @ matrix.T
+
+        for query_scores, order in zip(scores, _top_k(scores, top_k)):
+            best = rows[order] if rows is not None else order
+            yield best, query_scores[order]
+
+    @timed("get_chunks")
+    def get_chunks(self, doc_ids: list[str] = None) -> list[dict]:
+        with self.lock:
+            size, columns, texts, documents = self._view()
+            codes = [self.doc_codes[d] for d in doc_ids or [] if d in self.doc_codes]
+
+        if doc_ids:
+            rows = np.flatnonzero(np.isin(columns["row_docs"][:size], codes))
+        else:
+            rows = range(size)
+
+        chunks = []
+        for i in rows:
+            metadata = _metadata(i, columns, documents)
+            chunks.append({
+                "doc_id": metadata["doc_id"],
+                "chunk": metadata["chunk"],
+                "start": metadata.get("start"),
+                "end": metadata.get("end"),
+                "text": texts[i]
+            })
+        return sorted(chunks, key=lambda chunk: (chunk["doc_id"], chunk["chunk"]))
+
+    def memory_bytes(self) -> int:
+        """
+        RAM held by the searched matrix.
+        """
+
+        matrix = self.matrix
+        if matrix is None or isinstance(matrix, np.memmap):
+            return 0
+        return matrix.nbytes
+
+    # =========================
+    # PERSISTENCE
+    # =========================
+    def persist(self):
+        with self.persist_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                size, columns, texts, documents = self._view()
+                dim = self.matrix.shape[1] if self.matrix is not None else None
+                version = self.version
+                previous = self._current()
+                # Only rows added since the last persist are written
+                start = self.persisted_rows if previous and version == self.persisted_version else 0
+                vectors = self._persist_state(size, start)
+                self.dirty = False
+
+            generation = f"gen-{time.time_ns()}"
+            tmp_dir = os.path.join(self.root, f".{generation}.tmp")
+
+            try:
+                if start:
+                    _link_tree(os.path.join(self.root, previous), tmp_dir, suffix=".bin")
+                else:
+                    os.makedirs(tmp_dir)
+                self._write_vectors(tmp_dir, vectors, start)
+                for name, column in columns.items():
+                    _write_rows(tmp_dir, f"{name}.bin", column[start:size], start)
+                texts.write(tmp_dir, start, size)
+                _write_json(os.path.join(tmp_dir, "manifest.json"), {
+                    "rows": size,
+                    "dim": dim,
+                    "documents": [
+                        dict(document, code=code) for code, document in documents.items()
+                    ],
+                    "created_at": time.time()
+                })
+                os.replace(tmp_dir, os.path.join(self.root, generation))
+                self._set_current(generation)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                with self.lock:
+                    self.dirty = True
+                raise
+
+            with self.lock:
+                self._persisted(size, version, vectors)
+                if self.version == version:
+                    # Persisted texts are read back from disk instead of RAM
+                    self._reopen(os.path.join(self.root, generation), size)
+
+            self._remove_old_generations(generation)
+
+    def _persist_state(self, size: int, start: int):
+        return self.matrix[:size] if size else None
+
+    def _persisted(self, size: int, version: int, vectors):
+        self.persisted_rows = size
+        self.persisted_version = version
+
+    def _write_vectors(self, directory: str, vectors, start: int):
+        if vectors is not None:
+            _write_rows(directory, "vectors.bin", vectors[start:], start)
+
+    def _reopen(self, directory: str, count: int):
+        texts = TextColumn.open(directory, count)
+        texts.extend(self.texts.after(count))
+        self.texts = texts
+
+    def _set_current(self, generation: str):
+        tmp_path = os.path.join(self.root, f"CURRENT.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(tmp_path, os.path.join(self.root, "CURRENT"))
+
+    def _current(self):
+        try:
+            with open(os.path.join(self.root, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _remove_old_generations(self, current: str):
+        # Open memory maps of removed files stay readable until released
+        for name in os.listdir(self.root):
+            if name.startswith(("gen-", ".gen-")) and name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _load(self):
+        generation = self._current()
+        if generation is None:
+            return
+
+        directory = os.path.join(self.root, generation)
+        try:
+            self._open(directory)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Ignoring unreadable vector store in {directory}: {e}")
+            self._clear()
+
+    def _open(self, directory: str):
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        count = manifest["rows"]
+        if count:
+            columns = {
+                name: _open_rows(directory, f"{name}.bin", dtype, shape, count)
+                for name, (dtype, shape) in COLUMNS.items()
+            }
+            self._open_vectors(directory, count, manifest["dim"])
+            self.texts = TextColumn.open(directory, count)
+            self.columns = columns
+
+        for document in manifest["documents"]:
+            code = document.pop("code")
+            self.documents[code] = document
+            self.doc_codes[document["doc_id"]] = code
+        self.next_code = max(self.documents, default=-1) + 1
+        self.size = count
+        self._persisted(count, self.version, None)
+
+    def _open_vectors(self, directory: str, count: int, dim: int):
+        self.matrix = _open_rows(directory, "vectors.bin", np.float32, (dim,), count)
+
+    # =========================
+    # SNAPSHOTS
+    # =========================
+    def snapshot(self, snapshot_id: str = None) -> dict:
+        """
+        Freeze the store under <root>/snapshots/<snapshot_id>.
+        Generation files are only ever appended to past the rows a
+        manifest covers, so they are hard-linked rather than copied
+        where the filesystem allows it.
+        """
+
+        snapshot_id = snapshot_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        if not SNAPSHOT_ID.match(snapshot_id):
+            raise ValueError(f"Invalid snapshot id: {snapshot_id}")
+
+        target = os.path.join(self.snapshot_root, snapshot_id)
+        if os.path.exists(target):
+            raise ValueError(f"Snapshot already exists: {snapshot_id}")
+
+        with self.lock:
+            # An empty, never persisted store still gets a generation
+            self.dirty = self.dirty or self._current() is None
+        self.persist()
+
+        with self.persist_lock:
+            _link_tree(os.path.join(self.root, self._current()), target)
+
+        return self._snapshot_info(snapshot_id)
+
+    def list_snapshots(self) -> list[dict]:
+        return [
+            self._snapshot_info(name)
+            for name in sorted(os.listdir(self.snapshot_root))
+            if os.path.isfile(os.path.join(self.snapshot_root, name, "manifest.json"))
+        ]
+
+    def restore(self, snapshot_id: str) -> dict:
+        """
+        Replace the store contents with a snapshot. The snapshot is
+        copied in as a new generation: later appends cut the files
+        back to the snapshot's rows first, which would break other
+        snapshots sharing them.
+        """
+
+        source = os.path.join(self.snapshot_root, snapshot_id)
+        if not SNAPSHOT_ID.match(snapshot_id) or not os.path.isdir(source):
+            raise KeyError(snapshot_id)
+
+        with self.persist_lock:
+            generation = f"gen-{time.time_ns()}"
+            tmp_dir = os.path.join(self.root, f".{generation}.tmp")
+            shutil.copytree(source, tmp_dir)
+            os.replace(tmp_dir, os.path.join(self.root, generation))
+            self._set_current(generation)
+
+            with self.lock:
+                self._clear()
+                self._open(os.path.join(self.root, generation))
+
+            self._remove_old_generations(generation)
+
+        print(f"[INFO] Restored vector store snapshot {snapshot_id}")
+        return self._snapshot_info(snapshot_id)
+
+    def _snapshot_info(self, snapshot_id: str) -> dict:
+        path = os.path.join(self.snapshot_root, snapshot_id, "manifest.json")
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        return {
+            "snapshot_id": snapshot_id,
+            "documents": len(manifest["documents"]),
+            "chunks": manifest["rows"],
+            "created_at": manifest["created_at"]
+        }
+
+
+class QuantizedNumpyVectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore searching int8 codes instead of floats.
+
+    Every dimension is scalar-quantized to 256 levels between its
+    observed min and max (x ~ offset + scale * code), which cuts
+    the searched matrix to a quarter of its float32 size. The
+    approximate top candidates are then re-ranked exactly against
+    the float vectors, which stay on disk and are read through a
+    memory map (rows added since the last persist are held in RAM).
+
+    The gain is memory only: NumPy has no fast integer matrix
+    product, so codes are converted to float32 a block at a time
+    into one reused buffer and scored with BLAS. A query costs
+    about as much as on the float store (benchmarks.quantization_recall
+    reports both latencies next to recall).
+
+    Layout (per generation, in addition to the columns):
+        vectors.bin         float32 rows, used for re-ranking only
+        codes.bin           int8 codes
+        quantization.npz    per-dimension low / high of the code range
+
+    Codes are appended like the other files, unless the code range
+    widened since the last persist: then every code changed and
+    codes.bin is rewritten (floats are still only appended).
+    """
+
+    matrix_dtype = np.int8
+
+    def _clear(self):
+        super()._clear()
+        self.low = None
+        self.high = None
+        self.scale = None
+        self.offset = None
+        self.floats = FloatColumn()
+        # Code range of the codes on disk
+        self.persisted_bounds = None
+
+    # =========================
+    # WRITE
+    # =========================
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        self.floats.append(vectors)
+
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        if self.low is None or (low < self.low).any() or (high > self.high).any():
+            self._set_range(
+                low if self.low is None else np.minimum(low, self.low),
+                high if self.high is None else np.maximum(high, self.high)
+            )
+            # Earlier rows were coded with the old range
+            self.matrix = self._requantize(start, len(self.matrix))
+
+        self.matrix[start:start + len(vectors)] = self._quantize(vectors)
+
+    def _set_range(self, low: np.ndarray, high: np.ndarray):
+        # Widen a little so later batches rarely force a re-quantization
+        margin = (high - low) * 0.05
+        self._set_bounds(low - margin, high + margin)
+
+    def _set_bounds(self, low: np.ndarray, high: np.ndarray):
+        self.low = low
+        self.high = high
+        self.scale = np.maximum(self.high - self.low, 1e-12) / 255
+        self.offset = self.low + 128 * self.scale
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def _requantize(self, count: int, capacity: int) -> np.ndarray:
+        matrix = np.empty((capacity, self.floats.dim), dtype=np.int8)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            matrix[start:end] = self._quantize(self.floats.rows(np.arange(start, end)))
+        return matrix
+
+    def _keep_rows(self, keep: np.ndarray):
+        super()._keep_rows(keep)
+        # Held in RAM until the next persist writes them out
+        self.floats = self.floats.take(keep)
+
+    # =========================
+    # READ
+    # =========================
+    def _search_state(self):
+        return self.matrix, self.scale, self.offset, self.floats
+
+    def _rank(self, state, queries: np.ndarray, size: int, rows, top_k: int):
+        codes, scale, offset, floats = state
+        scoped = rows
+        if rows is None:
+            rows = np.arange(size)
+
+        # q . x ~ q . offset + (q * scale) . code, a block of rows at a time
+        scaled = queries * scale
+        approx = np.empty((len(queries), len(rows)), dtype=np.float32)
+        block = np.empty((min(SCORE_BLOCK_ROWS, len(rows)), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, len(rows))
+            # All rows: a plain slice, no gathered copy of the codes
+            source = codes[start:end] if scoped is None else codes[rows[start:end]]
+            np.copyto(block[:end - start], source, casting="unsafe")
+            np.matmul(scaled, block[:end - start].T, out=approx[:, start:end])
+        approx += (queries @ offset)[:, None]
+
+        candidates = _top_k(approx, max(top_k, top_k * RERANK_FACTOR))
+
+        for query, order in zip(queries, candidates):
+            # Sorted row order reads the float file sequentially
+            candidate_rows = np.sort(rows[order])
+            exact = floats.rows(candidate_rows) @ query
+            best = _top_k(exact[None, :], top_k)[0]
+            yield candidate_rows[best], exact[best]
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + self.floats.memory_bytes()
+
+    # =========================
+    # PERSISTENCE
+    # =========================
+    def _persist_state(self, size: int, start: int):
+        if not size:
+            return None
+
+        codes_start = start
+        if self.persisted_bounds is None or not (
+            np.array_equal(self.low, self.persisted_bounds[0])
+            and np.array_equal(self.high, self.persisted_bounds[1])
+        ):
+            codes_start = 0
+        return self.matrix[:size], codes_start, self.floats, self.low, self.high
+
+    def _persisted(self, size: int, version: int, vectors):
+        super()._persisted(size, version, vectors)
+        if vectors is not None:
+            self.persisted_bounds = vectors[3], vectors[4]
+        elif not size:
+            self.persisted_bounds = None
+        else:
+            self.persisted_bounds = self.low, self.high
+
+    def _write_vectors(self, directory: str, vectors, start: int):
+        if vectors is None:
+            return
+
+        codes, codes_start, floats, low, high = vectors
+        _write_rows(directory, "codes.bin", codes[codes_start:], codes_start)
+        np.savez(os.path.join(directory, "quantization.npz"), low=low, high=high)
+
+        # Floats are written a block at a time; rows before `start` are on disk
+        for block in range(start, len(codes), SCORE_BLOCK_ROWS):
+            end = min(block + SCORE_BLOCK_ROWS, len(codes))
+            _write_rows(directory, "vectors.bin", floats.rows(np.arange(block, end)), block)
+
+    def _reopen(self, directory: str, count: int):
+        super()._reopen(directory, count)
+        if count:
+            floats = FloatColumn(_open_rows(directory, "vectors.bin", np.float32, (self.floats.dim,), count))
+            rest = self.floats.after(count)
+            if len(rest):
+                floats.append(rest)
+            self.floats = floats
+
+    def _open_vectors(self, directory: str, count: int, dim: int):
+        codes = _open_rows(directory, "codes.bin", np.int8, (dim,), count)
+        floats = FloatColumn(_open_rows(directory, "vectors.bin", np.float32, (dim,), count))
+
+        with np.load(os.path.join(directory, "quantization.npz")) as bounds:
+            self._set_bounds(bounds["low"], bounds["high"])
+        self.matrix = codes
+        self.floats = floats
+
+
+class TextColumn:
+    """
+    Chunk texts: a persisted UTF-8 blob read through a memory map,
+    plus the texts added since, held as strings.
+    """
+
+    def __init__(self, blob=None, offsets=None):
+        self.blob = blob
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.base = len(self.offsets) - 1
+        self.tail = []
+
+    def __len__(self) -> int:
+        return self.base + len(self.tail)
+
+    def __getitem__(self, i: int) -> str:
+        if i >= self.base:
+            return self.tail[i - self.base]
+        if self.blob is None:
+            return ""
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def extend(self, texts: list[str]):
+        self.tail.extend(texts)
+
+    def after(self, count: int) -> list[str]:
+        return self.tail[max(0, count - self.base):]
+
+    def take(self, rows) -> "TextColumn":
+        column = TextColumn()
+        column.tail = [self[i] for i in rows]
+        return column
+
+    def write(self, directory: str, start: int, count: int):
+        """
+        Write texts start..count-1 after the first `start` texts
+        already in the directory's files.
+        """
+
+        offsets_path = os.path.join(directory, "text_offsets.bin")
+        position = 0
+        if start:
+            position = int(np.fromfile(offsets_path, dtype=np.int64, count=1, offset=start * 8)[0])
+
+        with open(_open_for_append(os.path.join(directory, "texts.bin"), position), "r+b") as f:
+            f.seek(position)
+            offsets = np.empty(count - start + (0 if start else 1), dtype=np.int64)
+            i = 0
+            if not start:
+                offsets[0] = 0
+                i = 1
+            for row in range(start, count):
+                data = self[row].encode("utf-8")
+                f.write(data)
+                position += len(data)
+                offsets[i] = position
+                i += 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        _write_rows(directory, "text_offsets.bin", offsets, start + 1 if start else 0)
+
+    @classmethod
+    def open(cls, directory: str, count: int) -> "TextColumn":
+        offsets = np.fromfile(os.path.join(directory, "text_offsets.bin"), dtype=np.int64, count=count + 1)
+        if len(offsets) != count + 1:
+            raise ValueError("text_offsets.bin does not match the manifest")
+
+        blob = None
+        if offsets[-1]:
+            blob = np.memmap(
+                os.path.join(directory, "texts.bin"), dtype=np.uint8, mode="r", shape=(int(offsets[-1]),)
+            )
+        return cls(blob, offsets)
+
+
+class FloatColumn:
+    """
+    Float vectors for re-ranking: a persisted memory-mapped part
+    plus the rows added since, in a growable RAM array.
+    """
+
+    def __init__(self, base=None):
+        self.base = base
+        self.base_rows = len(base) if base is not None else 0
+        self.dim = base.shape[1] if base is not None else None
+        self.tail = None
+        self.tail_rows = 0
+
+    def __len__(self) -> int:
+        return self.base_rows + self.tail_rows
+
+    def append(self, vectors: np.ndarray):
+        self.dim = vectors.shape[1]
+
+        needed = self.tail_rows + len(vectors)
+        if self.tail is None or needed > len(self.tail):
+            capacity = max(1024, needed, 2 * self.tail_rows)
+            self.tail = _grown(self.tail, self.tail_rows, (capacity, self.dim), np.float32)
+        self.tail[self.tail_rows:needed] = vectors
+        self.tail_rows = needed
+
+    def rows(self, index: np.ndarray) -> np.ndarray:
+        """
+        Rows at the sorted positions `index`.
+        """
+
+        split = int(np.searchsorted(index, self.base_rows))
+        parts = []
+        if split:
+            parts.append(self.base[index[:split]])
+        if split < len(index):
+            parts.append(self.tail[index[split:] - self.base_rows])
+        if not parts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def after(self, count: int) -> np.ndarray:
+        return self.rows(np.arange(count, len(self)))
+
+    def take(self, keep: np.ndarray) -> "FloatColumn":
+        column = FloatColumn()
+        column.dim = self.dim
+        if len(keep):
+            column.append(self.rows(keep))
+        return column
+
+    def memory_bytes(self) -> int:
+        return self.tail.nbytes if self.tail is not None else 0
+
+
+def _metadata(i: int, columns: dict, documents: dict) -> dict:
+    document = documents[int(columns["row_docs"][i])]
+    metadata = {
+        "doc_id": document["doc_id"],
+        "filename": document.get("filename"),
+        "sha256": document.get("sha256"),
+        "chunk": int(columns["row_chunks"][i])
+    }
+
+    page = int(columns["row_pages"][i])
+    start, end = (int(value) for value in columns["row_spans"][i])
+    if page != MISSING:
+        metadata["page"] = page
+    if start != MISSING:
+        metadata["start"] = start
+        metadata["end"] = end
+
+    return {k: v for k, v in metadata.items() if v is not None}
+
+
+def _grown(array, count: int, shape: tuple, dtype) -> np.ndarray:
+    grown = np.empty(shape, dtype=dtype)
+    if count:
+        grown[:count] = array[:count]
+    return grown
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def _open_for_append(path: str, position: int) -> str:
+    """
+    Prepare `path` for writing from byte `position`. Files are cut
+    back to `position` first (a torn earlier append); writing from
+    the start replaces a linked file with a new one, so the
+    generation it came from keeps its data.
+    """
+
+    if position == 0 and os.path.exists(path):
+        os.remove(path)
+    with open(path, "ab") as f:
+        f.truncate(position)
+    return path
+
+
+def _write_rows(directory: str, name: str, rows, start: int):
+    """
+    Write `rows` to the raw file `name` as its rows from `start` on.
+    """
+
+    array = np.ascontiguousarray(rows)
+    row_bytes = array.itemsize * int(np.prod(array.shape[1:], dtype=np.int64))
+    path = _open_for_append(os.path.join(directory, name), start * row_bytes)
+
+    with open(path, "r+b") as f:
+        f.seek(start * row_bytes)
+        array.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _open_rows(directory: str, name: str, dtype, shape: tuple, count: int):
+    """
+    Memory map of the first `count` rows of the raw file `name`.
+    """
+
+    path = os.path.join(directory, name)
+    needed = count * np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+    if os.path.getsize(path) < needed:
+        raise ValueError(f"{name} is shorter than the manifest says")
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,) + tuple(shape))
+
+
+def _link_tree(source: str, target: str, suffix: str = ""):
+    os.makedirs(target)
+    for name in os.listdir(source):
+        if not name.endswith(suffix):
+            continue
+        try:
+            os.link(os.path.join(source, name), os.path.join(target, name))
+        except OSError:
+            shutil.copy2(os.path.join(source, name), os.path.join(target, name))
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the k highest scores in each row, best first.
+    """
+
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), (len(scores), k))
+
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+
+class OCRCache:
+    """
+    On-disk cache of OCR output, one text file per page.
+
+    Keys are derived from a hash of the page content plus the
+    OCR settings, so the same scanned page uploaded again is
+    served without running tesseract.
+    """
+
+    def __init__(self, cache_dir: str = "app/data/ocr_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash: str, dpi: int, lang: str = "eng") -> str:
+        return hashlib.sha256(
+            f"{content_hash}:{dpi}:{lang}".encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
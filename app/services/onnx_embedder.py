@@ -0,0 +1,168 @@
+import argparse
+import os
+
+import numpy as np
+
+# Files in an exported model directory
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported transformer on ONNX
+    Runtime (CPU): tokenize, run, mean-pool over the attention
+    mask and L2-normalize, the same pipeline as all-MiniLM-L6-v2
+    in sentence-transformers, without loading PyTorch.
+
+    Texts are sorted by token count before batching so each batch
+    is padded only to its own longest text.
+
+    encode() follows SentenceTransformer.encode: list of texts in,
+    float32 array (one row per text) out.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        quantized: bool = False,
+        threads: int = 0,
+        batch_size: int = 32,
+        max_tokens: int = 256
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(
+            model_dir, ONNX_QUANTIZED_FILE if quantized else ONNX_MODEL_FILE
+        )
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; export it with "
+                f"python -m app.services.onnx_embedder --out {model_dir}"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_tokens)
+        self.tokenizer.no_padding()
+        self.batch_size = batch_size
+
+    def encode(self, texts: list[str], **kwargs) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts)
+        order = np.argsort([len(encoding.ids) for encoding in encodings], kind="stable")
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors[batch] = self._encode_batch([encodings[i] for i in batch])
+
+        return vectors
+
+    def _encode_batch(self, encodings: list) -> np.ndarray:
+        length = max(len(encoding.ids) for encoding in encodings)
+        inputs = {
+            name: np.zeros((len(encodings), length), dtype=np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+        }
+        for row, encoding in enumerate(encodings):
+            count = len(encoding.ids)
+            inputs["input_ids"][row, :count] = encoding.ids
+            inputs["attention_mask"][row, :count] = encoding.attention_mask
+            inputs["token_type_ids"][row, :count] = encoding.type_ids
+
+        output = self.session.run(
+            None, {name: value for name, value in inputs.items() if name in self.input_names}
+        )[0]
+
+        if output.ndim == 3:
+            # Token embeddings: mean over real (unpadded) tokens
+            mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.maximum(norms, 1e-12)
+
+
+def export_model(model_name: str, out_dir: str, quantize: bool = True, opset: int = 17) -> list[str]:
+    """
+    Export a sentence-transformers model's transformer to ONNX
+    (plus a dynamically int8-quantized copy) with its tokenizer.
+    Needs torch and sentence-transformers; serving does not.
+    """
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+
+    sample = tokenizer(["An example sentence to trace the model."], return_tensors="pt")
+    names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+    axes = {0: "batch", 1: "tokens"}
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Named inputs in, last hidden state out (forward signatures vary by version)
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(names, inputs)), return_dict=False)[0]
+
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(),
+            tuple(sample[name] for name in names),
+            model_path,
+            input_names=names,
+            output_names=["token_embeddings"],
+            dynamic_axes={name: axes for name in names + ["token_embeddings"]},
+            opset_version=opset,
+            dynamo=False
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, TOKENIZER_FILE))
+    written = [model_path, os.path.join(out_dir, TOKENIZER_FILE)]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = os.path.join(out_dir, ONNX_QUANTIZED_FILE)
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        written.append(quantized_path)
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an embedding model to ONNX.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    for path in export_model(args.model, args.out, quantize=not args.no_quantize):
+        print(f"[INFO] Wrote {path}")
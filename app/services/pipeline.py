@@ -0,0 +1,74 @@
+import queue
+import threading
+from itertools import islice
+
+# ============================================================
+# STREAMING HELPERS
+# Small generator utilities used to connect ingestion stages
+# without materializing whole documents.
+# ============================================================
+
+_ITEM = "item"
+_ERROR = "error"
+_DONE = "done"
+
+
+def batched(iterable, size: int):
+    """
+    Yield lists of up to `size` items.
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def prefetch(iterable, maxsize: int = 2):
+    """
+    Consume `iterable` on a background thread, keeping at most
+    `maxsize` items buffered, so the producer (parsing, OCR,
+    chunking) overlaps with the consumer (embedding, storage).
+
+    Exceptions raised by the producer are re-raised in the
+    consumer. Stopping early stops the producer.
+    """
+
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(message) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((_ITEM, item)):
+                    return
+        except BaseException as e:
+            put((_ERROR, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            kind, value = buffer.get()
+            if kind == _ITEM:
+                yield value
+            elif kind == _ERROR:
+                raise value
+            else:
+                return
+    finally:
+        stop.set()
@@ -0,0 +1,95 @@
+import re
+
+# ============================================================
+# QUESTION EXTRACTION
+# Pulls the questions out of a question paper's text so they can
+# be answered in one batch. Questions start at a numbering marker
+# ("Q1.", "Q.2", "3)", "Question 4", "(a)", "b.") and run until the
+# next marker; instructions and headers are dropped.
+# ============================================================
+
+_MARKER = re.compile(
+    r"^\s*(?:"
+    r"Q(?:uestion)?\s*\.?\s*(?:No\.?\s*)?\d{1,2}\s*[.):-]?"   # Q1. / Q.2 / Question 3 / Q No. 4
+    r"|\d{1,2}\s*[.)]"                                       # 1. / 2)
+    r"|\(?[a-h]\)|[a-h]\."                                   # (a) / a) / a.
+    r"|\(?(?:i|ii|iii|iv|v|vi|vii|viii)\)"                   # (i) / ii)
+    r")(?:\s+|$)",
+    re.IGNORECASE
+)
+
+# Trailing marks: "[5]", "(10 marks)", "5M", "CO2", "L3"
+_MARKS = re.compile(
+    r"(?:\s*(?:\[\s*\d+\s*\]|\(\s*\d+\s*(?:marks?)?\s*\)|\b\d+\s*(?:marks?|M)\b|\b(?:CO|L|BL)\s*\d\b))+\s*$",
+    re.IGNORECASE
+)
+
+_ASKS = re.compile(
+    r"\?|^(?:what|why|how|when|where|which|who|explain|define|describe|discuss|"
+    r"differentiate|distinguish|compare|write|list|draw|derive|prove|find|state|"
+    r"give|calculate|compute|evaluate|show|solve|construct|design|illustrate|"
+    r"justify|enumerate|mention|analy[sz]e|implement|convert|sort|trace|insert|"
+    r"delete|perform|consider|obtain|determine|outline|elaborate)\b",
+    re.IGNORECASE
+)
+
+# Paper instructions, not questions
+_INSTRUCTION = re.compile(
+    r"\b(?:attempt|answer any|all questions|compulsory|carry equal|time\s*:|"
+    r"max(?:imum)?\.?\s*marks|roll\s*no|assume suitable|use of calculator|"
+    r"figures? (?:to|in) the right)\b",
+    re.IGNORECASE
+)
+
+MIN_QUESTION_CHARS = 12
+MAX_QUESTION_CHARS = 600
+
+
+def extract_questions(text: str, limit: int = None) -> list[str]:
+    """
+    Questions in `text`, in paper order, without numbering or
+    marks. Sub-parts ("(a)", "(i)") are separate questions.
+    """
+
+    items = []
+    current = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        marker = _MARKER.match(line)
+        if marker:
+            if current:
+                items.append(current)
+            # "Q4 (a) Explain ...": the innermost marker starts the question
+            while marker:
+                line = line[marker.end():]
+                marker = _MARKER.match(line)
+            current = line
+        elif current is not None and len(current) < MAX_QUESTION_CHARS:
+            current += " " + line
+
+    if current:
+        items.append(current)
+
+    questions = []
+    seen = set()
+    for item in items:
+        question = _MARKS.sub("", re.sub(r"\s+", " ", item)).strip(" .:-")
+        if not (MIN_QUESTION_CHARS <= len(question) <= MAX_QUESTION_CHARS):
+            continue
+        if _INSTRUCTION.search(question) or not _ASKS.search(question):
+            continue
+
+        key = question.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        questions.append(question)
+
+        if limit and len(questions) >= limit:
+            break
+
+    return questions
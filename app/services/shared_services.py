@@ -0,0 +1,511 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from app.services.concurrency import run_blocking
+from app.services.metrics import timed
+from app.services.vector_store import VectorStore
+
+# ============================================================
+# SHARED SERVICE PROCESS
+# With several API workers, one process holds the embedding model,
+# the vector store, the keyword index, the answer cache and the
+# status of every ingestion job; workers reach it over a Unix
+# socket. Unset: every worker builds its own (single worker).
+# ============================================================
+SERVICES_SOCKET = os.getenv("SERVICES_SOCKET", "")
+
+# Seconds a worker keeps retrying while the service process starts
+SERVICES_CONNECT_TIMEOUT = float(os.getenv("SERVICES_CONNECT_TIMEOUT", "60"))
+
+_LENGTH = struct.Struct("!I")
+
+# Raised in the worker with their own type (routes map them to 4xx)
+_ERRORS = {
+    error.__name__: error
+    for error in (KeyError, ValueError, NotImplementedError, FileNotFoundError)
+}
+
+VECTOR_STORE_METHODS = (
+    "add_documents", "delete_document", "has_document", "list_documents",
+    "search_many", "get_chunks", "persist", "reset",
+    "snapshot", "list_snapshots", "restore"
+)
+TEXT_INDEX_METHODS = (
+    "add", "delete_document", "clear", "phrase_search", "bm25", "stats", "is_ready"
+)
+ANSWER_CACHE_METHODS = ("record_miss", "invalidate", "clear", "stats")
+
+
+# =========================
+# WIRE FORMAT
+# =========================
+def encode_message(body) -> list:
+    """
+    A message as a list of buffers: length-prefixed JSON header,
+    then the raw bytes of every NumPy array in `body`. Arrays are
+    never converted to JSON numbers; the receiver wraps the bytes
+    with np.frombuffer.
+    """
+
+    arrays = []
+
+    def encode(value):
+        if isinstance(value, np.ndarray):
+            arrays.append(np.ascontiguousarray(value))
+            return {
+                "__array__": len(arrays) - 1,
+                "dtype": value.dtype.str,
+                "shape": list(value.shape)
+            }
+        if isinstance(value, dict):
+            return {key: encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    header = json.dumps({
+        "body": encode(body),
+        "sizes": [array.nbytes for array in arrays]
+    }).encode("utf-8")
+
+    return [_LENGTH.pack(len(header)) + header] + [
+        memoryview(array).cast("B") for array in arrays if array.nbytes
+    ]
+
+
+def decode_message(header: bytes, buffers: list):
+    def decode(value):
+        if isinstance(value, dict):
+            if "__array__" in value:
+                array = np.frombuffer(buffers[value["__array__"]], dtype=value["dtype"])
+                return array.reshape(value["shape"])
+            return {key: decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+        return value
+
+    return decode(json.loads(header)["body"])
+
+
+def read_message(sock: socket.socket):
+    length = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]
+    header = _recv_exactly(sock, length)
+    sizes = json.loads(header)["sizes"]
+    return decode_message(header, [_recv_exactly(sock, size) for size in sizes])
+
+
+async def aread_message(reader: asyncio.StreamReader):
+    length = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))[0]
+    header = await reader.readexactly(length)
+    sizes = json.loads(header)["sizes"]
+    return decode_message(header, [await reader.readexactly(size) for size in sizes])
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed by the service process.")
+        received += count
+    return buffer
+
+
+# =========================
+# CLIENT (API WORKERS)
+# =========================
+class ServiceClient:
+    """
+    Blocking calls to the service process, one connection per
+    thread (requests on a connection are answered in order).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+
+    def call(self, target: str, method: str, *args, **kwargs):
+        sock = self._connection()
+        try:
+            for part in encode_message({
+                "target": target,
+                "method": method,
+                "args": list(args),
+                "kwargs": kwargs
+            }):
+                sock.sendall(part)
+            reply = read_message(sock)
+        except OSError as e:
+            self._close()
+            raise ConnectionError(f"Service process at {self.path} unavailable: {e}")
+
+        if "error" in reply:
+            raise _ERRORS.get(reply["error"], RuntimeError)(reply["message"])
+        return reply["result"]
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self.local, "sock", None)
+        if sock is not None:
+            return sock
+
+        deadline = time.monotonic() + SERVICES_CONNECT_TIMEOUT
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                break
+            except OSError as e:
+                sock.close()
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Service process at {self.path} unavailable: {e}")
+                time.sleep(0.2)
+
+        self.local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self.local, "sock", None)
+        self.local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+class RemoteEmbeddingModel:
+    """
+    EmbeddingModel living in the service process. Vectors come
+    back as one float32 array (rows per text).
+    """
+
+    def __init__(self, path: str):
+        self.client = ServiceClient(path)
+        # Returns once the service process has loaded its model
+        self.model_name = self.client.call("service", "wait_ready")["model"]
+
+    def embed_texts(self, texts: list[str]) -> np.ndarray:
+        return self.client.call("embedder", "embed", list(texts))
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        return self.embed_texts(texts)
+
+    async def aembed_texts(self, texts: list[str]) -> np.ndarray:
+        return await run_blocking("embed", self.embed_texts, texts)
+
+    def warm_up(self):
+        # The service process warms its own model
+        pass
+
+    def cache_stats(self) -> dict:
+        return self.client.call("embedder", "cache_stats")
+
+
+class RemoteVectorStore(VectorStore):
+    """
+    VectorStore living in the service process, shared by all
+    workers.
+    """
+
+    def __init__(self, path: str):
+        self.client = ServiceClient(path)
+        self.client.call("service", "wait_ready")
+
+    @timed("add_documents")
+    def add_documents(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        doc_id: str = "default",
+        metadatas: list[dict] = None,
+        start_index: int = 0
+    ):
+        self.client.call(
+            "vector_store", "add_documents",
+            list(texts),
+            np.asarray(embeddings, dtype=np.float32),
+            doc_id=doc_id,
+            metadatas=metadatas,
+            start_index=start_index
+        )
+
+    def delete_document(self, doc_id: str):
+        self.client.call("vector_store", "delete_document", doc_id)
+
+    def has_document(self, doc_id: str) -> bool:
+        return self.client.call("vector_store", "has_document", doc_id)
+
+    def list_documents(self) -> list[dict]:
+        return self.client.call("vector_store", "list_documents")
+
+    @timed("search")
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 5,
+        doc_ids: list[str] = None
+    ) -> dict:
+        return self.client.call(
+            "vector_store", "search_many",
+            np.asarray(query_embeddings, dtype=np.float32),
+            top_k=top_k,
+            doc_ids=doc_ids
+        )
+
+    @timed("get_chunks")
+    def get_chunks(self, doc_ids: list[str] = None) -> list[dict]:
+        return self.client.call("vector_store", "get_chunks", doc_ids)
+
+    def persist(self):
+        self.client.call("vector_store", "persist")
+
+    def reset(self):
+        self.client.call("vector_store", "reset")
+
+    def snapshot(self, snapshot_id: str = None) -> dict:
+        return self.client.call("vector_store", "snapshot", snapshot_id)
+
+    def list_snapshots(self) -> list[dict]:
+        return self.client.call("vector_store", "list_snapshots")
+
+    def restore(self, snapshot_id: str) -> dict:
+        return self.client.call("vector_store", "restore", snapshot_id)
+
+
+class RemoteTextIndex:
+    """
+    PositionalIndex living in the service process.
+    """
+
+    def __init__(self, path: str):
+        self.client = ServiceClient(path)
+
+    def add(self, doc_id: str, texts: list[str], start_index: int = 0, spans: list[tuple] = None):
+        self.client.call("text_index", "add", doc_id, list(texts), start_index=start_index, spans=spans)
+
+    def delete_document(self, doc_id: str):
+        self.client.call("text_index", "delete_document", doc_id)
+
+    def clear(self):
+        self.client.call("text_index", "clear")
+
+    def rebuild_in_background(self, load=None, keep=None):
+        # The service process rebuilds from its own vector store
+        self.client.call("text_index", "rebuild")
+
+    def phrase_search(self, phrase: str, doc_ids: list[str] = None, following: int = 0, limit: int = 80) -> list[dict]:
+        return self.client.call(
+            "text_index", "phrase_search", phrase,
+            doc_ids=doc_ids, following=following, limit=limit
+        )
+
+    def bm25(self, query: str, doc_ids: list[str] = None, top_k: int = 10) -> list[tuple]:
+        return [
+            tuple(match)
+            for match in self.client.call("text_index", "bm25", query, doc_ids=doc_ids, top_k=top_k)
+        ]
+
+    def is_ready(self) -> bool:
+        try:
+            return self.client.call("text_index", "is_ready")
+        except ConnectionError:
+            return False
+
+    def stats(self) -> dict:
+        return self.client.call("text_index", "stats")
+
+
+class RemoteAnswerCache:
+    """
+    AnswerCache living in the service process: answers cached by
+    one worker are served by all, and invalidation reaches all.
+    """
+
+    def __init__(self, path: str):
+        from app.services.answer_cache import AnswerCache
+
+        self.client = ServiceClient(path)
+        self.make_key = AnswerCache.make_key
+
+    def get(self, key: tuple):
+        return self.client.call("answer_cache", "get", key)
+
+    def get_similar(self, key: tuple, embedding):
+        if embedding is None:
+            return None
+        return self.client.call(
+            "answer_cache", "get_similar", key, np.asarray(embedding, dtype=np.float32)
+        )
+
+    def record_miss(self):
+        self.client.call("answer_cache", "record_miss")
+
+    def put(self, key: tuple, answer: str, embedding=None):
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        self.client.call("answer_cache", "put", key, answer, embedding)
+
+    def invalidate(self, doc_id: str):
+        self.client.call("answer_cache", "invalidate", doc_id)
+
+    def clear(self):
+        self.client.call("answer_cache", "clear")
+
+    def stats(self) -> dict:
+        return self.client.call("answer_cache", "stats")
+
+
+class RemoteJobRegistry:
+    """
+    JobRegistry living in the service process. Workers publish
+    their jobs' status; any worker can look a job up.
+    """
+
+    def __init__(self, path: str):
+        self.client = ServiceClient(path)
+
+    def publish(self, job):
+        self.client.call("jobs", "publish", job.to_dict())
+
+    def get(self, job_id: str):
+        return self.client.call("jobs", "get", job_id)
+
+
+# =========================
+# SERVER (SERVICE PROCESS)
+# =========================
+def answer_cache_handlers(answer_cache) -> dict:
+    """
+    Service calls for an AnswerCache. Keys arrive as JSON lists.
+    """
+
+    key = answer_cache.key_from_list
+    return {
+        ("answer_cache", "get"): lambda k: answer_cache.get(key(k)),
+        ("answer_cache", "get_similar"): lambda k, e: answer_cache.get_similar(key(k), e),
+        ("answer_cache", "put"): lambda k, a, e: answer_cache.put(key(k), a, e),
+        **{("answer_cache", name): getattr(answer_cache, name) for name in ANSWER_CACHE_METHODS}
+    }
+
+
+class ServiceServer:
+    """
+    The service process: one embedding model, vector store,
+    keyword index, answer cache and job registry, served to every
+    API worker over a Unix socket.
+
+    Each connection's requests run in order; blocking calls go to
+    the per-stage thread pools, so connections run in parallel.
+    Short embedding requests from all workers (questions) are
+    merged by an EmbeddingBatcher; longer ones (ingestion) are
+    encoded directly. Requests arriving while the model loads
+    wait for it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ready = None
+        self.error = None
+        self.handlers = {}
+
+    def load(self):
+        from app.services.answer_cache import AnswerCache
+        from app.services.embeddings import EmbeddingBatcher, EmbeddingModel, embedding_model_id
+        from app.services.jobs import JobRegistry
+        from app.services.text_index import PositionalIndex
+        from app.services.vector_store import create_vector_store
+
+        vector_store = create_vector_store()
+        text_index = PositionalIndex()
+        text_index.rebuild_in_background(vector_store.get_chunks, keep=vector_store.has_document)
+
+        embedder = EmbeddingModel()
+        embedder.warm_up()
+        self.batcher = EmbeddingBatcher(embedder)
+        self.embedder = embedder
+
+        def rebuild():
+            text_index.rebuild_in_background(vector_store.get_chunks, keep=vector_store.has_document)
+
+        jobs = JobRegistry()
+
+        model = embedding_model_id()
+        self.handlers = {
+            ("service", "wait_ready"): lambda: {"model": model},
+            ("embedder", "embed"): self.embed,
+            ("embedder", "cache_stats"): embedder.cache_stats,
+            ("text_index", "rebuild"): rebuild,
+            ("jobs", "publish"): jobs.publish,
+            ("jobs", "get"): jobs.get,
+            **{("vector_store", name): getattr(vector_store, name) for name in VECTOR_STORE_METHODS},
+            **{("text_index", name): getattr(text_index, name) for name in TEXT_INDEX_METHODS},
+            **answer_cache_handlers(AnswerCache())
+        }
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if len(texts) < self.batcher.max_batch:
+            vectors = await asyncio.gather(*(self.batcher.embed(text) for text in texts))
+            return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        return await run_blocking("embed", self.embedder.embed_array, texts)
+
+    async def dispatch(self, request: dict):
+        await self.ready.wait()
+        if self.error:
+            raise RuntimeError(f"Service process failed to start: {self.error}")
+
+        handler = self.handlers.get((request["target"], request["method"]))
+        if handler is None:
+            raise ValueError(f"Unknown call: {request['target']}.{request['method']}")
+
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(*request["args"], **request["kwargs"])
+        stage = "embed" if request["target"] == "embedder" else "vector"
+        return await run_blocking(stage, handler, *request["args"], **request["kwargs"])
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await aread_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                try:
+                    parts = encode_message({"result": await self.dispatch(request)})
+                except Exception as e:
+                    parts = encode_message({"error": type(e).__name__, "message": str(e)})
+
+                for part in parts:
+                    writer.write(part)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            # Left behind by a previous run
+            os.remove(self.path)
+
+        self.ready = asyncio.Event()
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        print(f"[INFO] Service process listening on {self.path}")
+
+        started = time.perf_counter()
+        try:
+            await run_blocking("io", self.load)
+            print(f"[INFO] Service process ready in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Service process failed to load: {self.error}")
+        self.ready.set()
+
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,164 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================================
+# MAP-REDUCE DOCUMENT SUMMARIES
+# Built once per document at ingestion time, so summary and
+# notes requests cover the whole document without a large
+# LLM call per request.
+# ============================================================
+
+MAP_PROMPT = """
+Create detailed exam-ready notes for this part of a document.
+Cover every topic, definition, list, number and question that appears.
+Use ONLY the provided content. Do not add an introduction or conclusion.
+
+Content:
+{content}
+"""
+
+CONDENSE_PROMPT = """
+Merge these consecutive section notes into one set of notes.
+Keep every distinct topic, definition, list and number. Remove repetition.
+
+Section notes:
+{content}
+"""
+
+SUMMARY_PROMPT = """
+Summarize the whole document using ONLY these notes, which cover it from start to end.
+
+Notes:
+{content}
+"""
+
+SHORT_NOTES_PROMPT = """
+Create short exam-oriented notes for the whole document using ONLY these notes.
+
+Notes:
+{content}
+"""
+
+BULLETS_PROMPT = """
+Convert these notes into clean bullet points covering the whole document.
+
+Notes:
+{content}
+"""
+
+# Modes that can be answered from precomputed summaries
+PRECOMPUTED_MODES = ("summary", "short_notes", "long_notes", "bullets")
+
+
+def document_text_from_chunks(chunks: list[dict]) -> str:
+    """
+    Rebuild the document text from overlapping chunks using their
+    start / end offsets.
+    """
+
+    parts = []
+    covered = 0
+
+    for chunk in sorted(chunks, key=lambda c: c["start"]):
+        if chunk["end"] <= covered:
+            continue
+        skip = max(0, covered - chunk["start"])
+        parts.append(chunk["text"][skip:])
+        covered = chunk["end"]
+
+    return "".join(parts)
+
+
+def split_groups(text: str, group_chars: int) -> list[str]:
+    """
+    Split text into pieces of about `group_chars`, preferring to
+    cut at line breaks.
+    """
+
+    groups = []
+    start = 0
+
+    while start < len(text):
+        end = min(start + group_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start + group_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        groups.append(text[start:end])
+        start = end
+
+    return groups
+
+
+def build_summaries(
+    text: str,
+    generate,
+    max_workers: int = 4,
+    group_chars: int = 8000,
+    max_groups: int = 40
+) -> dict:
+    """
+    Map: section notes for each group of text, in parallel.
+    Reduce: condense notes level by level until they fit in one
+    group, then derive the summary, short notes and bullets.
+
+    `generate` is a prompt -> text callable (LLM.generate).
+    """
+
+    # Very long documents get larger groups instead of more calls
+    group_chars = max(group_chars, -(-len(text) // max_groups))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sections = list(pool.map(
+            lambda group: generate(MAP_PROMPT.format(content=group)),
+            split_groups(text, group_chars)
+        ))
+
+        notes = sections
+        while len(notes) > 1 and sum(len(n) for n in notes) > group_chars:
+            batches = _group_notes(notes, group_chars)
+            if len(batches) == len(notes):
+                # Notes are individually too large to merge further
+                break
+            notes = list(pool.map(
+                lambda batch: generate(CONDENSE_PROMPT.format(content=batch)),
+                batches
+            ))
+
+        reduced = "\n\n".join(notes)
+        summary, short_notes, bullets = pool.map(
+            lambda prompt: generate(prompt.format(content=reduced)),
+            [SUMMARY_PROMPT, SHORT_NOTES_PROMPT, BULLETS_PROMPT]
+        )
+
+    return {
+        "sections": sections,
+        "summary": summary,
+        "short_notes": short_notes,
+        "bullets": bullets,
+        "created_at": time.time()
+    }
+
+
+def precomputed_text(summaries: dict, mode: str) -> str:
+    if mode == "long_notes":
+        return "\n\n".join(summaries["sections"])
+    return summaries[mode]
+
+
+def _group_notes(notes: list[str], group_chars: int) -> list[str]:
+    batches = []
+    current = []
+    size = 0
+
+    for note in notes:
+        if current and size + len(note) > group_chars:
+            batches.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(note)
+        size += len(note)
+
+    if current:
+        batches.append("\n\n".join(current))
+
+    return batches
@@ -0,0 +1,272 @@
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from app.services.metrics import timed
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class PositionalIndex:
+    """
+    In-memory positional inverted index over stored chunks.
+
+    Every chunk ("<doc_id>:<chunk>", like the vector store ids) is
+    tokenized into lowercase words; postings map each term to the
+    chunks containing it and the word positions inside them. That
+    gives exact phrase lookup and BM25 keyword scoring without
+    scanning the documents.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        # Cleared while the index is rebuilt from the stored chunks
+        self.ready = threading.Event()
+        self.ready.set()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.postings = defaultdict(dict)   # term -> {row: [positions]}
+            self.rows = {}                      # row -> chunk dict (doc_id, chunk, text, start, end, length)
+            self.doc_rows = defaultdict(list)   # doc_id -> [row]
+            self.total_length = 0
+
+    # =========================
+    # WRITE
+    # =========================
+    def add(
+        self,
+        doc_id: str,
+        texts: list[str],
+        start_index: int = 0,
+        spans: list[tuple] = None
+    ):
+        """
+        Index chunks of one document; `spans` are their optional
+        (start, end) character offsets in the document.
+        """
+
+        with self.lock:
+            for i, text in enumerate(texts):
+                row = f"{doc_id}:{start_index + i}"
+                if row in self.rows:
+                    continue
+
+                tokens = tokenize(text)
+                for position, term in enumerate(tokens):
+                    self.postings[term].setdefault(row, []).append(position)
+
+                start, end = spans[i] if spans else (None, None)
+                self.rows[row] = {
+                    "doc_id": doc_id,
+                    "chunk": start_index + i,
+                    "text": text,
+                    "start": start,
+                    "end": end,
+                    "length": len(tokens)
+                }
+                self.doc_rows[doc_id].append(row)
+                self.total_length += len(tokens)
+
+    def rebuild(self, chunks: list[dict], keep=None):
+        """
+        Index stored chunks ({"doc_id", "chunk", "start", "end",
+        "text"}). Documents for which `keep(doc_id)` is false by the
+        time they are reached (deleted meanwhile) are skipped.
+        """
+
+        by_doc = defaultdict(list)
+        for chunk in chunks:
+            by_doc[chunk["doc_id"]].append(chunk)
+
+        for doc_id, doc_chunks in by_doc.items():
+            with self.lock:
+                if keep is not None and not keep(doc_id):
+                    continue
+                for chunk in doc_chunks:
+                    self.add(
+                        doc_id,
+                        [chunk["text"]],
+                        start_index=chunk["chunk"],
+                        spans=[(chunk["start"], chunk["end"])]
+                    )
+
+    def rebuild_in_background(self, load, keep=None) -> threading.Thread:
+        """
+        Clear and rebuild from `load()` on a daemon thread; `ready`
+        is set again once done. Chunks added meanwhile are indexed
+        as usual.
+        """
+
+        self.ready.clear()
+        self.clear()
+
+        def run():
+            started = time.perf_counter()
+            try:
+                self.rebuild(load(), keep=keep)
+                print(
+                    f"[INFO] Keyword index built: {self.stats()['chunks']} chunks "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            except Exception as e:
+                print(f"[WARN] Keyword index rebuild failed: {e}")
+            finally:
+                self.ready.set()
+
+        thread = threading.Thread(target=run, name="text-index-rebuild", daemon=True)
+        thread.start()
+        return thread
+
+    def delete_document(self, doc_id: str):
+        with self.lock:
+            for row in self.doc_rows.pop(doc_id, []):
+                entry = self.rows.pop(row)
+                self.total_length -= entry["length"]
+
+                for term in set(tokenize(entry["text"])):
+                    postings = self.postings.get(term)
+                    if postings is None:
+                        continue
+                    postings.pop(row, None)
+                    if not postings:
+                        del self.postings[term]
+
+    # =========================
+    # PHRASE SEARCH
+    # =========================
+    def phrase_rows(self, phrase: str, doc_ids: list[str] = None) -> list[str]:
+        """
+        Chunks containing the words of `phrase` consecutively, in
+        document order.
+        """
+
+        terms = tokenize(phrase)
+        if not terms:
+            return []
+
+        with self.lock:
+            postings = [self.postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+
+            # Intersect starting from the rarest term
+            candidates = set(min(postings, key=len))
+            for term_postings in postings:
+                candidates &= term_postings.keys()
+
+            hits = []
+            for row in candidates:
+                if doc_ids and self.rows[row]["doc_id"] not in doc_ids:
+                    continue
+                later = [set(p[row]) for p in postings[1:]]
+                if any(
+                    all(start + offset + 1 in positions for offset, positions in enumerate(later))
+                    for start in postings[0][row]
+                ):
+                    hits.append(row)
+
+            return sorted(hits, key=lambda row: _order(self.rows[row]))
+
+    @timed("phrase_search")
+    def phrase_search(
+        self,
+        phrase: str,
+        doc_ids: list[str] = None,
+        following: int = 0,
+        limit: int = 80
+    ) -> list[dict]:
+        """
+        Chunks containing `phrase`, each followed by up to
+        `following` next chunks of the same document (for text
+        that continues after a heading), in document order.
+        """
+
+        selected = []
+        seen = set()
+
+        with self.lock:
+            for row in self.phrase_rows(phrase, doc_ids):
+                entry = self.rows[row]
+                for chunk in range(entry["chunk"], entry["chunk"] + following + 1):
+                    key = f"{entry['doc_id']}:{chunk}"
+                    if key in seen or key not in self.rows:
+                        continue
+                    seen.add(key)
+                    selected.append(self.rows[key])
+
+        return selected[:limit]
+
+    # =========================
+    # BM25
+    # =========================
+    @timed("bm25")
+    def bm25(self, query: str, doc_ids: list[str] = None, top_k: int = 10) -> list[tuple]:
+        """
+        [(chunk, score)] for the best keyword matches, where chunk
+        is the indexed chunk dict.
+        """
+
+        terms = set(tokenize(query))
+
+        with self.lock:
+            if not self.rows:
+                return []
+
+            total = len(self.rows)
+            average_length = self.total_length / total or 1.0
+            scores = defaultdict(float)
+
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+
+                for row, positions in postings.items():
+                    entry = self.rows[row]
+                    if doc_ids and entry["doc_id"] not in doc_ids:
+                        continue
+                    tf = len(positions)
+                    scores[row] += idf * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * entry["length"] / average_length)
+                    )
+
+            best = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+            return [(self.rows[row], score) for row, score in best]
+
+    def is_ready(self) -> bool:
+        return self.ready.is_set()
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.rows),
+            "documents": len(self.doc_rows),
+            "terms": len(self.postings),
+            "ready": self.is_ready()
+        }
+
+
+def _order(chunk: dict) -> tuple:
+    return chunk["doc_id"], chunk["chunk"]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """
+    Merge ranked lists of ids: each id scores sum(1 / (k + rank)).
+    """
+
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: -scores[item])
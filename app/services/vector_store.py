@@ -1,50 +1,297 @@
-import chromadb
-from chromadb.config import Settings
+import os
+
+from app.services.concurrency import run_blocking
+from app.services.metrics import timed
+
+# "numpy" (in-process exact search) or "chroma"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "numpy").lower()
+
+# NumPy backend only: "int8" searches quantized codes and re-ranks
+# the best candidates with the float vectors kept on disk
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+
 
 class VectorStore:
-    def __init__(self, persist_directory: str = "app/data/chroma"):
-        self.client = chromadb.Client(
-            Settings(
-                persist_directory=persist_directory,
-                anonymized_telemetry=False
+    """
+    Interface for a store holding any number of documents.
+
+    Chunk ids are namespaced by document ("<doc_id>:<chunk>") and
+    every chunk carries metadata (doc_id, filename, sha256, chunk,
+    page, start, end), so documents can be added and deleted
+    independently and searches can be scoped to some of them.
+
+    search() returns Chroma-shaped results: {"ids", "documents",
+    "metadatas", "distances"}, each a list with one entry per query.
+    """
+
+    def add_documents(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        doc_id: str = "default",
+        metadatas: list[dict] = None,
+        start_index: int = 0
+    ):
+        raise NotImplementedError
+
+    def delete_document(self, doc_id: str):
+        raise NotImplementedError
+
+    def has_document(self, doc_id: str) -> bool:
+        raise NotImplementedError
+
+    def list_documents(self) -> list[dict]:
+        raise NotImplementedError
+
+    def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 5,
+        doc_ids: list[str] = None
+    ) -> dict:
+        return self.search_many([query_embedding], top_k=top_k, doc_ids=doc_ids)
+
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 5,
+        doc_ids: list[str] = None
+    ) -> dict:
+        raise NotImplementedError
+
+    def get_chunks(self, doc_ids: list[str] = None) -> list[dict]:
+        """
+        {"doc_id", "chunk", "start", "end", "text"} for every stored chunk, in
+        document order (by document, then chunk index).
+        """
+
+        raise NotImplementedError
+
+    def search_all(self, limit: int = 20, doc_ids: list[str] = None) -> list[str]:
+        """
+        Chunk texts in document order.
+        Kept for compatibility; the routes use get_chunks().
+        """
+
+        docs = [
+            chunk["text"] for chunk in self.get_chunks(doc_ids)
+            if chunk["text"] and isinstance(chunk["text"], str) and chunk["text"].strip()
+        ]
+        return docs[:limit]
+
+    def persist(self):
+        """
+        Write pending changes to disk (no-op for self-persisting
+        backends).
+        """
+
+    def reset(self):
+        raise NotImplementedError
+
+    # =========================
+    # SNAPSHOTS (backends without them raise NotImplementedError)
+    # =========================
+    def snapshot(self, snapshot_id: str = None) -> dict:
+        """
+        Persist and freeze the current contents; returns
+        {"snapshot_id", "documents", "chunks", "created_at"}.
+        """
+
+        raise NotImplementedError
+
+    def list_snapshots(self) -> list[dict]:
+        raise NotImplementedError
+
+    def restore(self, snapshot_id: str) -> dict:
+        """
+        Replace the contents with a snapshot (KeyError if unknown).
+        """
+
+        raise NotImplementedError
+
+    @staticmethod
+    def chunk_metadatas(
+        count: int,
+        doc_id: str,
+        metadatas: list[dict] = None,
+        start_index: int = 0
+    ) -> list[dict]:
+        chunk_metadatas = []
+        for i in range(count):
+            metadata = dict(metadatas[i]) if metadatas else {}
+            metadata["doc_id"] = doc_id
+            metadata["chunk"] = start_index + i
+            # Chroma only accepts str / int / float / bool values
+            chunk_metadatas.append(
+                {k: v for k, v in metadata.items() if v is not None}
             )
+        return chunk_metadatas
+
+    # =========================
+    # ASYNC API (runs on the "vector" thread pool)
+    # =========================
+    async def asearch(self, *args, **kwargs):
+        return await run_blocking("vector", self.search, *args, **kwargs)
+
+    async def asearch_many(self, *args, **kwargs):
+        return await run_blocking("vector", self.search_many, *args, **kwargs)
+
+    async def asearch_all(self, *args, **kwargs):
+        return await run_blocking("vector", self.search_all, *args, **kwargs)
+
+    async def aget_chunks(self, *args, **kwargs):
+        return await run_blocking("vector", self.get_chunks, *args, **kwargs)
+
+    async def alist_documents(self):
+        return await run_blocking("vector", self.list_documents)
+
+    async def adelete_document(self, doc_id: str):
+        await run_blocking("vector", self.delete_document, doc_id)
+        await run_blocking("vector", self.persist)
+
+    async def areset(self):
+        await run_blocking("vector", self.reset)
+        await run_blocking("vector", self.persist)
+
+    async def asnapshot(self, snapshot_id: str = None):
+        return await run_blocking("vector", self.snapshot, snapshot_id)
+
+    async def alist_snapshots(self):
+        return await run_blocking("vector", self.list_snapshots)
+
+    async def arestore(self, snapshot_id: str):
+        return await run_blocking("vector", self.restore, snapshot_id)
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    Chroma-backed store (SQLite + HNSW index), persisted under
+    persist_directory by Chroma itself.
+    """
+
+    def __init__(self, persist_directory: str = "app/data/chroma"):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(anonymized_telemetry=False)
         )
 
         self.collection = self.client.get_or_create_collection(
             name="documents"
         )
 
-    def add_documents(self, texts: list[str], embeddings: list[list[float]]):
-        ids = [f"doc_{i}" for i in range(len(texts))]
+    @timed("add_documents")
+    def add_documents(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        doc_id: str = "default",
+        metadatas: list[dict] = None,
+        start_index: int = 0
+    ):
+        """
+        Add chunks of one document. start_index lets a document be
+        added in several batches; metadatas are per-chunk extras
+        (filename, page, offsets, ...).
+
+        Upserted by chunk id, so a document ingested twice at once
+        (two workers, one file) keeps one row per chunk.
+        """
 
-        self.collection.add(
+        ids = [f"{doc_id}:{start_index + i}" for i in range(len(texts))]
+
+        self.collection.upsert(
             documents=texts,
             embeddings=embeddings,
+            metadatas=self.chunk_metadatas(
+                len(texts), doc_id, metadatas, start_index
+            ),
             ids=ids
         )
 
-    def search(self, query_embedding: list[float], top_k: int = 5):
+    def delete_document(self, doc_id: str):
+        self.collection.delete(where={"doc_id": doc_id})
+
+    def has_document(self, doc_id: str) -> bool:
+        results = self.collection.get(where={"doc_id": doc_id}, limit=1)
+        return bool(results["ids"])
+
+    def list_documents(self) -> list[dict]:
+        # The first chunk of every document carries its metadata
+        results = self.collection.get(
+            where={"chunk": 0},
+            include=["metadatas"]
+        )
+        return [
+            {
+                "doc_id": metadata["doc_id"],
+                "filename": metadata.get("filename"),
+                "sha256": metadata.get("sha256")
+            }
+            for metadata in results["metadatas"]
+        ]
+
+    @timed("search")
+    def search_many(
+        self,
+        query_embeddings: list[list[float]],
+        top_k: int = 5,
+        doc_ids: list[str] = None
+    ) -> dict:
         return self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
+            query_embeddings=[list(q) for q in query_embeddings],
+            n_results=top_k,
+            where=self._where(doc_ids)
         )
 
-    def search_all(self, limit: int = 20):
-        results = self.collection.get(include=["documents"])
-        docs = [
-            doc for doc in results["documents"]
-            if doc and isinstance(doc, str) and doc.strip()
+    @timed("get_chunks")
+    def get_chunks(self, doc_ids: list[str] = None) -> list[dict]:
+        results = self.collection.get(
+            where=self._where(doc_ids),
+            include=["documents", "metadatas"]
+        )
+
+        chunks = [
+            {
+                "doc_id": metadata.get("doc_id", ""),
+                "chunk": metadata.get("chunk", 0),
+                "start": metadata.get("start"),
+                "end": metadata.get("end"),
+                "text": doc
+            }
+            for doc, metadata in zip(results["documents"], results["metadatas"])
         ]
-        return docs[:limit]
+        return sorted(chunks, key=lambda chunk: (chunk["doc_id"], chunk["chunk"]))
+
+    @staticmethod
+    def _where(doc_ids: list[str] = None):
+        if not doc_ids:
+            return None
+        if len(doc_ids) == 1:
+            return {"doc_id": doc_ids[0]}
+        return {"doc_id": {"$in": list(doc_ids)}}
 
-    # ✅ THIS MUST BE INSIDE THE CLASS
     def reset(self):
         self.client.delete_collection(name="documents")
         self.collection = self.client.get_or_create_collection(
             name="documents"
         )
 
-  
 
-    
-    
\ No newline at end of file
+def create_vector_store(backend: str = None) -> VectorStore:
+    backend = (backend or VECTOR_BACKEND).lower()
+
+    if backend == "chroma":
+        return ChromaVectorStore()
+    if backend == "numpy":
+        from app.services.numpy_vector_store import (
+            NumpyVectorStore,
+            QuantizedNumpyVectorStore
+        )
+        if VECTOR_QUANTIZATION == "int8":
+            return QuantizedNumpyVectorStore()
+        return NumpyVectorStore()
+
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -0,0 +1,142 @@
+"""
+Embedding backends compared: throughput, memory and agreement with
+the PyTorch output.
+
+    python -m app.services.onnx_embedder --out app/data/models/all-MiniLM-L6-v2-onnx
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --threads 4 --files path/to/a.pdf
+
+Texts are the chunks of the bundled sample files (app/data/uploads),
+chunked as on upload. Each backend runs in its own process so the
+resident memory of PyTorch and ONNX Runtime is measured separately.
+Parity is the cosine similarity between each backend's vector and
+the PyTorch vector of the same text; the run fails if fp32 ONNX
+falls below --min-cosine.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.vector_store_bench import rss_mb
+
+SAMPLE_FILES = "app/data/uploads/*"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_texts(files: list[str], limit: int) -> list[str]:
+    from app.services.file_parser import iter_document_chunks
+
+    texts = []
+    for path in files:
+        texts += [chunk["text"] for chunk in iter_document_chunks(path)]
+    return texts[:limit] if limit else texts
+
+
+def make_encoder(args):
+    if args.backend == "torch":
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        return SentenceTransformer(args.model, device="cpu")
+
+    from app.services.onnx_embedder import OnnxEncoder
+    return OnnxEncoder(
+        args.onnx_dir,
+        quantized=args.backend == "onnx-int8",
+        threads=args.threads,
+        batch_size=args.batch
+    )
+
+
+def run_backend(args) -> dict:
+    texts = load_texts(args.files, args.limit)
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    encoder = make_encoder(args)
+    load_seconds = time.perf_counter() - started
+
+    # First call pays for lazy initialization
+    encoder.encode(texts[:args.batch])
+
+    started = time.perf_counter()
+    vectors = np.asarray(encoder.encode(texts), dtype=np.float32)
+    seconds = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    np.save(args.out, vectors)
+    return {
+        "backend": args.backend,
+        "texts": len(texts),
+        "load_seconds": round(load_seconds, 2),
+        "sentences_per_sec": round(len(texts) / seconds, 1),
+        "rss_delta_mb": (
+            round(rss_after - rss_before, 1)
+            if rss_before is not None and rss_after is not None else None
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", nargs="*")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default="app/data/models/all-MiniLM-L6-v2-onnx")
+    parser.add_argument("--backends", nargs="*", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=0, help="use only the first N chunks")
+    parser.add_argument("--min-cosine", type=float, default=0.9999)
+    # Internal: one backend in a child process
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.files = args.files or sorted(glob.glob(SAMPLE_FILES))
+
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    vectors = {}
+    with tempfile.TemporaryDirectory() as root:
+        for backend in args.backends:
+            out = os.path.join(root, f"{backend}.npy")
+            command = [
+                sys.executable, "-m", "benchmarks.embedding_backends",
+                "--backend", backend, "--out", out,
+                "--model", args.model, "--onnx-dir", args.onnx_dir,
+                "--threads", str(args.threads), "--batch", str(args.batch),
+                "--limit", str(args.limit), "--files", *args.files
+            ]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"[WARN] {backend} benchmark failed:\n{result.stderr.strip()}")
+                continue
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            vectors[backend] = np.load(out)
+
+            if backend != "torch" and "torch" in vectors:
+                cosine = np.sum(vectors[backend] * vectors["torch"], axis=1)
+                report["cosine_to_torch_min"] = round(float(cosine.min()), 6)
+                report["cosine_to_torch_mean"] = round(float(cosine.mean()), 6)
+            print(json.dumps(report))
+
+    if "torch" in vectors and "onnx" in vectors:
+        cosine = np.sum(vectors["onnx"] * vectors["torch"], axis=1)
+        if cosine.min() < args.min_cosine:
+            print(f"[WARN] fp32 ONNX disagrees with PyTorch: min cosine {cosine.min():.6f}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Local Groq-compatible chat completions server with latency, rate
+limits and random 429s, for exercising the LLM client without an
+API key or quota.
+
+    python -m benchmarks.fake_groq --port 8090 --latency-ms 300 --rpm 60 --tpm 20000 &
+    GROQ_BASE_URL=http://127.0.0.1:8090 GROQ_API_KEY=x uvicorn app.main:app
+
+Answers are canned text. Requests over --rpm / --tpm (per minute,
+0: unlimited) get a 429 with retry-after and the same
+x-ratelimit-* headers Groq sends; --error-rate adds 429s at random.
+--fail-first and --slow-first make the first requests fail or stall,
+for tests of retries and hedging.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+CHARS_PER_TOKEN = 4
+ANSWER = (
+    "This is a canned answer from the fake Groq server. It has a few "
+    "sentences so that streaming sends more than one chunk, and its "
+    "length stays the same for every question."
+)
+
+
+class Window:
+    """
+    Fixed one-minute window, like the limits Groq reports.
+    """
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.used = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        """
+        Seconds until `amount` fits (0: taken).
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.started >= 60:
+                self.used, self.started = 0, now
+            if self.limit and self.used + amount > self.limit:
+                return 60 - (now - self.started)
+            self.used += amount
+            return 0.0
+
+    def headers(self, kind: str) -> dict:
+        if not self.limit:
+            return {}
+        reset = max(0.0, 60 - (time.monotonic() - self.started))
+        return {
+            f"x-ratelimit-limit-{kind}": str(int(self.limit)),
+            f"x-ratelimit-remaining-{kind}": str(int(max(0, self.limit - self.used))),
+            f"x-ratelimit-reset-{kind}": f"{reset:.2f}s"
+        }
+
+
+def create_app(args):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    requests = Window(args.rpm)
+    tokens = Window(args.tpm)
+    stats = {
+        "requests": 0, "completed": 0, "rate_limited": 0, "cancelled": 0,
+        "in_flight": 0, "max_in_flight": 0
+    }
+    answer_tokens = math.ceil(len(ANSWER) / CHARS_PER_TOKEN)
+
+    def limit_headers():
+        return {**requests.headers("requests"), **tokens.headers("tokens")}
+
+    def rate_limited(retry_after: float, message: str):
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": message, "type": "tokens", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": str(max(1, math.ceil(retry_after))), **limit_headers()}
+        )
+
+    async def stall(request: Request, seconds: float) -> bool:
+        """
+        Sleep `seconds`, stopping early (False) if the client hangs up.
+        """
+
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if await request.is_disconnected():
+                stats["cancelled"] += 1
+                return False
+            await asyncio.sleep(min(0.01, max(0.0, deadline - time.monotonic())))
+        return True
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        number = stats["requests"]
+
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        prompt_tokens = math.ceil(prompt_chars / CHARS_PER_TOKEN)
+        total_tokens = prompt_tokens + answer_tokens
+
+        if number <= args.fail_first:
+            return rate_limited(1, "Rate limit reached (first requests).")
+        if random.random() < args.error_rate:
+            return rate_limited(1, "Rate limit reached (simulated).")
+        wait = requests.take(1)
+        if wait:
+            return rate_limited(wait, "Rate limit reached for requests per minute.")
+        wait = tokens.take(total_tokens)
+        if wait:
+            return rate_limited(wait, "Rate limit reached for tokens per minute.")
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": answer_tokens,
+            "total_tokens": total_tokens
+        }
+        latency = max(0.0, random.gauss(args.latency_ms, args.jitter_ms)) / 1000
+        if number <= args.fail_first + args.slow_first:
+            latency += args.slow_ms / 1000
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+        if not body.get("stream"):
+            try:
+                if not await stall(request, latency):
+                    return JSONResponse({}, status_code=499)
+            finally:
+                stats["in_flight"] -= 1
+            stats["completed"] += 1
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }, headers=limit_headers())
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            try:
+                # Latency until the first token, then a steady token rate
+                await asyncio.sleep(latency)
+                yield chunk({"role": "assistant", "content": ""})
+                for word in ANSWER.split(" "):
+                    yield chunk({"content": word + " "})
+                    await asyncio.sleep(args.token_ms / 1000)
+                yield chunk({}, finish_reason="stop")
+                yield "data: [DONE]\n\n"
+                stats["completed"] += 1
+            except asyncio.CancelledError:
+                stats["cancelled"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers=limit_headers())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--rpm", type=float, default=0)
+    parser.add_argument("--tpm", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0, help="429 the first N requests")
+    parser.add_argument("--slow-first", type=int, default=0, help="then delay N requests by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Concurrent LLM calls against the fake Groq server: how the client's
+rate limiting, retries and hedging hold up under load.
+
+    python -m benchmarks.llm_load --requests 60 --concurrency 20 --rpm 40 --error-rate 0.1
+    python -m benchmarks.llm_load --stream --hedge-after-ms 400 --jitter-ms 300
+
+Starts benchmarks/fake_groq.py on --port, points the client at it
+(GROQ_BASE_URL) and reports successes, failures, latency
+percentiles, client retries and the 429s the server sent. Client
+settings (LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+LLM_MAX_RETRIES, ...) are read from the environment as usual.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def start_server(args) -> subprocess.Popen:
+    import httpx
+
+    server = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_groq",
+        "--port", str(args.port),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--rpm", str(args.rpm),
+        "--tpm", str(args.tpm),
+        "--error-rate", str(args.error_rate)
+    ])
+
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{args.port}/stats", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Fake Groq server did not start")
+
+
+async def drive(args) -> dict:
+    from app.services.llm import LLM
+    from app.services.metrics import LLM_HEDGES, LLM_RETRIES
+
+    llm = LLM()
+    limiter = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], []
+
+    async def one(i: int):
+        async with limiter:
+            started = time.perf_counter()
+            try:
+                if args.stream:
+                    async for _ in llm.astream(f"Question {i}: {args.prompt}", hedge=True):
+                        # Time to first token
+                        latencies.append(time.perf_counter() - started)
+                        break
+                else:
+                    await llm.agenerate(f"Question {i}: {args.prompt}", hedge=True)
+                    latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    seconds = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": args.requests,
+        "succeeded": len(latencies),
+        "failed": {name: errors.count(name) for name in set(errors)},
+        "seconds": round(seconds, 2),
+        ("first_token_ms_p50" if args.stream else "latency_ms_p50"): round(float(np.percentile(latencies_ms, 50)), 1),
+        ("first_token_ms_p95" if args.stream else "latency_ms_p95"): round(float(np.percentile(latencies_ms, 95)), 1),
+        "client_retries": {dict(key).get("reason"): value for key, value in LLM_RETRIES.values.items()},
+        "hedges": {dict(key).get("request"): value for key, value in LLM_HEDGES.values.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--prompt", default="Explain the difference between a process and a thread. " * 20)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--rpm", type=float, default=0)
+    parser.add_argument("--tpm", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hedge-after-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    # Before app.services.llm reads its settings
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    os.environ["LLM_HEDGE_AFTER_MS"] = str(args.hedge_after_ms)
+
+    server = start_server(args)
+    try:
+        report = asyncio.run(drive(args))
+
+        import httpx
+        report["server"] = httpx.get(f"http://127.0.0.1:{args.port}/stats").json()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
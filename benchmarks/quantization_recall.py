@@ -0,0 +1,120 @@
+"""
+Recall@k and query latency of int8-quantized search against exact
+float search.
+
+    python -m benchmarks.quantization_recall
+    python -m benchmarks.quantization_recall --files path/to/a.pdf path/to/b.txt
+    python -m benchmarks.quantization_recall --extra-chunks 200000
+
+Documents are chunked and embedded the same way as on upload
+(the bundled sample files in app/data/uploads by default).
+Queries are the opening words of randomly chosen chunks.
+--extra-chunks adds random unit vectors to both stores, to see
+latency (and recall among distractors) at a larger corpus size.
+
+The int8 store saves memory, not time: codes are converted to
+float32 block by block for scoring, so expect latency close to
+the float store's.
+"""
+
+import argparse
+import glob
+import json
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.embeddings import EmbeddingModel
+from app.services.file_parser import iter_document_chunks
+from app.services.numpy_vector_store import NumpyVectorStore, QuantizedNumpyVectorStore
+
+SAMPLE_FILES = "app/data/uploads/*"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", nargs="*")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-chars", type=int, default=120)
+    parser.add_argument("--k", type=int, nargs="*", default=[1, 5, 8])
+    parser.add_argument("--extra-chunks", type=int, default=0)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(SAMPLE_FILES))
+    embedder = EmbeddingModel()
+
+    texts, doc_ids = [], []
+    for path in files:
+        for chunk in iter_document_chunks(path):
+            texts.append(chunk["text"])
+            doc_ids.append(path)
+
+    if not texts:
+        print("[WARN] No text found in the given files.")
+        return
+
+    embeddings = np.asarray(embedder.embed_texts(texts), dtype=np.float32)
+
+    rng = random.Random(0)
+    picked = [rng.randrange(len(texts)) for _ in range(args.queries)]
+    queries = embedder.embed_texts([texts[i][:args.query_chars] for i in picked])
+
+    with tempfile.TemporaryDirectory() as root:
+        exact = NumpyVectorStore(root=f"{root}/exact")
+        quantized = QuantizedNumpyVectorStore(root=f"{root}/int8")
+
+        for store in (exact, quantized):
+            start = 0
+            for path in files:
+                count = doc_ids.count(path)
+                if count:
+                    store.add_documents(
+                        texts[start:start + count],
+                        embeddings[start:start + count],
+                        doc_id=path
+                    )
+                start += count
+
+            if args.extra_chunks:
+                extra = np.random.default_rng(0).normal(
+                    size=(args.extra_chunks, embeddings.shape[1])
+                ).astype(np.float32)
+                store.add_documents([""] * len(extra), extra, doc_id="extra")
+
+            # The int8 store's float vectors move to disk on persist
+            store.persist()
+
+        report = {
+            "files": len(files),
+            "chunks": len(texts),
+            "extra_chunks": args.extra_chunks,
+            "queries": len(queries),
+            "exact_matrix_bytes": exact.memory_bytes(),
+            "int8_matrix_bytes": quantized.memory_bytes()
+        }
+
+        for k in args.k:
+            truth = exact.search_many(queries, top_k=k)["ids"]
+            found = quantized.search_many(queries, top_k=k)["ids"]
+            report[f"recall@{k}"] = round(float(np.mean([
+                len(set(t) & set(f)) / max(len(t), 1)
+                for t, f in zip(truth, found)
+            ])), 4)
+
+        top_k = max(args.k)
+        for name, store in (("exact", exact), ("int8", quantized)):
+            latencies = []
+            for query in queries:
+                started = time.perf_counter()
+                store.search(query, top_k=top_k)
+                latencies.append((time.perf_counter() - started) * 1000)
+            report[f"{name}_query_ms_p50"] = round(float(np.percentile(latencies, 50)), 3)
+            report[f"{name}_query_ms_p95"] = round(float(np.percentile(latencies, 95)), 3)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
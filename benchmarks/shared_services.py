@@ -0,0 +1,76 @@
+"""
+Round-trip cost of the shared service process, as seen by API
+workers: embedding calls and vector searches from several client
+processes at once.
+
+    python -m app.service_process --socket app/data/services.sock &
+    python -m benchmarks.shared_services --socket app/data/services.sock --clients 4
+
+Every client is its own process (like a uvicorn worker) with its
+own connection. Reports per-call latency percentiles and the total
+rate across clients; --texts sets the size of each embedding call
+(1: a question, 64: an ingestion batch).
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+
+def run_client(args, results):
+    from app.services.shared_services import RemoteEmbeddingModel, RemoteVectorStore
+
+    embedder = RemoteEmbeddingModel(args.socket)
+    store = RemoteVectorStore(args.socket)
+    texts = [f"benchmark sentence number {i} about vector search" for i in range(args.texts)]
+
+    embed_ms, search_ms = [], []
+    for i in range(args.calls):
+        started = time.perf_counter()
+        vectors = embedder.embed_texts([f"{text} {i}" for text in texts])
+        embed_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        store.search_many(vectors[:1], top_k=args.top_k)
+        search_ms.append((time.perf_counter() - started) * 1000)
+
+    results.put({"embed_ms": embed_ms, "search_ms": search_ms})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--socket", default="app/data/services.sock")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--texts", type=int, default=1)
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(target=run_client, args=(args, results))
+        for _ in range(args.clients)
+    ]
+
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    runs = [results.get() for _ in clients]
+    seconds = time.perf_counter() - started
+    for client in clients:
+        client.join()
+
+    report = {"clients": args.clients, "calls_per_client": args.calls, "texts_per_call": args.texts}
+    for key in ("embed_ms", "search_ms"):
+        values = np.concatenate([run[key] for run in runs])
+        report[f"{key}_p50"] = round(float(np.percentile(values, 50)), 2)
+        report[f"{key}_p95"] = round(float(np.percentile(values, 95)), 2)
+    report["embed_calls_per_sec"] = round(args.clients * args.calls / seconds, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cold start of the API: import time, first /healthz answer and time
+until /readyz reports every service loaded.
+
+    python -m benchmarks.startup_time --runs 3
+
+Each run is a fresh interpreter, so nothing is shared between runs
+(the OS page cache still is: run once beforehand to measure warm
+disk starts only).
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+
+with TestClient(app.main.app) as client:
+    healthy = None
+    while True:
+        if healthy is None and client.get("/healthz").status_code == 200:
+            healthy = time.perf_counter()
+        if client.get("/readyz").status_code == 200:
+            ready = time.perf_counter()
+            break
+        if time.perf_counter() - started > {timeout}:
+            ready = None
+            break
+        time.sleep(0.01)
+
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "healthz_ms": (healthy - started) * 1000,
+    "readyz_ms": (ready - started) * 1000 if ready else None
+}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(timeout=args.timeout)],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            print(f"[WARN] Start-up run failed:\n{result.stderr.strip()}")
+            continue
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        run["process_ms"] = (time.perf_counter() - started) * 1000
+        runs.append(run)
+
+    if not runs:
+        return
+
+    report = {"runs": len(runs)}
+    for key in ("import_ms", "healthz_ms", "readyz_ms", "process_ms"):
+        values = [run[key] for run in runs if run[key] is not None]
+        report[f"{key}_median"] = round(float(np.median(values)), 1) if values else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+"""
+Component benchmark suite: parse, clean + chunk, embed, search,
+context packing and end-to-end answers.
+
+    python -m benchmarks.suite --out before.json
+    python -m benchmarks.suite --out after.json --baseline before.json --max-regression 0.15
+    python -m benchmarks.suite --stages parse chunk --pages 1 100
+
+Documents are the bundled uploads (app/data/uploads) plus synthetic
+text PDFs of --pages pages (default 1, 100 and 1000), generated with
+a fixed seed so every run parses the same bytes.
+
+Each stage runs in a fresh process inside a scratch directory: the
+repository's app/data is never touched, nothing is cached from a
+previous run (OCR cache, embedding cache, artifacts) and peak RSS is
+per stage (it includes preparing the stage's inputs). Groq is
+replaced by StubLLM, so the suite runs offline; the embedding model
+is the configured one (EMBED_BACKEND) and must be available locally.
+
+Search runs against every chunk of every document, with seeded
+random unit vectors in place of embeddings (encoding thousands of
+chunks would dominate the run; the search cost does not depend on
+the vector values).
+
+Regression mode compares every metric with a baseline file:
+throughputs (*_per_sec) may not drop, and latencies (*_ms), times
+(*_seconds) and memory (*_mb) may not grow, by more than
+--max-regression; the exit status is 1 otherwise. A stage that
+fails, or a baseline metric the run no longer reports, also counts
+as a regression (a failed stage exits 1 even without a baseline).
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SAMPLE_FILES = "app/data/uploads/*"
+STAGES = ("parse", "chunk", "embed", "search", "context", "answer")
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = (
+    "What is the total number of pages in {doc}?",
+    "Explain the main topic covered in {doc}.",
+    "How many sections does {doc} have?",
+    "Give the exact text of the first heading in {doc}.",
+    "Summarize the key points about {word}.",
+    "What does the document say about {word}?"
+)
+
+WORDS = (
+    "array list stack queue tree graph heap hash table sort search merge "
+    "insertion binary linear pointer node edge vertex path cycle recursion "
+    "complexity memory algorithm structure index key value order level "
+    "balance rotation traversal depth breadth weight matrix element"
+).split()
+
+
+# =========================
+# SYNTHETIC DOCUMENTS
+# =========================
+def synthetic_lines(pages: int, seed: int, lines_per_page: int = 45):
+    rng = random.Random(seed)
+    for page in range(pages):
+        lines = [f"Section {page + 1}: {rng.choice(WORDS).title()} {rng.choice(WORDS)}"]
+        for _ in range(lines_per_page - 1):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+        yield lines
+
+
+def write_synthetic_pdf(path: str, pages: int, seed: int = 0):
+    """
+    Minimal text PDF (Helvetica, one content stream per page), no
+    PDF library needed.
+    """
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+
+    for lines in synthetic_lines(pages, seed):
+        text = "\n".join(f"({line}) '" for line in lines)
+        stream = f"BT /F1 10 Tf 12 TL 50 800 Td\n{text}\nET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{kid} 0 R" for kid in kids).encode(), len(kids)
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def prepare_documents(workdir: str, files: list[str], pages: list[int]) -> list[dict]:
+    docs = [
+        {"name": os.path.basename(path), "path": os.path.abspath(path), "synthetic_pages": None}
+        for path in files
+    ]
+
+    os.makedirs(os.path.join(workdir, "docs"), exist_ok=True)
+    for count in pages:
+        path = os.path.join(workdir, "docs", f"synthetic-{count}p.pdf")
+        write_synthetic_pdf(path, count, seed=count)
+        docs.append({"name": f"synthetic-{count}p", "path": path, "synthetic_pages": count})
+
+    return docs
+
+
+# =========================
+# OFFLINE LLM
+# =========================
+class StubLLM:
+    """
+    Stands in for the Groq client (same methods as LLM): a fixed
+    answer after `latency_ms`, streamed word by word.
+    """
+
+    answer = "This is a stub answer generated offline for benchmarking."
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+
+    def generate(self, prompt: str, background: bool = False) -> str:
+        time.sleep(self.latency)
+        return self.answer
+
+    async def agenerate(self, prompt: str, hedge: bool = False) -> str:
+        from app.services.concurrency import stage_slot
+
+        async with stage_slot("llm"):
+            await asyncio.sleep(self.latency)
+        return self.answer
+
+    async def astream(self, prompt: str, hedge: bool = False):
+        await asyncio.sleep(self.latency)
+        for word in self.answer.split(" "):
+            yield word + " "
+
+
+# =========================
+# STAGES (ONE PROCESS EACH)
+# =========================
+def percentiles(prefix: str, values: list[float]) -> dict:
+    return {
+        f"{prefix}_p{q}_ms": round(float(np.percentile(values, q)), 3)
+        for q in (50, 95, 99)
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; parse workers count as children
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return round(usage / 1024, 1)
+
+
+def raw_pages(path: str) -> list[str]:
+    from app.services.file_parser import iter_pdf_texts
+
+    if path.endswith(".pdf"):
+        return [text for _, text in iter_pdf_texts(path)]
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [f.read()]
+
+
+def document_chunks(docs: list[dict]) -> list[dict]:
+    from app.services.file_parser import iter_document_chunks
+
+    chunks = []
+    for doc in docs:
+        for chunk in iter_document_chunks(doc["path"]):
+            chunks.append(dict(chunk, doc_id=doc["name"]))
+    return chunks
+
+
+def stage_parse(docs: list[dict], args) -> dict:
+    from app.services.file_parser import iter_numbered_pages
+
+    report = {"documents": {}}
+    total_pages = 0
+    total_seconds = 0.0
+
+    for doc in docs:
+        started = time.perf_counter()
+        pages = characters = 0
+        for _, text in iter_numbered_pages(doc["path"]):
+            pages += 1
+            characters += len(text)
+        seconds = time.perf_counter() - started
+
+        report["documents"][doc["name"]] = {
+            "pages": pages,
+            "characters": characters,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 1) if seconds else None
+        }
+        total_pages += pages
+        total_seconds += seconds
+
+    report["pages_per_sec"] = round(total_pages / total_seconds, 1) if total_seconds else None
+    return report
+
+
+def stage_chunk(docs: list[dict], args) -> dict:
+    from app.services.file_parser import clean_text, iter_chunk_spans
+
+    pages = [raw_pages(doc["path"]) for doc in docs]
+    characters = sum(len(text) for doc_pages in pages for text in doc_pages)
+
+    started = time.perf_counter()
+    cleaned = [[clean_text(text) for text in doc_pages] for doc_pages in pages]
+    clean_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = sum(
+        1 for doc_pages in cleaned for _ in iter_chunk_spans(doc_pages, 500, 80)
+    )
+    chunk_seconds = time.perf_counter() - started
+
+    return {
+        "characters": characters,
+        "chunks": chunks,
+        "clean_mb_per_sec": round(characters / clean_seconds / 1e6, 2) if clean_seconds else None,
+        "chunks_per_sec": round(chunks / chunk_seconds, 1) if chunk_seconds else None
+    }
+
+
+def stage_embed(docs: list[dict], args) -> dict:
+    from app.services.embeddings import EmbeddingModel
+
+    texts = [chunk["text"] for chunk in document_chunks(docs)][:args.embed_chunks]
+
+    started = time.perf_counter()
+    model = EmbeddingModel()
+    model.warm_up()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for start in range(0, len(texts), args.batch):
+        model.embed_texts(texts[start:start + args.batch])
+    seconds = time.perf_counter() - started
+
+    latencies = []
+    for i in range(args.queries):
+        question = f"{random.Random(i).choice(WORDS)} question {i}"
+        started = time.perf_counter()
+        model.embed_texts([question])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": model.backend,
+        "texts": len(texts),
+        "load_seconds": round(load_seconds, 2),
+        "embeddings_per_sec": round(len(texts) / seconds, 1) if seconds else None,
+        **percentiles("query_embed", latencies)
+    }
+
+
+def stage_search(docs: list[dict], args) -> dict:
+    from app.services.text_index import PositionalIndex
+    from app.services.vector_store import create_vector_store
+
+    chunks = document_chunks(docs)
+    rng = np.random.default_rng(0)
+
+    def unit(rows):
+        vectors = rng.normal(size=(rows, args.dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    store = create_vector_store()
+    index = PositionalIndex()
+    vectors = unit(len(chunks))
+
+    started = time.perf_counter()
+    for doc in docs:
+        rows = [i for i, chunk in enumerate(chunks) if chunk["doc_id"] == doc["name"]]
+        for start in range(0, len(rows), args.batch):
+            batch = rows[start:start + args.batch]
+            store.add_documents(
+                [chunks[i]["text"] for i in batch],
+                vectors[batch].tolist(),
+                doc_id=doc["name"],
+                start_index=start
+            )
+            index.add(doc["name"], [chunks[i]["text"] for i in batch], start_index=start)
+    add_seconds = time.perf_counter() - started
+
+    vector_ms = []
+    for query in unit(args.queries):
+        started = time.perf_counter()
+        store.search(query.tolist(), top_k=8)
+        vector_ms.append((time.perf_counter() - started) * 1000)
+
+    keyword_ms = []
+    for i in range(args.queries):
+        words = random.Random(i).sample(WORDS, 3)
+        started = time.perf_counter()
+        index.bm25(" ".join(words), top_k=8)
+        keyword_ms.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "chunks": len(chunks),
+        "add_seconds": round(add_seconds, 3),
+        **percentiles("vector_search", vector_ms),
+        **percentiles("bm25", keyword_ms)
+    }
+
+
+def stage_context(docs: list[dict], args) -> dict:
+    from app.services.context_packer import count_tokens, pack_context
+
+    chunks = [
+        dict(chunk, id=f"{chunk['doc_id']}:{i}")
+        for i, chunk in enumerate(document_chunks(docs))
+    ]
+    rng = random.Random(0)
+
+    latencies = []
+    tokens = []
+    for _ in range(args.queries):
+        # Retrieval returns neighbouring, overlapping chunks more often than not
+        first = rng.randrange(max(1, len(chunks) - 8))
+        picked = chunks[first:first + 4] + rng.sample(chunks, min(4, len(chunks)))
+        started = time.perf_counter()
+        context = pack_context(picked)
+        latencies.append((time.perf_counter() - started) * 1000)
+        tokens.append(count_tokens(context))
+
+    return {
+        "chunks": len(chunks),
+        "avg_context_tokens": round(float(np.mean(tokens)), 1),
+        **percentiles("pack_context", latencies)
+    }
+
+
+def stage_answer(docs: list[dict], args) -> dict:
+    from fastapi.testclient import TestClient
+
+    import app.main
+    import app.routes.upload as upload
+    from app.services.lazy import LazyService
+
+    upload.llm = LazyService("LLM client", lambda: StubLLM(args.llm_latency_ms))
+    docs = [
+        doc for doc in docs
+        if doc["synthetic_pages"] is None or doc["synthetic_pages"] <= args.answer_pages
+    ]
+
+    with TestClient(app.main.app) as client:
+        while client.get("/readyz").status_code != 200:
+            time.sleep(0.05)
+
+        started = time.perf_counter()
+        jobs = []
+        for doc in docs:
+            with open(doc["path"], "rb") as f:
+                response = client.post("/upload", files={"file": (os.path.basename(doc["path"]), f)})
+            jobs.append(response.json()["job_id"])
+
+        for job_id in jobs:
+            while client.get(f"/jobs/{job_id}").json()["status"] not in ("done", "failed"):
+                time.sleep(0.05)
+        ingest_seconds = time.perf_counter() - started
+
+        latencies = []
+        rng = random.Random(0)
+        for i in range(args.queries):
+            question = rng.choice(QUESTIONS).format(
+                doc=rng.choice(docs)["name"], word=rng.choice(WORDS)
+            )
+            started = time.perf_counter()
+            response = client.post("/answer", json={"question": f"{question} ({i})"})
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+
+    return {
+        "documents": len(docs),
+        "ingest_seconds": round(ingest_seconds, 2),
+        "llm_latency_ms": args.llm_latency_ms,
+        **percentiles("answer", latencies)
+    }
+
+
+def run_stage(args) -> dict:
+    with open(os.path.join(args.workdir, "docs.json"), "r") as f:
+        docs = json.load(f)
+
+    report = globals()[f"stage_{args.stage}"](docs, args)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+# =========================
+# REGRESSION CHECK
+# =========================
+def flatten(report: dict, prefix: str = "") -> dict:
+    metrics = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def regressions(current: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Metrics more than `max_regression` worse than the baseline. A
+    stage that failed, or a baseline metric missing from a stage
+    that ran, counts as a regression too.
+    """
+
+    found = [f"{stage} stage failed" for stage in current.get("failed_stages", [])]
+    ran = set(current["stages"])
+    current = flatten(current["stages"])
+
+    for name, before in flatten(baseline["stages"]).items():
+        if name.split(".", 1)[0] not in ran:
+            # Not run this time (--stages), or already reported as failed
+            continue
+        after = current.get(name)
+        if after is None:
+            found.append(f"{name}: {before} -> missing")
+            continue
+        if not before:
+            continue
+
+        if name.endswith("_per_sec"):
+            change = (before - after) / before
+        elif name.endswith(("_ms", "_seconds", "_mb")):
+            change = (after - before) / before
+        else:
+            continue
+
+        if change > max_regression:
+            found.append(f"{name}: {before} -> {after} ({change:+.0%} worse)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--files", nargs="*")
+    parser.add_argument("--pages", nargs="*", type=int, default=[1, 100, 1000],
+                        help="sizes of the synthetic PDFs")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embed-chunks", type=int, default=512,
+                        help="chunks encoded by the embed stage")
+    parser.add_argument("--answer-pages", type=int, default=100,
+                        help="largest synthetic PDF ingested by the answer stage")
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    # Internal: one stage in a child process
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(run_stage(args)))
+        return
+
+    files = args.files or sorted(glob.glob(os.path.join(REPO, SAMPLE_FILES)))
+    results = {
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True
+        ).stdout.strip() or None,
+        "settings": {
+            name: os.getenv(name)
+            for name in ("EMBED_BACKEND", "EMBED_ONNX_QUANTIZED", "EMBED_THREADS",
+                         "VECTOR_BACKEND", "VECTOR_QUANTIZATION", "ENABLE_OCR", "PDF_WORKERS")
+            if os.getenv(name) is not None
+        },
+        "args": {key: value for key, value in vars(args).items() if key not in ("stage", "workdir")},
+        "stages": {},
+        "failed_stages": []
+    }
+
+    # Stage processes run in a scratch directory, uncached
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.getenv("PYTHONPATH")])),
+        ENABLE_EMBED_CACHE="false",
+        PRECOMPUTE_SUMMARIES="false",
+        ANSWER_CACHE_SIMILARITY="2"
+    )
+
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    try:
+        docs = prepare_documents(workdir, files, args.pages)
+        with open(os.path.join(workdir, "docs.json"), "w") as f:
+            json.dump(docs, f)
+
+        for stage in args.stages:
+            stage_dir = os.path.join(workdir, stage)
+            os.makedirs(stage_dir)
+            command = [
+                sys.executable, "-m", "benchmarks.suite",
+                "--stage", stage, "--workdir", workdir,
+                "--queries", str(args.queries), "--embed-chunks", str(args.embed_chunks),
+                "--answer-pages", str(args.answer_pages), "--llm-latency-ms", str(args.llm_latency_ms),
+                "--batch", str(args.batch), "--dim", str(args.dim)
+            ]
+            started = time.perf_counter()
+            result = subprocess.run(command, cwd=stage_dir, env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"[ERROR] {stage} stage failed:\n{result.stderr.strip()}")
+                results["failed_stages"].append(stage)
+                continue
+
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            report["process_seconds"] = round(time.perf_counter() - started, 2)
+            results["stages"][stage] = report
+            print(f"[INFO] {stage}: {json.dumps(report)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.max_regression)
+        for line in found:
+            print(f"[WARN] Regression: {line}")
+        if found:
+            sys.exit(1)
+        print(f"[INFO] No regression beyond {args.max_regression:.0%} against {args.baseline}")
+
+    if results["failed_stages"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
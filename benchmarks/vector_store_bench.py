@@ -0,0 +1,133 @@
+"""
+Compare vector store backends on query latency and memory.
+
+    python -m benchmarks.vector_store_bench --chunks 5000 --queries 200
+
+Each backend runs in its own process so resident memory is
+measured in isolation. Embeddings are random unit vectors of
+the embedding model's dimension (384 for all-MiniLM-L6-v2).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ("numpy", "chroma")
+
+
+def rss_mb():
+    # Linux only; None elsewhere
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def make_store(backend: str, root: str):
+    if backend == "numpy":
+        from app.services.numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore(root=os.path.join(root, "vectors"))
+
+    from app.services.vector_store import ChromaVectorStore
+    return ChromaVectorStore(persist_directory=os.path.join(root, "chroma"))
+
+
+def percentile(values: list[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 3)
+
+
+def run_backend(args) -> dict:
+    rng = np.random.default_rng(0)
+
+    def unit(rows):
+        vectors = rng.normal(size=(rows, args.dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    embeddings = unit(args.chunks)
+    queries = unit(args.queries)
+    texts = [f"chunk {i}" for i in range(args.chunks)]
+
+    with tempfile.TemporaryDirectory() as root:
+        rss_before = rss_mb()
+        store = make_store(args.backend, root)
+
+        started = time.perf_counter()
+        for start in range(0, args.chunks, args.batch):
+            end = start + args.batch
+            store.add_documents(
+                texts[start:end],
+                embeddings[start:end].tolist(),
+                doc_id=f"doc{start // args.docs_every}",
+                start_index=start
+            )
+        add_seconds = time.perf_counter() - started
+        rss_after = rss_mb()
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            store.search(query.tolist(), top_k=args.top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        for start in range(0, args.queries, args.batch_queries):
+            store.search_many(
+                queries[start:start + args.batch_queries].tolist(),
+                top_k=args.top_k
+            )
+        batched_ms = (time.perf_counter() - started) * 1000 / args.queries
+
+    return {
+        "backend": args.backend,
+        "chunks": args.chunks,
+        "dim": args.dim,
+        "add_seconds": round(add_seconds, 3),
+        "query_p50_ms": percentile(latencies, 50),
+        "query_p95_ms": percentile(latencies, 95),
+        "batched_query_ms": round(batched_ms, 3),
+        "rss_delta_mb": (
+            round(rss_after - rss_before, 1)
+            if rss_before is not None and rss_after is not None else None
+        )
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=BACKENDS)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--batch-queries", type=int, default=32)
+    parser.add_argument("--docs-every", type=int, default=1000,
+                        help="chunks per synthetic document")
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    # One fresh process per backend
+    for backend in BACKENDS:
+        command = [sys.executable, "-m", "benchmarks.vector_store_bench", "--backend", backend]
+        for name in ("chunks", "dim", "queries", "top_k", "batch", "batch_queries", "docs_every"):
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[WARN] {backend} benchmark failed:\n{result.stderr.strip()}")
+            continue
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
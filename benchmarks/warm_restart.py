@@ -0,0 +1,136 @@
+"""
+Warm restart of the NumPy vector store: open time by corpus size, and
+identical results before and after a restart.
+
+    python -m benchmarks.warm_restart --chunks 10000 100000 --dim 384
+    python -m benchmarks.warm_restart --quantization int8
+
+For every size a store is filled with random unit vectors and
+persisted, queried, then reopened in a fresh process (the restart)
+and queried again. The run fails if any result differs.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+QUERY_SEED = 1
+
+
+def store_class(quantization: str):
+    from app.services.numpy_vector_store import NumpyVectorStore, QuantizedNumpyVectorStore
+    return QuantizedNumpyVectorStore if quantization == "int8" else NumpyVectorStore
+
+
+def queries(args) -> np.ndarray:
+    rng = np.random.default_rng(QUERY_SEED)
+    return rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+
+def results(store, args) -> dict:
+    found = store.search_many(queries(args), top_k=args.top_k)
+    return {"ids": found["ids"], "documents": found["documents"]}
+
+
+def build(args, root: str) -> dict:
+    rng = np.random.default_rng(0)
+    store = store_class(args.quantization)(root=root)
+
+    for start in range(0, args.size, args.batch):
+        end = min(start + args.batch, args.size)
+        store.add_documents(
+            [f"chunk {i} of the synthetic corpus" for i in range(start, end)],
+            rng.normal(size=(end - start, args.dim)).astype(np.float32),
+            doc_id=f"doc{start // args.docs_every}",
+            metadatas=[{"filename": "synthetic.txt", "start": i * 420, "end": i * 420 + 500}
+                       for i in range(start, end)],
+            start_index=start % args.docs_every
+        )
+
+    started = time.perf_counter()
+    store.persist()
+    persist_seconds = time.perf_counter() - started
+
+    return {"persist_seconds": round(persist_seconds, 3), **results(store, args)}
+
+
+def reopen(args, root: str) -> dict:
+    started = time.perf_counter()
+    store = store_class(args.quantization)(root=root)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    found = results(store, args)
+    first_query_ms = (time.perf_counter() - started) * 1000 / args.queries
+
+    return {
+        "open_ms": round(open_ms, 2),
+        "first_queries_ms": round(first_query_ms, 3),
+        **found
+    }
+
+
+def run(args, step: str) -> dict:
+    command = [sys.executable, "-m", "benchmarks.warm_restart", "--step", step, "--root", args.root]
+    for name in ("size", "dim", "queries", "top_k", "batch", "docs_every", "quantization"):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{step} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--docs-every", type=int, default=1000,
+                        help="chunks per synthetic document")
+    parser.add_argument("--quantization", choices=("none", "int8"), default="none")
+    # Internal: one step in a child process
+    parser.add_argument("--step", choices=("build", "reopen"), help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step == "build":
+        print(json.dumps(build(args, args.root)))
+        return
+    if args.step == "reopen":
+        print(json.dumps(reopen(args, args.root)))
+        return
+
+    failed = False
+    for size in args.chunks:
+        with tempfile.TemporaryDirectory() as root:
+            args.root, args.size = root, size
+            before = run(args, "build")
+            after = run(args, "reopen")
+
+        identical = all(before[key] == after[key] for key in ("ids", "documents"))
+        failed = failed or not identical
+        print(json.dumps({
+            "chunks": size,
+            "dim": args.dim,
+            "quantization": args.quantization,
+            "persist_seconds": before["persist_seconds"],
+            "open_ms": after["open_ms"],
+            "first_queries_ms": after["first_queries_ms"],
+            "identical_results": identical
+        }))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
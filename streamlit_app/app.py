@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import time
 
 BACKEND_URL = "http://127.0.0.1:8000"
@@ -23,7 +24,9 @@ def load_state():
     return {
         "uploaded": False,
         "messages": [],
-        "last_file_name": None
+        "last_file_name": None,
+        "doc_id": None,
+        "upload_id": None
     }
 
 @st.cache_data(show_spinner=False)
@@ -42,13 +45,68 @@ if "messages" not in st.session_state:
 if "last_file_name" not in st.session_state:
     st.session_state.last_file_name = state["last_file_name"]
 
+if "doc_id" not in st.session_state:
+    st.session_state.doc_id = state.get("doc_id")
+
+if "upload_id" not in st.session_state:
+    st.session_state.upload_id = state.get("upload_id")
+
+# =========================
+# STREAMING HELPER (SERVER-SENT EVENTS)
+# =========================
+def stream_answer(payload):
+    """
+    Yield answer tokens from /answer/stream as they arrive.
+    """
+    with requests.post(
+        f"{BACKEND_URL}/answer/stream",
+        json=payload,
+        stream=True
+    ) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Backend returned {response.status_code}")
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+                continue
+            if not line.startswith("data:"):
+                continue
+
+            data = json.loads(line[len("data:"):])
+            if event == "error":
+                raise RuntimeError(data.get("error", "Unknown error"))
+            if event == "done":
+                return
+            yield data.get("token", "")
+
 # =========================
-# STREAMING HELPER
+# INGESTION JOB POLLING
 # =========================
-def stream_text(text, delay=0.05):
-    for word in text.split(" "):
-        yield word + " "
-        time.sleep(delay)
+def wait_for_job(job_id, poll_interval=1.0):
+    status = st.empty()
+
+    while True:
+        try:
+            response = requests.get(f"{BACKEND_URL}/jobs/{job_id}")
+            # 404 etc. carry {"detail": ...}, not a job
+            job = response.json() if response.ok else None
+        except Exception:
+            job = None
+
+        if job is None or job.get("status") not in ("queued", "running"):
+            status.empty()
+            return job
+
+        running = [s["name"] for s in job["stages"] if s["status"] == "running"]
+        if running:
+            status.caption(f"Processing: {running[0]}...")
+
+        time.sleep(poll_interval)
 
 # =========================
 # FILE UPLOAD
@@ -81,11 +139,21 @@ if uploaded_file is None and st.session_state.uploaded:
     st.session_state.uploaded = False
     st.session_state.messages = []
     st.session_state.last_file_name = None
+    doc_id = st.session_state.doc_id
+    upload_id = st.session_state.upload_id
+    st.session_state.doc_id = None
+    st.session_state.upload_id = None
 
     st.cache_data.clear()  # clear persistence
 
+    # Only this upload is released; the document stays for other
+    # users who uploaded the same file
     try:
-        requests.post(f"{BACKEND_URL}/reset")
+        if doc_id and upload_id:
+            requests.delete(
+                f"{BACKEND_URL}/documents/{doc_id}",
+                params={"upload_id": upload_id}
+            )
     except Exception:
         pass
 
@@ -100,13 +168,20 @@ elif uploaded_file is not None:
                 files={"file": (uploaded_file.name, uploaded_file.getvalue())}
             )
 
-        if response.status_code == 200:
+            job = None
+            if response.status_code in (200, 202):
+                job = wait_for_job(response.json()["job_id"])
+
+        if job and job["status"] == "done":
             st.success("Document uploaded successfully!")
             st.session_state.uploaded = True
             st.session_state.messages = []
             st.session_state.last_file_name = uploaded_file.name
+            st.session_state.doc_id = job["result"]["doc_id"]
+            st.session_state.upload_id = job["job_id"]
         else:
-            st.error("Upload failed.")
+            error = job.get("error") if job else None
+            st.error(f"Upload failed: {error}" if error else "Upload failed.")
             st.stop()
 
 # =========================
@@ -137,28 +212,25 @@ if st.session_state.uploaded:
         payload = {
             "question": user_input,
             "mode": "qa",
-            "language": "english"
+            "language": "english",
+            "doc_ids": [st.session_state.doc_id] if st.session_state.doc_id else None
         }
 
         # ASSISTANT (STREAMING)
         with st.chat_message("assistant"):
             placeholder = st.empty()
-
-            with st.spinner("Thinking..."):
-                response = requests.post(
-                    f"{BACKEND_URL}/answer",
-                    json=payload
-                )
-
-            if response.status_code == 200:
-                full_answer = response.json().get("answer", "")
-            else:
+            placeholder.markdown("Thinking...")
+
+            full_answer = ""
+            try:
+                for token in stream_answer(payload):
+                    full_answer += token
+                    placeholder.markdown(full_answer)
+                # Same text as the backend's final (stripped) answer
+                full_answer = full_answer.strip()
+            except Exception:
                 full_answer = "Something went wrong."
-
-            streamed = ""
-            for chunk in stream_text(full_answer):
-                streamed += chunk
-                placeholder.markdown(streamed)
+                placeholder.markdown(full_answer)
 
         st.session_state.messages.append({
             "role": "assistant",
@@ -174,5 +246,7 @@ else:
 save_state({
     "uploaded": st.session_state.uploaded,
     "messages": st.session_state.messages,
-    "last_file_name": st.session_state.last_file_name
+    "last_file_name": st.session_state.last_file_name,
+    "doc_id": st.session_state.doc_id,
+    "upload_id": st.session_state.upload_id
 })
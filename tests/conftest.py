@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+# Runs first in every app process: the app with Groq replaced by a
+# stub that records the prompts it is sent
+APP_PRELUDE = """
+import json
+import time
+
+import app.main
+import app.routes.upload as upload
+from app.services.lazy import LazyService
+from benchmarks.suite import StubLLM
+from fastapi.testclient import TestClient
+
+prompts = []
+
+
+class RecordingLLM(StubLLM):
+    async def agenerate(self, prompt, hedge=False):
+        prompts.append(prompt)
+        return await super().agenerate(prompt)
+
+
+upload.llm = LazyService("LLM client", RecordingLLM)
+upload.PRECOMPUTE_SUMMARIES = False
+
+
+def wait_ready(client):
+    while client.get("/readyz").status_code != 200:
+        time.sleep(0.05)
+    while not client.get("/readyz").json()["text_index_ready"]:
+        time.sleep(0.05)
+"""
+
+
+def run_app(workdir: Path, code: str, **env) -> dict:
+    """
+    Run `code` in a new interpreter with the app imported (a real
+    start and shutdown), in `workdir` so app/data lives there.
+    `code` must print one JSON object as its last line.
+    """
+
+    environment = dict(os.environ, GROQ_API_KEY="test", **env)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(REPO_ROOT), environment.get("PYTHONPATH")])
+    )
+
+    process = subprocess.run(
+        [sys.executable, "-c", APP_PRELUDE + textwrap.dedent(code)],
+        cwd=workdir,
+        env=environment,
+        capture_output=True,
+        text=True,
+        timeout=300
+    )
+    assert process.returncode == 0, process.stderr
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="session")
+def embedding_model():
+    """
+    Skip tests that need the sentence-transformers model when it
+    can be neither loaded from the cache nor downloaded.
+    """
+
+    pytest.importorskip("sentence_transformers")
+    from app.services.embeddings import EMBED_MODEL
+
+    try:
+        process = subprocess.run(
+            [
+                sys.executable, "-c",
+                f"from sentence_transformers import SentenceTransformer; SentenceTransformer({EMBED_MODEL!r})"
+            ],
+            capture_output=True,
+            text=True,
+            timeout=600
+        )
+    except subprocess.TimeoutExpired:
+        pytest.skip(f"Embedding model {EMBED_MODEL} did not load")
+    if process.returncode != 0:
+        pytest.skip(f"Embedding model {EMBED_MODEL} is not available")
+    return EMBED_MODEL
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.answer_cache import AnswerCache
+from app.services.shared_services import RemoteAnswerCache, ServiceServer, answer_cache_handlers
+
+
+def key(question: str, doc_ids=("a",), mode: str = "answer") -> tuple:
+    return AnswerCache.make_key(list(doc_ids) if doc_ids else None, mode, "English", question)
+
+
+def test_exact_hit_ignores_case_spacing_and_punctuation():
+    cache = AnswerCache()
+    cache.put(key("What is a stack?"), "LIFO")
+
+    assert cache.get(key("  what IS a   stack")) == "LIFO"
+    assert cache.get(key("What is a queue?")) is None
+    # Same question, other scope or mode
+    assert cache.get(key("What is a stack?", doc_ids=("a", "b"))) is None
+    assert cache.get(key("What is a stack?", mode="short_notes")) is None
+    # Scope is a set of documents, not a list
+    cache.put(key("q", doc_ids=("b", "a")), "both")
+    assert cache.get(key("q", doc_ids=("a", "b"))) == "both"
+
+    assert cache.stats()["exact_hits"] == 2
+
+
+def test_semantic_hit_needs_close_question_in_same_scope():
+    cache = AnswerCache(semantic_threshold=0.95)
+    cache.put(key("What is a stack?"), "LIFO", embedding=[1.0, 0.0])
+
+    close = [0.99, 0.1]       # cosine ~0.995
+    far = [0.8, 0.6]          # cosine 0.8
+
+    assert cache.get_similar(key("Define stack"), close) == "LIFO"
+    assert cache.get_similar(key("Define stack"), far) is None
+    assert cache.get_similar(key("Define stack", doc_ids=None), close) is None
+    assert cache.get_similar(key("Define stack"), None) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_invalidate_drops_answers_that_used_the_document():
+    cache = AnswerCache()
+    cache.put(key("q", doc_ids=("a",)), "a only")
+    cache.put(key("q", doc_ids=("a", "b")), "a and b")
+    cache.put(key("q", doc_ids=("b",)), "b only")
+    cache.put(key("q", doc_ids=None), "all documents")
+
+    cache.invalidate("a")
+
+    assert cache.get(key("q", doc_ids=("a",))) is None
+    assert cache.get(key("q", doc_ids=("a", "b"))) is None
+    assert cache.get(key("q", doc_ids=None)) is None
+    assert cache.get(key("q", doc_ids=("b",))) == "b only"
+
+
+def test_entries_expire_and_least_recently_used_are_dropped():
+    cache = AnswerCache(max_items=2, ttl_seconds=0.05)
+    cache.put(key("one"), "1")
+    cache.put(key("two"), "2")
+    assert cache.get(key("one")) == "1"
+    cache.put(key("three"), "3")
+
+    # "two" was the least recently used
+    assert cache.get(key("two")) is None
+    assert cache.get(key("one")) == "1"
+
+    time.sleep(0.1)
+    assert cache.get(key("three")) is None
+    assert cache.stats()["size"] == 1
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """
+    A service process serving only an answer cache, on a Unix
+    socket, run from a thread.
+    """
+
+    server = ServiceServer(str(tmp_path / "services.sock"))
+    monkeypatch.setattr(
+        server, "load", lambda: server.handlers.update(answer_cache_handlers(AnswerCache()))
+    )
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(server.serve())
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    yield server.path
+
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+    loop.close()
+
+
+def test_workers_share_one_cache(service):
+    first, second = RemoteAnswerCache(service), RemoteAnswerCache(service)
+
+    first.put(key("What is a stack?"), "LIFO", embedding=np.array([1.0, 0.0]))
+    # Tuple keys survive the JSON round trip
+    assert second.get(key("what is a stack")) == "LIFO"
+    assert second.get_similar(key("Define stack"), [0.99, 0.1]) == "LIFO"
+
+    second.record_miss()
+    second.invalidate("a")
+    assert first.get(key("What is a stack?")) is None
+    assert first.stats() == second.stats()
+    assert first.stats()["misses"] == 1
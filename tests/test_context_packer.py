@@ -0,0 +1,104 @@
+import pytest
+
+from app.services import context_packer
+from app.services.context_packer import SpanCache, drop_duplicates, merge_spans, pack_context
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """
+    Count tokens as characters / 4: no tokenizer download, and
+    budgets that are easy to reason about.
+    """
+
+    monkeypatch.setattr(context_packer, "_tokenizer_loaded", True)
+    monkeypatch.setattr(context_packer, "_tokenizer", None)
+    monkeypatch.setattr(context_packer, "CHARS_PER_TOKEN", 4.0)
+
+
+def chunk(doc_id: str, text: str, start: int) -> dict:
+    return {"doc_id": doc_id, "text": text, "start": start, "end": start + len(text)}
+
+
+DOCUMENT = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu"
+
+
+def test_merge_spans_joins_overlapping_chunks():
+    chunks = [
+        chunk("a", DOCUMENT[20:50], 20),
+        chunk("b", "other document", 0),
+        chunk("a", DOCUMENT[0:30], 0),
+        chunk("a", DOCUMENT[50:], 50),
+        {"text": "no offsets"}
+    ]
+
+    spans = merge_spans(chunks)
+
+    # 0-30 and 20-50 overlap and 50- touches: one span, best rank kept
+    merged = [s for s in spans if s["doc_id"] == "a"]
+    assert len(merged) == 1
+    assert merged[0]["text"] == DOCUMENT
+    assert (merged[0]["start"], merged[0]["end"], merged[0]["rank"]) == (0, len(DOCUMENT), 0)
+
+    assert [s["text"] for s in spans if s["doc_id"] != "a"] == ["no offsets", "other document"]
+
+
+def test_merge_spans_keeps_gaps():
+    spans = merge_spans([chunk("a", DOCUMENT[30:40], 30), chunk("a", DOCUMENT[0:10], 0)])
+    assert [(s["start"], s["rank"]) for s in spans] == [(0, 1), (30, 0)]
+
+
+def test_drop_duplicates_keeps_the_better_ranked_copy():
+    footer = "Department of Computer Science, University Examination 2024, page footer"
+    spans = [
+        {"doc_id": "a", "start": 0, "text": "Stacks are last in first out structures.", "rank": 0},
+        {"doc_id": "b", "start": 0, "text": footer + " extra", "rank": 2},
+        {"doc_id": "a", "start": 100, "text": footer, "rank": 1},
+        {"doc_id": "a", "start": 200, "text": "   ", "rank": 3}
+    ]
+
+    kept = drop_duplicates(spans)
+
+    assert [s["rank"] for s in kept] == [0, 1]
+
+
+def test_pack_context_fills_the_budget_by_rank():
+    best = chunk("a", "b" * 40, 100)        # 10 tokens
+    second = chunk("a", "s" * 80, 0)        # 20 tokens
+    third = chunk("b", "t" * 40, 0)         # 10 tokens
+
+    # Budget 25: the second does not fit after the best, the third does
+    context = pack_context([best, second, third], budget=25)
+    assert context.split("\n\n") == ["b" * 40, "t" * 40]
+
+    # Everything fits: joined in document order, not rank order
+    assert pack_context([best, second, third], budget=100).split("\n\n") == [
+        "s" * 80, "b" * 40, "t" * 40
+    ]
+
+
+def test_pack_context_truncates_an_oversized_best_span():
+    context = pack_context(["x" * 400, "short"], budget=10)
+    assert context == "x" * 40
+
+
+def test_span_cache_reuses_measurements():
+    calls = []
+
+    def measure(text):
+        calls.append(text)
+        return len(text)
+
+    cache = SpanCache()
+    assert cache.get("tokens", "shared", measure) == 6
+    assert cache.get("tokens", "shared", measure) == 6
+    assert cache.get("shingles", "shared", measure) == 6
+    assert calls == ["shared", "shared"]
+    assert cache.hits == 1
+
+    # Same context with or without the cache
+    chunks = [chunk("a", DOCUMENT[:40], 0), chunk("a", DOCUMENT[30:], 30)]
+    cache = SpanCache()
+    first = pack_context(chunks, budget=100, cache=cache)
+    assert pack_context(chunks, budget=100, cache=cache) == first == pack_context(chunks, budget=100)
+    assert cache.hits == 2
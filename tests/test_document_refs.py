@@ -0,0 +1,29 @@
+from app.services.document_refs import DocumentRefs
+
+
+def test_document_is_released_by_its_last_upload(tmp_path):
+    refs = DocumentRefs(str(tmp_path / "refs.json"))
+    refs.add("doc", "upload-1")
+    refs.add("doc", "upload-2")
+    refs.add("doc", "upload-2")
+
+    assert refs.release("doc", "upload-1") == 1
+    # Releasing twice, or an upload that never held it, changes nothing
+    assert refs.release("doc", "upload-1") == 1
+    assert refs.release("doc", "upload-3") == 1
+    assert refs.release("doc", "upload-2") == 0
+    assert refs.release("doc", "upload-2") == 0
+
+
+def test_workers_see_each_others_references(tmp_path):
+    path = str(tmp_path / "refs.json")
+    first, second = DocumentRefs(path), DocumentRefs(path)
+
+    first.add("doc", "upload-1")
+    second.add("doc", "upload-2")
+    second.add("other", "upload-3")
+
+    assert first.release("doc", "upload-1") == 1
+    second.drop("doc")
+    assert first.release("doc", "upload-2") == 0
+    assert second.release("other", "upload-3") == 0
@@ -0,0 +1,227 @@
+import asyncio
+import socket
+import threading
+import time
+from argparse import Namespace
+
+import pytest
+
+pytest.importorskip("groq")
+uvicorn = pytest.importorskip("uvicorn")
+
+from app.services import llm as llm_module
+from app.services.llm import LLM, LLMBusy, TokenBucket, _duration
+from app.services.metrics import LLM_HEDGES, LLM_RETRIES
+from benchmarks.fake_groq import create_app
+
+
+class FakeGroq:
+    """
+    benchmarks/fake_groq.py served from a thread on a free port.
+    """
+
+    def __init__(self, **options):
+        args = dict(
+            latency_ms=20, jitter_ms=0, token_ms=1, rpm=0, tpm=0,
+            error_rate=0.0, fail_first=0, slow_first=0, slow_ms=5000
+        )
+        args.update(options)
+        self.app = create_app(Namespace(**args))
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+
+        self.server = uvicorn.Server(uvicorn.Config(
+            self.app, host="127.0.0.1", port=self.port, log_level="warning"
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        import httpx
+
+        return httpx.get(f"{self.url}/stats").json()
+
+    def wait_idle(self, timeout: float = 2) -> dict:
+        deadline = time.monotonic() + timeout
+        while self.stats()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self.stats()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(5)
+
+
+@pytest.fixture
+def fake_groq(monkeypatch):
+    """
+    Start a fake Groq server with the given options and return an
+    LLM client pointed at it: fake_groq(fail_first=1) -> (llm, server).
+    """
+
+    servers = []
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    # No client-side limits unless a test sets them
+    monkeypatch.setattr(llm_module, "LLM_REQUESTS_PER_MINUTE", 0)
+    monkeypatch.setattr(llm_module, "LLM_TOKENS_PER_MINUTE", 0)
+
+    def start(**options):
+        server = FakeGroq(**options)
+        servers.append(server)
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+        return LLM(), server
+
+    yield start
+
+    for server in servers:
+        server.stop()
+
+
+def count(counter, **labels) -> float:
+    return counter.values.get(tuple(sorted(labels.items())), 0)
+
+
+def test_retry_after_is_honoured(fake_groq, monkeypatch):
+    # Backoff alone would retry almost at once
+    monkeypatch.setattr(llm_module, "LLM_BACKOFF_BASE", 0.01)
+    llm, server = fake_groq(fail_first=1)
+    retries = count(LLM_RETRIES, reason="rate_limited")
+
+    started = time.monotonic()
+    assert llm.generate("What is a stack?")
+    elapsed = time.monotonic() - started
+
+    # The 429 said retry-after: 1
+    assert elapsed >= 1.0
+    assert server.stats()["requests"] == 2
+    assert count(LLM_RETRIES, reason="rate_limited") == retries + 1
+
+
+def test_still_rate_limited_after_retries(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_MAX_RETRIES", 1)
+    llm, server = fake_groq(fail_first=10)
+
+    with pytest.raises(LLMBusy) as busy:
+        asyncio.run(llm.agenerate("What is a stack?"))
+
+    assert busy.value.retry_after == 1
+    assert server.stats()["requests"] == 2
+
+
+def test_hedge_cancels_the_loser(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_HEDGE_AFTER_MS", 100)
+    # The first request stalls for 5s, the hedge answers in 20ms
+    llm, server = fake_groq(slow_first=1)
+    won = count(LLM_HEDGES, request="won_by_backup")
+
+    started = time.monotonic()
+    assert asyncio.run(llm.agenerate("What is a stack?", hedge=True))
+    assert time.monotonic() - started < 2
+
+    assert count(LLM_HEDGES, request="won_by_backup") == won + 1
+    stats = server.wait_idle()
+    assert stats["in_flight"] == 0
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+
+
+def test_stream_hedge_closes_the_loser(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_HEDGE_AFTER_MS", 100)
+    llm, server = fake_groq(slow_first=1)
+
+    async def first_token():
+        async for token in llm.astream("What is a stack?", hedge=True):
+            return token
+
+    started = time.monotonic()
+    assert asyncio.run(first_token())
+    assert time.monotonic() - started < 2
+
+    stats = server.wait_idle()
+    assert stats["in_flight"] == 0
+    assert stats["cancelled"] >= 1
+
+
+def test_no_hedge_without_spare_budget(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_HEDGE_AFTER_MS", 100)
+    monkeypatch.setattr(llm_module, "LLM_REQUESTS_PER_MINUTE", 1)
+    llm, server = fake_groq(slow_first=1, slow_ms=500)
+
+    assert asyncio.run(llm.agenerate("What is a stack?", hedge=True))
+    assert server.stats()["requests"] == 1
+
+
+def test_answers_do_not_wait_behind_background_calls(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_REQUESTS_PER_MINUTE", 8)
+    llm, server = fake_groq()
+
+    # More summary calls than the limit allows for a while
+    summaries = []
+    threads = [
+        threading.Thread(target=lambda i=i: summaries.append(llm.generate(f"Summarize part {i}", background=True)))
+        for i in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    assert server.stats()["requests"] < 8
+
+    started = time.monotonic()
+    assert asyncio.run(llm.agenerate("What is a stack?", hedge=True))
+    assert time.monotonic() - started < 1
+
+    # Delayed, not lost: they finish once there is budget again
+    llm.requests.set_limit(0)
+    for thread in threads:
+        thread.join(10)
+    assert len(summaries) == 10
+    assert server.stats()["requests"] == 11
+
+
+def test_limits_follow_response_headers(fake_groq, monkeypatch):
+    monkeypatch.setattr(llm_module, "LLM_TOKENS_PER_MINUTE", 6000)
+    llm, server = fake_groq(tpm=20000)
+
+    llm.generate("What is a stack?")
+
+    assert llm.tokens.capacity == 20000
+    assert llm.tokens.level <= 20000 - server.stats()["requests"]
+
+
+def test_token_bucket_queues_callers():
+    bucket = TokenBucket(60)
+
+    assert bucket.reserve(60) == 0
+    # One per second: the next two callers wait about 1s and 2s
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+    bucket.pause(5)
+    assert bucket.reserve(0) == pytest.approx(5, abs=0.05)
+    assert not bucket.try_reserve(0)
+
+
+def test_background_keeps_the_interactive_reserve():
+    bucket = TokenBucket(8)
+
+    # 0.25 of 8 is kept back: 6 background calls, then waiting
+    assert [bucket.reserve_spare(1, 0.25) for _ in range(6)] == [0] * 6
+    assert bucket.reserve_spare(1, 0.25) > 0
+    assert bucket.reserve(1) == 0
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66),
+    ("2m59.56s", 179.56),
+    ("120ms", 0.12),
+    ("1h0m0s", 3600),
+    ("3", 3),
+    (None, 0)
+])
+def test_reset_durations(value, seconds):
+    assert _duration(value) == pytest.approx(seconds)
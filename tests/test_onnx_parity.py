@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("torch")
+
+# Lowest cosine similarity to the PyTorch vector of the same text
+FP32_MIN_COSINE = 0.9999
+INT8_MIN_COSINE = 0.97
+
+TEXTS = [
+    "What is a stack?",
+    "Explain the difference between a process and a thread.",
+    "B.Tech III Semester Examination, Data Structures and Algorithms",
+    "Q4 (a) Write an algorithm to insert a node at the end of a singly linked list. [8]",
+    "def push(stack, item):\n    stack.append(item)",
+    "A binary search tree keeps smaller keys on the left. " * 60,
+    "",
+]
+
+
+@pytest.fixture(scope="module")
+def models(request, tmp_path_factory):
+    # ONNX_PARITY_MODEL: another model name or a local path
+    model_name = os.getenv("ONNX_PARITY_MODEL") or request.getfixturevalue("embedding_model")
+
+    from sentence_transformers import SentenceTransformer
+
+    from app.services.onnx_embedder import OnnxEncoder, export_model
+
+    out_dir = str(tmp_path_factory.mktemp("onnx"))
+    export_model(model_name, out_dir, quantize=True)
+
+    return {
+        "torch": SentenceTransformer(model_name, device="cpu"),
+        "onnx": OnnxEncoder(out_dir),
+        "onnx-int8": OnnxEncoder(out_dir, quantized=True)
+    }
+
+
+def cosines(models, backend: str) -> np.ndarray:
+    expected = models["torch"].encode(TEXTS, normalize_embeddings=True, convert_to_numpy=True)
+    actual = models[backend].encode(TEXTS)
+
+    assert actual.shape == expected.shape
+    assert actual.dtype == np.float32
+    return np.sum(expected * actual, axis=1)
+
+
+def test_onnx_matches_torch(models):
+    assert cosines(models, "onnx").min() >= FP32_MIN_COSINE
+
+
+def test_quantized_onnx_stays_close(models):
+    assert cosines(models, "onnx-int8").min() >= INT8_MIN_COSINE
+
+
+def test_onnx_vectors_are_normalized(models):
+    norms = np.linalg.norm(models["onnx"].encode(TEXTS), axis=1)
+    assert np.allclose(norms, 1, atol=1e-5)
@@ -0,0 +1,87 @@
+import threading
+
+from app.services.summaries import (
+    CONDENSE_PROMPT,
+    MAP_PROMPT,
+    build_summaries,
+    document_text_from_chunks,
+    precomputed_text,
+    split_groups
+)
+
+
+class RecordingLLM:
+    """
+    generate() for build_summaries: answers every prompt with a
+    fixed-size text and records which prompts it was sent.
+    """
+
+    def __init__(self, answer_chars: int):
+        self.answer_chars = answer_chars
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def generate(self, prompt: str) -> str:
+        with self.lock:
+            self.prompts.append(prompt)
+            number = len(self.prompts)
+        return f"note {number} ".ljust(self.answer_chars, ".")
+
+    def count(self, template: str) -> int:
+        head = template.split("{content}")[0]
+        return sum(prompt.startswith(head) for prompt in self.prompts)
+
+
+def test_document_text_from_overlapping_chunks():
+    text = "0123456789abcdefghij"
+    chunks = [
+        {"start": 8, "end": 16, "text": text[8:16]},
+        {"start": 0, "end": 10, "text": text[0:10]},
+        {"start": 9, "end": 12, "text": text[9:12]},
+        {"start": 14, "end": 20, "text": text[14:20]}
+    ]
+    assert document_text_from_chunks(chunks) == text
+
+
+def test_split_groups_cuts_at_line_breaks():
+    text = "a" * 70 + "\n" + "b" * 70 + "\n" + "c" * 30
+    groups = split_groups(text, 100)
+
+    assert "".join(groups) == text
+    assert groups[0] == "a" * 70 + "\n"
+    assert all(len(group) <= 100 for group in groups)
+
+
+def test_notes_are_condensed_until_they_fit():
+    llm = RecordingLLM(answer_chars=300)
+
+    summaries = build_summaries("x" * 10000, llm.generate, group_chars=1000)
+
+    # 10 sections of 300 chars, merged 3 at a time: 10 -> 4 -> 2
+    # notes, which fit in one group
+    assert len(summaries["sections"]) == 10
+    assert llm.count(MAP_PROMPT) == 10
+    assert llm.count(CONDENSE_PROMPT) == 4 + 2
+    assert len(llm.prompts) == 10 + 6 + 3
+    assert summaries["summary"].startswith("note ")
+    assert precomputed_text(summaries, "long_notes") == "\n\n".join(summaries["sections"])
+
+
+def test_oversized_notes_are_reduced_as_they_are():
+    # Every note is larger than a group: merging cannot make progress
+    llm = RecordingLLM(answer_chars=1500)
+
+    summaries = build_summaries("x" * 3000, llm.generate, group_chars=1000)
+
+    assert llm.count(CONDENSE_PROMPT) == 0
+    assert len(llm.prompts) == 3 + 3
+    summary_prompt = [p for p in llm.prompts if "Summarize the whole document" in p][0]
+    assert all(section in summary_prompt for section in summaries["sections"])
+
+
+def test_long_documents_get_larger_groups():
+    llm = RecordingLLM(answer_chars=10)
+
+    summaries = build_summaries("x" * 50000, llm.generate, group_chars=1000, max_groups=5)
+
+    assert len(summaries["sections"]) == 5
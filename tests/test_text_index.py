@@ -0,0 +1,79 @@
+from app.services.text_index import PositionalIndex, reciprocal_rank_fusion
+
+
+def make_index() -> PositionalIndex:
+    index = PositionalIndex()
+    index.add("os", [
+        "Unit 1: Process scheduling. Round robin uses a time quantum.",
+        "The time quantum decides how often the scheduler switches.",
+        "Unit 2: Memory management and paging."
+    ])
+    index.add("dbms", [
+        "Unit 1: Normal forms. The quantum of data is a tuple.",
+        "Time travel queries are not covered."
+    ])
+    return index
+
+
+def test_phrase_needs_consecutive_words():
+    index = make_index()
+
+    assert index.phrase_rows("time quantum") == ["os:0", "os:1"]
+    # Both words occur in os:0 and os:1, but in the other order
+    assert index.phrase_rows("quantum time") == []
+    assert index.phrase_rows("Unit 1") == ["dbms:0", "os:0"]
+    assert index.phrase_rows("unit 3") == []
+    assert index.phrase_rows("...") == []
+
+
+def test_phrase_scoped_to_documents():
+    index = make_index()
+
+    assert index.phrase_rows("unit 1", doc_ids=["os"]) == ["os:0"]
+    assert index.phrase_rows("unit 1", doc_ids=["missing"]) == []
+
+
+def test_phrase_search_adds_following_chunks():
+    index = make_index()
+
+    selected = index.phrase_search("unit 1", doc_ids=["os"], following=1)
+    assert [(c["doc_id"], c["chunk"]) for c in selected] == [("os", 0), ("os", 1)]
+
+    # Chunks reached twice are returned once; none past the document end
+    selected = index.phrase_search("time quantum", following=5)
+    assert [(c["doc_id"], c["chunk"]) for c in selected] == [("os", 0), ("os", 1), ("os", 2)]
+
+
+def test_bm25_ranking():
+    index = make_index()
+
+    best, _ = index.bm25("paging memory")[0]
+    assert (best["doc_id"], best["chunk"]) == ("os", 2)
+
+    scores = {f"{c['doc_id']}:{c['chunk']}": score for c, score in index.bm25("quantum")}
+    # Same term frequency, shorter chunk ranks higher
+    assert scores["os:1"] > scores["os:0"]
+
+    assert [c["doc_id"] for c, _ in index.bm25("quantum", doc_ids=["dbms"])] == ["dbms"]
+    assert index.bm25("nothing matches this") == []
+
+
+def test_delete_document_removes_postings():
+    index = make_index()
+    index.add("os", ["already indexed"], start_index=0)
+    assert index.stats()["chunks"] == 5
+
+    index.delete_document("os")
+
+    assert index.phrase_rows("time quantum") == []
+    assert index.bm25("paging") == []
+    assert "paging" not in index.postings
+    assert index.stats() == {"chunks": 2, "documents": 1, "terms": len(index.postings), "ready": True}
+    assert index.total_length == sum(entry["length"] for entry in index.rows.values())
+
+
+def test_reciprocal_rank_fusion():
+    # "b" is second in both lists: it beats "a" and "c", first in one only
+    assert reciprocal_rank_fusion([["a", "b"], ["c", "b"]])[0] == "b"
+    assert reciprocal_rank_fusion([["a", "b", "c"]]) == ["a", "b", "c"]
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services.numpy_vector_store import NumpyVectorStore, QuantizedNumpyVectorStore
+
+
+def make_store(backend: str, path):
+    if backend == "chroma":
+        pytest.importorskip("chromadb")
+        from app.services.vector_store import ChromaVectorStore
+
+        return ChromaVectorStore(str(path))
+    if backend == "int8":
+        return QuantizedNumpyVectorStore(str(path))
+    return NumpyVectorStore(str(path))
+
+
+def chunks(count: int, start: int = 0, seed: int = 0):
+    vectors = np.random.default_rng(seed).normal(size=(count, 8)).astype(np.float32)
+    texts = [f"chunk {i}" for i in range(start, start + count)]
+    return texts, vectors
+
+
+@pytest.mark.parametrize("backend", ["numpy", "int8", "chroma"])
+def test_ingesting_a_document_twice_keeps_one_row_per_chunk(tmp_path, backend):
+    store = make_store(backend, tmp_path)
+
+    # Two workers ingesting the same file, batches interleaved
+    first, second = chunks(4), chunks(4, start=4)
+    store.add_documents(*first, doc_id="doc")
+    store.add_documents(*first, doc_id="doc")
+    store.add_documents(*second, doc_id="doc", start_index=4)
+    store.add_documents(*second, doc_id="doc", start_index=4)
+
+    stored = store.get_chunks(["doc"])
+    assert [chunk["chunk"] for chunk in stored] == list(range(8))
+    assert [chunk["text"] for chunk in stored] == [f"chunk {i}" for i in range(8)]
+
+    results = store.search(first[1][0].tolist(), top_k=8)
+    assert len(results["ids"][0]) == len(set(results["ids"][0])) == 8
+
+
+def current_generation(root) -> str:
+    return str(root / (root / "CURRENT").read_text())
+
+
+@pytest.mark.parametrize("backend", ["numpy", "int8"])
+def test_persist_appends_only_new_rows(tmp_path, backend):
+    store = make_store(backend, tmp_path)
+    store.add_documents(*chunks(20), doc_id="a")
+    store.persist()
+    vectors = os.stat(os.path.join(current_generation(tmp_path), "vectors.bin"))
+
+    store.add_documents(*chunks(5, seed=1), doc_id="b")
+    store.persist()
+
+    # Same file, grown by the new rows: the first 20 were not rewritten
+    grown = os.stat(os.path.join(current_generation(tmp_path), "vectors.bin"))
+    assert grown.st_ino == vectors.st_ino
+    assert grown.st_size == vectors.st_size * 25 // 20
+
+    reopened = make_store(backend, tmp_path)
+    assert reopened.get_chunks() == store.get_chunks()
+
+
+@pytest.mark.parametrize("backend", ["numpy", "int8"])
+def test_torn_append_and_restore(tmp_path, backend):
+    store = make_store(backend, tmp_path)
+    store.add_documents(*chunks(10), doc_id="a")
+    store.snapshot("before")
+
+    store.add_documents(*chunks(10, seed=1), doc_id="b")
+    store.persist()
+    # A crash halfway through appending the next rows
+    for name in ("vectors.bin", "texts.bin", "row_docs.bin"):
+        with open(os.path.join(current_generation(tmp_path), name), "ab") as f:
+            f.write(b"torn")
+
+    store.add_documents(*chunks(3, seed=2), doc_id="c")
+    store.persist()
+    assert make_store(backend, tmp_path).get_chunks() == store.get_chunks()
+
+    # Appending after a restore must not touch the snapshot
+    store.restore("before")
+    store.add_documents(*chunks(4, seed=3), doc_id="d")
+    store.persist()
+    store.restore("before")
+    assert [chunk["doc_id"] for chunk in store.get_chunks()] == ["a"] * 10
+
+    store.delete_document("a")
+    store.persist()
+    assert make_store(backend, tmp_path).get_chunks() == []
+
+
+@pytest.mark.parametrize("backend", ["numpy", "int8", "chroma"])
+def test_search_scoped_to_documents(tmp_path, backend):
+    store = make_store(backend, tmp_path)
+    texts, vectors = chunks(6)
+    store.add_documents(texts[:3], vectors[:3], doc_id="a")
+    store.add_documents(texts[3:], vectors[3:], doc_id="b", start_index=0)
+
+    # The best match overall is in "a"; scoped to "b" it is never returned
+    results = store.search(vectors[0].tolist(), top_k=6, doc_ids=["b"])
+    assert sorted(results["ids"][0]) == ["b:0", "b:1", "b:2"]
+
+    results = store.search_many([vectors[0].tolist(), vectors[4].tolist()], top_k=1, doc_ids=["a", "b"])
+    assert [ids[0] for ids in results["ids"]] == ["a:0", "b:1"]
+
+    assert store.search(vectors[0].tolist(), doc_ids=["missing"])["ids"] == [[]]
+    assert {chunk["doc_id"] for chunk in store.get_chunks(["a"])} == {"a"}
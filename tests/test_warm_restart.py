@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import run_app
+
+DOCUMENT = (
+    "The Zorblax protocol assigns every packet a priority class. "
+    "Priority classes are renegotiated after each handshake. "
+) * 40
+
+INGEST = """
+with TestClient(app.main.app) as client:
+    wait_ready(client)
+    job = client.post("/upload", files={"file": ("notes.txt", DOCUMENT)}).json()
+    while client.get(f"/jobs/{job['job_id']}").json()["status"] not in ("done", "failed"):
+        time.sleep(0.05)
+    print(json.dumps(client.get(f"/jobs/{job['job_id']}").json()))
+"""
+
+QUERY = """
+with TestClient(app.main.app) as client:
+    wait_ready(client)
+    documents = client.get("/documents").json()["documents"]
+    answer = client.post("/answer", json={"question": "What does the Zorblax protocol assign?"})
+    print(json.dumps({
+        "documents": documents,
+        "status": answer.status_code,
+        "answer": answer.json(),
+        "prompts": prompts
+    }))
+"""
+
+
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_documents_survive_restart(tmp_path, backend, embedding_model):
+    if backend == "chroma":
+        pytest.importorskip("chromadb")
+
+    env = {"VECTOR_BACKEND": backend, "ENABLE_EMBED_CACHE": "false"}
+
+    job = run_app(tmp_path, f"DOCUMENT = {DOCUMENT!r}\n" + INGEST, **env)
+    assert job["status"] == "done", job["error"]
+    doc_id = job["result"]["doc_id"]
+
+    # New process: nothing but what was persisted on disk
+    after = run_app(tmp_path, QUERY, **env)
+
+    assert [doc["doc_id"] for doc in after["documents"]] == [doc_id]
+    assert after["documents"][0]["filename"] == "notes.txt"
+
+    assert after["status"] == 200
+    assert after["answer"]["answer"]
+    # The answer was generated from the stored chunks
+    assert len(after["prompts"]) == 1
+    assert "Zorblax protocol assigns every packet" in after["prompts"][0]